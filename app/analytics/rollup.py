@@ -0,0 +1,161 @@
+"""
+Агрегированная статистика маршрутов пользователя по дням недели (таблица route_stats).
+
+Статистика обновляется в той же транзакции, что и изменение маршрута, поэтому AnalyticsView читает
+не более семи строк вместо просмотра всех маршрутов пользователя.
+
+Пересчет статистики по таблице routes (заполнение или восстановление):
+    python -m analytics.rollup rebuild [--user-id ID]
+"""
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func, case
+
+from database import Session, Routes, RouteStats, User, disable_statement_timeout
+
+COUNTERS = ('route_count', 'finished_count', 'deviation_count', 'deviation_sum', 'distance_sum', 'time_sum')
+
+
+def day_of_week(moment):
+    """
+    Возвращает день недели в нумерации Postgres: 0 — воскресенье, 6 — суббота.
+    """
+    return moment.isoweekday() % 7
+
+
+def contribution(route, end_time=None):
+    """
+    Вычисляет вклад маршрута в счетчики route_stats.
+
+    Args:
+        route (Routes): Маршрут.
+        end_time (datetime | None): Время окончания, которое следует учесть вместо route.end_time.
+
+    Returns:
+        dict: Значения счетчиков COUNTERS для одного маршрута.
+    """
+    elapsed = (end_time - route.start_time).total_seconds() if end_time is not None else None
+    deviation = elapsed - route.duration if elapsed is not None and route.duration is not None else None
+    return {
+        'route_count': 1,
+        'finished_count': 1 if elapsed is not None else 0,
+        'deviation_count': 1 if deviation is not None else 0,
+        'deviation_sum': deviation or 0.0,
+        'distance_sum': route.distance or 0.0,
+        'time_sum': elapsed if elapsed is not None else (route.duration or 0.0),
+    }
+
+
+def _apply(session, deltas):
+    for (user_id, dow), values in deltas.items():
+        statement = insert(RouteStats).values(user_id=user_id, day_of_week=dow, **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[RouteStats.user_id, RouteStats.day_of_week],
+            set_={name: getattr(RouteStats, name) + getattr(statement.excluded, name) for name in COUNTERS})
+        session.execute(statement)
+
+
+def record_routes(session, routes):
+    """
+    Добавляет новые маршруты в статистику. Изменения не фиксируются: commit выполняет вызывающий код.
+
+    Маршруты группируются по (user_id, day_of_week), поэтому на каждую группу выполняется один upsert.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for route in routes:
+        if route.start_time is None:
+            continue
+        totals = deltas[(route.user_id, day_of_week(route.start_time))]
+        for name, value in contribution(route, route.end_time).items():
+            totals[name] += value
+    _apply(session, deltas)
+
+
+def record_end_time(session, route, previous_end_time):
+    """
+    Учитывает изменение времени окончания маршрута. Изменения не фиксируются: commit выполняет вызывающий код.
+
+    Args:
+        session (Session): Сессия, в которой изменен маршрут.
+        route (Routes): Маршрут с новым значением end_time.
+        previous_end_time (datetime | None): Значение end_time до изменения.
+    """
+    if route.start_time is None:
+        return
+    after = contribution(route, route.end_time)
+    before = contribution(route, previous_end_time)
+    _apply(session, {(route.user_id, day_of_week(route.start_time)):
+                     {name: after[name] - before[name] for name in COUNTERS}})
+
+
+def read_stats(session, user_id, dow=None):
+    """
+    Читает статистику пользователя из route_stats.
+
+    Args:
+        session (Session): Сессия базы данных.
+        user_id (int): Идентификатор пользователя.
+        dow (int | None): День недели от 0 (воскресенье) до 6 (суббота) или None для всех дней.
+
+    Returns:
+        tuple: (среднее отклонение, общее расстояние, общее время); значения None, если маршрутов нет.
+    """
+    query = select(*(func.sum(getattr(RouteStats, name)) for name in COUNTERS)).where(RouteStats.user_id == user_id)
+    if dow is not None:
+        query = query.where(RouteStats.day_of_week == dow)
+    route_count, _, deviation_count, deviation_sum, distance_sum, time_sum = session.execute(query).one()
+    if not route_count:
+        return None, None, None
+    average_deviation = deviation_sum / deviation_count if deviation_count else None
+    return average_deviation, distance_sum, time_sum
+
+
+def rebuild(session, user_id=None):
+    """
+    Пересчитывает route_stats по таблице routes для одного или всех пользователей.
+
+    На время пересчета таблица routes блокируется от изменений, чтобы не потерять обновления,
+    выполняемые параллельно. Версии данных пользователей увеличиваются, чтобы кэшированные ответы
+    /analytics (см. response_cache) не пережили пересчет.
+    """
+    disable_statement_timeout(session)
+    session.execute(text('LOCK TABLE routes IN SHARE MODE'))
+    elapsed = func.extract('epoch', Routes.end_time) - func.extract('epoch', Routes.start_time)
+    deviation = elapsed - Routes.duration
+    query = select(
+        Routes.user_id,
+        Routes.day_of_week,
+        func.count(),
+        func.count(Routes.end_time),
+        func.count(deviation),
+        func.coalesce(func.sum(deviation), 0),
+        func.coalesce(func.sum(Routes.distance), 0),
+        func.coalesce(func.sum(case((Routes.end_time.is_not(None), elapsed), else_=Routes.duration)), 0),
+    ).where(Routes.start_time.is_not(None)).group_by(Routes.user_id, Routes.day_of_week)
+    cleanup = delete(RouteStats)
+    if user_id is not None:
+        query = query.where(Routes.user_id == user_id)
+        cleanup = cleanup.where(RouteStats.user_id == user_id)
+    session.execute(cleanup)
+    session.execute(insert(RouteStats).from_select(['user_id', 'day_of_week', *COUNTERS], query))
+    versions = update(User).values(data_version=User.data_version + 1)
+    if user_id is not None:
+        versions = versions.where(User.id == user_id)
+    session.execute(versions.execution_options(synchronize_session=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--user-id', type=int, default=None, help='пересчитать статистику только этого пользователя')
+    args = parser.parse_args()
+    with Session() as session:
+        rebuild(session, args.user_id)
+        session.commit()
+
+
+if __name__ == '__main__':
+    main()
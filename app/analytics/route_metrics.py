@@ -0,0 +1,326 @@
+"""
+Метрики маршрутов, вычисляемые на NumPy сразу для всех маршрутов выборки.
+
+Колонки маршрутов (время начала и окончания, заявленная продолжительность и расстояние) читаются одним запросом
+в массивы, после чего отклонения, темп и скорость, перцентили и гистограммы вычисляются векторными операциями
+без цикла Python по маршрутам. Геометрии нескольких маршрутов декодируются в один массив точек
+(geometry.decode_many), длины отрезков по формуле гаверсинусов и накопленное расстояние вычисляются для всех
+маршрутов одной операцией.
+
+Обозначения:
+    elapsed         фактическое время маршрута end_time - start_time в секундах (NaN, если маршрут не завершен)
+    deviation       отклонение elapsed - duration в секундах
+    expected_pace   заявленный темп duration / distance в секундах на километр
+    actual_pace     фактический темп elapsed / distance в секундах на километр
+    expected_speed  заявленная скорость distance / duration в м/с
+    actual_speed    фактическая скорость distance / elapsed в м/с
+Время маршрутов хранится без часового пояса, день недели и час вычисляются так же, как в Postgres
+(день недели от 0 — воскресенье до 6 — суббота, как в колонке day_of_week).
+"""
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+
+import geometry
+from database import Routes
+from spatial import EARTH_RADIUS
+
+SECONDS_PER_DAY = 86400
+# 1 января 1970 года — четверг.
+EPOCH_DAY_OF_WEEK = 4
+PERCENTILES = (5, 25, 50, 75, 95)
+COLUMNS = ('id', 'start', 'end', 'duration', 'distance')
+
+
+def epoch(column):
+    return cast(func.extract('epoch', column), Float)
+
+
+def columns_query(user_id):
+    """
+    Формирует запрос колонок маршрутов пользователя по строке на маршрут.
+    """
+    return select(Routes.id, epoch(Routes.start_time), epoch(Routes.end_time), Routes.duration, Routes.distance) \
+        .where(Routes.user_id == user_id, Routes.start_time.is_not(None))
+
+
+def metrics_query(user_id, day_of_week=None):
+    """
+    Формирует запрос колонок маршрутов пользователя для route_columns: ID, время начала и окончания в секундах
+    от начала эпохи, заявленная продолжительность и расстояние.
+
+    Каждая колонка возвращается одним массивом (array_agg) в единственной строке результата: разбор массивов
+    драйвером в несколько раз быстрее создания объекта строки на каждый маршрут.
+    """
+    query = select(*(func.array_agg(column) for column in columns_query(user_id).selected_columns)) \
+        .where(Routes.user_id == user_id, Routes.start_time.is_not(None))
+    if day_of_week is not None:
+        query = query.where(Routes.day_of_week == day_of_week)
+    return query
+
+
+def page_query(user_id, cursor=None, limit=None):
+    """
+    Формирует запрос страницы маршрутов пользователя по ключу id: колонки columns_query и геометрия маршрута.
+    """
+    query = columns_query(user_id).add_columns(Routes.route_geometry).order_by(Routes.id)
+    if cursor is not None:
+        query = query.where(Routes.id > cursor)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def route_columns(columns):
+    """
+    Преобразует колонки COLUMNS (строку metrics_query или транспонированные строки columns_query) в словарь
+    массивов; отсутствующие значения — NaN.
+    """
+    columns = list(columns) or [None] * len(COLUMNS)
+    return {name: np.array(column or (), dtype=np.float64) for name, column in zip(COLUMNS, columns)}
+
+
+def pace(columns):
+    """
+    Вычисляет отклонение, темп и скорость маршрутов.
+
+    Args:
+        columns (dict): Массивы start, end, duration и distance (см. route_columns).
+
+    Returns:
+        dict: Массивы elapsed, deviation, expected_pace, actual_pace, expected_speed и actual_speed;
+              значения, которые нельзя вычислить (маршрут не завершен, нулевое расстояние), — NaN.
+    """
+    duration, distance = columns['duration'], columns['distance']
+    elapsed = columns['end'] - columns['start']
+    kilometers = np.where(distance > 0, distance / 1e3, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'elapsed': elapsed,
+            'deviation': elapsed - duration,
+            'expected_pace': duration / kilometers,
+            'actual_pace': elapsed / kilometers,
+            'expected_speed': np.where(duration > 0, distance / duration, np.nan),
+            'actual_speed': np.where(elapsed > 0, distance / elapsed, np.nan),
+        }
+
+
+def day_and_hour(seconds):
+    """
+    Возвращает день недели (0 — воскресенье) и час для времени в секундах от начала эпохи.
+    """
+    days, remainder = np.divmod(np.floor(seconds).astype(np.int64), SECONDS_PER_DAY)
+    return (days + EPOCH_DAY_OF_WEEK) % 7, remainder // 3600
+
+
+def values(array):
+    """
+    Преобразует массив в список чисел для JSON, заменяя NaN на None.
+    """
+    return [None if value != value else value for value in array.tolist()]
+
+
+def percentiles(array):
+    finite = array[np.isfinite(array)]
+    if not len(finite):
+        return dict.fromkeys((f'p{p}' for p in PERCENTILES))
+    return {f'p{p}': float(value) for p, value in zip(PERCENTILES, np.percentile(finite, PERCENTILES))}
+
+
+def histogram(array, bins):
+    finite = array[np.isfinite(array)]
+    if not len(finite):
+        return {'edges': [], 'counts': []}
+    counts, edges = np.histogram(finite, bins=bins)
+    return {'edges': edges.tolist(), 'counts': counts.tolist()}
+
+
+def grouped(keys, size, deviation):
+    """
+    Возвращает по каждому значению keys от 0 до size - 1 количество маршрутов, количество завершенных маршрутов
+    и среднее отклонение.
+    """
+    finished = np.isfinite(deviation)
+    counts = np.bincount(keys, minlength=size)
+    finished_counts = np.bincount(keys[finished], minlength=size)
+    deviation_sums = np.bincount(keys[finished], weights=deviation[finished], minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = deviation_sums / finished_counts
+    return counts, finished_counts, means
+
+
+def distribution(columns, bins=20):
+    """
+    Вычисляет распределения метрик маршрутов.
+
+    Args:
+        columns (dict): Массивы route_columns.
+        bins (int): Количество интервалов гистограммы отклонений.
+
+    Returns:
+        dict: Количество маршрутов, перцентили отклонения, темпа и фактической скорости, гистограмма отклонений,
+              статистика по дням недели и по часам начала маршрута и матрица количества маршрутов
+              по дням недели и часам (7 × 24).
+    """
+    metrics = pace(columns)
+    deviation = metrics['deviation']
+    dow, hour = day_and_hour(columns['start'])
+    result = {
+        'routes': int(len(deviation)),
+        'finished': int(np.isfinite(deviation).sum()),
+        'deviation': {**percentiles(deviation), 'histogram': histogram(deviation, bins)},
+        'expected_pace': percentiles(metrics['expected_pace']),
+        'actual_pace': percentiles(metrics['actual_pace']),
+        'actual_speed': percentiles(metrics['actual_speed']),
+    }
+    for name, keys, size in (('by_weekday', dow, 7), ('by_hour', hour, 24)):
+        counts, finished_counts, means = grouped(keys, size, deviation)
+        result[name] = [{'routes': count, 'finished': finished, 'average_deviation': mean}
+                        for count, finished, mean in zip(counts.tolist(), finished_counts.tolist(), values(means))]
+    result['weekday_hour'] = np.bincount(dow * 24 + hour, minlength=7 * 24).reshape(7, 24).tolist()
+    return result
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    Возвращает расстояния в метрах между точками массивов координат в градусах по формуле гаверсинусов.
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def segment_lengths(points):
+    """
+    Возвращает длины в метрах отрезков между соседними точками массива координат в градусах формы
+    (количество точек, 2 и более).
+
+    То же, что haversine для соседних точек, но радианы и косинусы широт вычисляются один раз на точку,
+    а промежуточные массивы переиспользуются: на миллионах точек это заметно быстрее.
+    """
+    if len(points) < 2:
+        return np.zeros(0)
+    radians = np.radians(points[:, :2])
+    lon, lat = radians[:, 0], radians[:, 1]
+    cos_lat = np.cos(lat)
+    a = np.diff(lat)
+    a *= 0.5
+    np.sin(a, out=a)
+    np.square(a, out=a)
+    b = np.diff(lon)
+    b *= 0.5
+    np.sin(b, out=b)
+    np.square(b, out=b)
+    b *= cos_lat[:-1]
+    b *= cos_lat[1:]
+    a += b
+    np.minimum(a, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS
+    return a
+
+
+class RouteGeometries:
+    """
+    Геометрии нескольких маршрутов в одном массиве точек.
+
+    Args:
+        points (numpy.ndarray): Координаты всех маршрутов подряд, форма (количество точек, 2 и более).
+        offsets (numpy.ndarray): Границы маршрутов: точки маршрута i — points[offsets[i]:offsets[i + 1]].
+
+    Атрибуты segments (длины отрезков между соседними точками массива, отрезки между концом одного маршрута
+    и началом следующего имеют длину 0) и cumulative (накопленная длина от начала массива) вычисляются
+    при создании для всех маршрутов сразу.
+    """
+
+    def __init__(self, points, offsets):
+        self.points = points
+        self.offsets = offsets
+        self.counts = np.diff(offsets)
+        self.segments = segment_lengths(points)
+        boundaries = offsets[1:-1]
+        self.segments[boundaries[(boundaries > 0) & (boundaries < len(points))] - 1] = 0.0
+        self.cumulative = np.concatenate(([0.0], np.cumsum(self.segments)))
+
+    @classmethod
+    def from_blobs(cls, blobs):
+        """
+        Декодирует геометрии маршрутов (None — маршрут без геометрии).
+        """
+        empty = geometry.encode([])
+        return cls(*geometry.decode_many([blob if blob is not None else empty for blob in blobs]))
+
+    def lengths(self):
+        """
+        Возвращает длины маршрутов в метрах.
+        """
+        last = len(self.cumulative) - 1
+        starts = np.minimum(self.offsets[:-1], last)
+        ends = np.minimum(np.maximum(self.offsets[1:] - 1, self.offsets[:-1]), last)
+        return self.cumulative[ends] - self.cumulative[starts]
+
+    def max_segments(self):
+        """
+        Возвращает длину самого длинного отрезка каждого маршрута в метрах (0 для маршрутов короче двух точек).
+        """
+        if not len(self.segments):
+            return np.zeros(len(self.counts))
+        padded = np.append(self.segments, 0.0)
+        starts = np.minimum(self.offsets[:-1], len(padded) - 1)
+        return np.where(self.counts > 1, np.maximum.reduceat(padded, starts), 0.0)
+
+    def cumulative_distance(self, index):
+        """
+        Возвращает накопленное расстояние от начала маршрута index до каждой его точки в метрах.
+        """
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if start == end:
+            return np.zeros(0)
+        return self.cumulative[start:end] - self.cumulative[start]
+
+    def segment_lengths(self, index):
+        """
+        Возвращает длины отрезков маршрута index в метрах.
+        """
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.segments[start:max(start, end - 1)]
+
+
+def route_metrics(columns, geometries, segments=False):
+    """
+    Вычисляет метрики каждого маршрута.
+
+    Args:
+        columns (dict): Массивы route_columns.
+        geometries (RouteGeometries): Геометрии тех же маршрутов в том же порядке.
+        segments (bool): Добавить длины отрезков и накопленное расстояние до каждой точки маршрута.
+
+    Returns:
+        list of dict: Метрики маршрутов: ID, заявленное расстояние и длина геометрии в метрах, количество точек
+                      и самый длинный отрезок, заявленная продолжительность и метрики pace.
+    """
+    metrics = pace(columns)
+    table = {
+        'id': columns['id'].astype(np.int64).tolist(),
+        'distance': values(columns['distance']),
+        'geometry_distance': geometries.lengths().tolist(),
+        'points': geometries.counts.tolist(),
+        'max_segment': geometries.max_segments().tolist(),
+        'duration': values(columns['duration']),
+        **{name: values(array) for name, array in metrics.items()},
+    }
+    routes = [dict(zip(table, row)) for row in zip(*table.values())]
+    if segments:
+        for index, route in enumerate(routes):
+            route['segment_lengths'] = geometries.segment_lengths(index).tolist()
+            route['cumulative_distance'] = geometries.cumulative_distance(index).tolist()
+    return routes
+
+
+def page_metrics(rows, segments=False):
+    """
+    Вычисляет метрики маршрутов страницы по строкам page_query (см. route_metrics).
+    """
+    columns = list(zip(*rows))
+    geometries = RouteGeometries.from_blobs(columns.pop() if columns else [])
+    return route_metrics(route_columns(columns), geometries, segments)
@@ -0,0 +1,60 @@
+from typing import Optional
+from pydantic import BaseModel, validator
+from decouple import config
+from routes.validators import ROUTES_PAGE_LIMIT
+
+ANALYTICS_HISTOGRAM_BINS = config('ANALYTICS_HISTOGRAM_BINS', default=20, cast=int)
+ANALYTICS_HISTOGRAM_BINS_LIMIT = 200
+
+
+class DistributionValidator(BaseModel):
+    """
+    Валидатор параметров распределений метрик маршрутов.
+
+    Поля:
+        userid (int): Идентификатор пользователя.
+        day_of_week (int | None): День недели от 0 (воскресенье) до 6 (суббота) или None для всех дней.
+        bins (int): Количество интервалов гистограммы отклонений.
+
+    Методы:
+        day_in_range(cls, v): Проверяет день недели.
+        bins_in_range(cls, v): Проверяет количество интервалов гистограммы.
+    """
+    userid: int
+    day_of_week: Optional[int] = None
+    bins: int = ANALYTICS_HISTOGRAM_BINS
+    @validator('day_of_week')
+    def day_in_range(cls, v):
+        if v is not None and not 0 <= v <= 6:
+            raise ValueError('Day of week must be between 0 and 6')
+        return v
+
+    @validator('bins')
+    def bins_in_range(cls, v):
+        if not 1 <= v <= ANALYTICS_HISTOGRAM_BINS_LIMIT:
+            raise ValueError(f'Bins must be between 1 and {ANALYTICS_HISTOGRAM_BINS_LIMIT}')
+        return v
+
+
+class RouteMetricsValidator(BaseModel):
+    """
+    Валидатор параметров получения метрик маршрутов пользователя.
+
+    Поля:
+        userid (int): Идентификатор пользователя.
+        cursor (int | None): ID последнего маршрута предыдущей страницы.
+        limit (int | None): Размер страницы, не более ROUTES_PAGE_LIMIT.
+        segments (bool): Добавить длины отрезков и накопленное расстояние до точек маршрута.
+
+    Методы:
+        limit_in_range(cls, v): Проверяет размер страницы.
+    """
+    userid: int
+    cursor: Optional[int] = None
+    limit: Optional[int] = None
+    segments: bool = False
+    @validator('limit')
+    def limit_in_range(cls, v):
+        if v is not None and not 1 <= v <= ROUTES_PAGE_LIMIT:
+            raise ValueError(f'Limit must be between 1 and {ROUTES_PAGE_LIMIT}')
+        return v
@@ -1,13 +1,45 @@
 from flask.views import MethodView
 from flask import jsonify, request
-from database import Session, Routes
-from sqlalchemy.sql import func, case
+from pydantic_core._pydantic_core import ValidationError
+from database import read_request_session, Routes
+from sqlalchemy.sql import func, case, select
 from flask_restx import Namespace
 from api import analytic_model
-from sqlalchemy.sql import text
+from analytics.rollup import read_stats
+from analytics.route_metrics import distribution, metrics_query, page_metrics, page_query, route_columns
+from analytics.validators import DistributionValidator, RouteMetricsValidator
+from response_cache import cached_response
+from routes.validators import ROUTES_PAGE_SIZE
+import metrics
 
 analytics_namespace = Namespace('/analytics', description='Получение аналитики пользователя')
 
+
+def analytics_query(user_id, day_of_week=None):
+    """
+    Формирует запрос, вычисляющий статистику маршрутов пользователя за один проход по таблице routes.
+
+    Запрос использует индексы (user_id, start_time) и (user_id, day_of_week) таблицы routes. Результат совпадает
+    с analytics.rollup.read_stats и используется для проверки и замеров.
+
+    Args:
+        user_id (int): Идентификатор пользователя.
+        day_of_week (int | None): День недели от 0 (воскресенье) до 6 (суббота) или None для всех дней.
+
+    Returns:
+        Select: Запрос, возвращающий одну строку (среднее отклонение, общее расстояние, общее время).
+    """
+    elapsed = func.extract('epoch', Routes.end_time) - func.extract('epoch', Routes.start_time)
+    query = select(
+        func.avg(elapsed - Routes.duration),
+        func.sum(Routes.distance),
+        func.sum(case((Routes.end_time.is_not(None), elapsed), else_=Routes.duration)),
+    ).where(Routes.user_id == user_id)
+    if day_of_week is not None:
+        query = query.where(Routes.day_of_week == day_of_week)
+    return query
+
+
 @analytics_namespace.route('/analytics')
 class AnalyticsView(MethodView):
 
@@ -22,32 +54,28 @@ class AnalyticsView(MethodView):
 
         Функция выполняет следующие действия:
         - Извлекает из запроса идентификатор пользователя и, если указан, день недели.
-        - Формирует SQL-запрос для получения маршрутов пользователя.
-        - Если день недели указан, фильтрует маршруты по этому критерию.
-        - Вычисляет среднее отклонение между фактическим временем маршрута и заявленной продолжительностью.
-        - Подсчитывает общее пройденное расстояние и общее время в пути.
+        - Читает из таблицы route_stats (см. analytics.rollup) не более семи строк со счетчиками маршрутов
+          пользователя по дням недели и вычисляет среднее отклонение между фактическим временем маршрута
+          и заявленной продолжительностью, общее пройденное расстояние и общее время в пути.
         - Рассчитывает среднюю скорость передвижения.
         - Возвращает JSON-объект со статистической информацией: среднее отклонение, общее расстояние, общее время и средняя скорость.
 
+        Ответ содержит ETag, вычисляемый по версии данных пользователя (см. response_cache): при совпадении
+        с заголовком If-None-Match возвращается 304 без чтения статистики, а повторные запросы с теми же
+        параметрами отдаются из кэша ответов.
+
         В случае возникновения ошибки возвращает JSON с описанием ошибки и HTTP-статус 500.
 
         :return: JSON-объект со статистикой или описанием ошибки.
         """
         try:
-            with Session() as session:
-                user_id = request.json['userid']
-                query = session.query(Routes).filter(Routes.user_id == user_id)
-                day_of_week = request.json.get('day_of_week')
-                if day_of_week is not None:
-                    query = query.filter(func.extract('dow', Routes.start_time) == day_of_week)
-                average_deviation = query.with_entities(
-                    func.avg(func.extract('epoch', Routes.end_time) - func.extract('epoch', Routes.start_time) - Routes.duration)).filter(Routes.user_id == user_id).scalar()
-                total_distance = query.with_entities(func.sum(Routes.distance)).filter(Routes.user_id == user_id).scalar()
-                total_time = session.query(func.sum(case((Routes.end_time is not None,
-                                                          func.extract('epoch', Routes.end_time) - func.extract('epoch', Routes.start_time)),
-                                                          else_=Routes.duration)
-                    )).filter(Routes.user_id == user_id).scalar()
-                avg_speed = total_distance / total_time
+            user_id = request.json['userid']
+            day_of_week = request.json.get('day_of_week')
+
+            def analytics():
+                average_deviation, total_distance, total_time = read_stats(read_request_session(), user_id,
+                                                                           day_of_week)
+                avg_speed = total_distance / total_time if total_distance is not None and total_time else None
 
                 return jsonify({
                     'average_deviation': average_deviation,
@@ -55,6 +83,101 @@ class AnalyticsView(MethodView):
                     'total_time': total_time,
                     'avg_speed': avg_speed
                 })
+
+            return cached_response(read_request_session(), 'analytics', user_id, {'day_of_week': day_of_week},
+                                   analytics)
+        except Exception as exc:
+            return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
+
+
+def request_params():
+    """
+    Возвращает параметры запроса из строки запроса и тела JSON.
+    """
+    return {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+
+
+@analytics_namespace.route('/analytics/distribution')
+class DistributionView(MethodView):
+
+    @analytics_namespace.doc(params={'userid': {'description': 'ID пользователя', 'in': 'query', 'type': 'integer'},
+                                     'day_of_week': {'description': 'число от 0 до 6, где 0 — воскресенье, 6 — суббота', 'in': 'query', 'type': 'integer'},
+                                     'bins': {'description': 'Количество интервалов гистограммы отклонений', 'in': 'query', 'type': 'integer'}})
+    @analytics_namespace.response(200, 'Распределения метрик маршрутов')
+    @analytics_namespace.response(400, 'Ошибка валидации данных')
+    @analytics_namespace.response(500, 'Непредвиденные ошибки')
+    def get(self):
+        """
+        Возвращает распределения метрик маршрутов пользователя (см. analytics.route_metrics).
+
+        Метрики всех маршрутов пользователя (или маршрутов, начатых в день недели day_of_week) вычисляются
+        векторно по колонкам, прочитанным одним запросом:
+        - перцентили p5, p25, p50, p75, p95 и гистограмма отклонения фактического времени маршрута от заявленного;
+        - перцентили заявленного и фактического темпа (секунды на километр) и фактической скорости (м/с);
+        - количество маршрутов, завершенных маршрутов и среднее отклонение по дням недели (by_weekday, индекс 0 —
+          воскресенье) и по часам начала (by_hour), матрица количества маршрутов по дням недели и часам weekday_hour.
+
+        Ответ кэшируется и поддерживает If-None-Match так же, как /analytics.
+
+        :return: JSON-объект с распределениями или описанием ошибки.
+        """
+        try:
+            params = DistributionValidator(**request_params())
+
+            def build():
+                columns = read_request_session().execute(metrics_query(params.userid, params.day_of_week)).one()
+                result = distribution(route_columns(columns), params.bins)
+                with metrics.span('serialize'):
+                    return jsonify(result)
+
+            return cached_response(read_request_session(), 'analytics_distribution', params.userid,
+                                   params.model_dump(), build)
+        except ValidationError as e:
+            return jsonify({'error': 'Validation error', 'details': str(e.errors()[0]['msg'])}), 400
+        except Exception as exc:
+            return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
+
+
+@analytics_namespace.route('/analytics/routes')
+class RouteMetricsView(MethodView):
+
+    @analytics_namespace.doc(params={'userid': {'description': 'ID пользователя', 'in': 'query', 'type': 'integer'},
+                                     'cursor': {'description': 'ID последнего маршрута предыдущей страницы (next_cursor)', 'in': 'query', 'type': 'integer'},
+                                     'limit': {'description': 'Размер страницы', 'in': 'query', 'type': 'integer'},
+                                     'segments': {'description': 'Длины отрезков и накопленное расстояние до точек маршрута', 'in': 'query', 'type': 'boolean'}})
+    @analytics_namespace.response(200, 'Метрики маршрутов')
+    @analytics_namespace.response(400, 'Ошибка валидации данных')
+    @analytics_namespace.response(500, 'Непредвиденные ошибки')
+    def get(self):
+        """
+        Возвращает метрики маршрутов пользователя страницами (см. analytics.route_metrics.route_metrics).
+
+        Для каждого маршрута: заявленное расстояние distance и длина геометрии geometry_distance по формуле
+        гаверсинусов (метры), количество точек и самый длинный отрезок, заявленная и фактическая продолжительность,
+        отклонение, заявленный и фактический темп (секунды на километр) и скорость (м/с). Геометрии всех маршрутов
+        страницы декодируются и обрабатываются вместе. При segments=true добавляются длины отрезков
+        segment_lengths и накопленное расстояние cumulative_distance до каждой точки маршрута.
+
+        Маршруты без времени начала (ожидающие построения) не включаются. Ответ кэшируется и поддерживает
+        If-None-Match так же, как /routes.
+
+        :return: JSON со списком метрик маршрутов data и next_cursor (None на последней странице)
+                 или описанием ошибки.
+        """
+        try:
+            params = RouteMetricsValidator(**request_params())
+            limit = params.limit or ROUTES_PAGE_SIZE
+
+            def build():
+                rows = read_request_session().execute(page_query(params.userid, params.cursor, limit + 1)).all()
+                next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+                routes = page_metrics(rows[:limit], params.segments)
+                with metrics.span('serialize'):
+                    return jsonify({'data': routes, 'next_cursor': next_cursor})
+
+            return cached_response(read_request_session(), 'analytics_routes', params.userid, params.model_dump(),
+                                   build)
+        except ValidationError as e:
+            return jsonify({'error': 'Validation error', 'details': str(e.errors()[0]['msg'])}), 400
         except Exception as exc:
             return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
-        return jsonify()
\ No newline at end of file
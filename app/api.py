@@ -1,7 +1,12 @@
+from decouple import config
 from flask_restx import Namespace, Resource, fields, Api
 
+# SWAGGER_ENABLED=False отключает страницу документации /swagger/ и описание API /swagger.json.
+# Модели ниже регистрируются при импорте и в этом случае: на них ссылаются декораторы ns.expect в views.
+SWAGGER_ENABLED = config('SWAGGER_ENABLED', default=True, cast=bool)
 
-api = Api(version='1.0', title='Routes', description='WEB Сервис для управления маршрутами',  doc='/swagger/')
+api = Api(version='1.0', title='Routes', description='WEB Сервис для управления маршрутами',
+          doc='/swagger/' if SWAGGER_ENABLED else False)
 
 user_model = api.model('User', {
     'id': fields.Integer(required=True, description='ID пользователя'),
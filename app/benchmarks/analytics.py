@@ -0,0 +1,76 @@
+"""
+Замер времени запроса аналитики на пользователе с большим количеством маршрутов.
+
+Создает пользователя и заданное количество маршрутов, после чего сравнивает прежнюю схему из трех
+агрегирующих запросов с одним запросом analytics_query и чтением статистики из route_stats,
+с фильтром по дню недели и без него.
+
+Запуск из каталога app (нужна база данных из .env):
+    python -m benchmarks.analytics --routes 100000 --repeat 20
+"""
+import argparse
+
+from sqlalchemy.sql import func
+
+from analytics.rollup import read_stats, rebuild
+from analytics.views import analytics_query
+from benchmarks.report import measure, write_report
+from benchmarks.seed import analyze, cleanup, seed_routes, seed_users
+from database import Session, Routes, migrate
+
+
+def seed(session, routes_count):
+    user_id = seed_users(session, 1)[0]
+    seed_routes(session, user_id, routes_count, points=0)
+    session.commit()
+    analyze(session)
+    return user_id
+
+
+def legacy_analytics(session, user_id, day_of_week=None):
+    query = session.query(Routes).filter(Routes.user_id == user_id)
+    if day_of_week is not None:
+        query = query.filter(func.extract('dow', Routes.start_time) == day_of_week)
+    elapsed = func.extract('epoch', Routes.end_time) - func.extract('epoch', Routes.start_time)
+    query.with_entities(func.avg(elapsed - Routes.duration)).scalar()
+    query.with_entities(func.sum(Routes.distance)).scalar()
+    query.with_entities(func.sum(Routes.duration)).scalar()
+
+
+def single_pass_analytics(session, user_id, day_of_week=None):
+    session.execute(analytics_query(user_id, day_of_week)).one()
+
+
+def rollup_analytics(session, user_id, day_of_week=None):
+    read_stats(session, user_id, day_of_week)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='файл отчета (по умолчанию stdout)')
+    parser.add_argument('--keep', action='store_true', help='не удалять созданные данные')
+    args = parser.parse_args()
+
+    migrate()
+    with Session() as session:
+        user_id = seed(session, args.routes)
+        rebuild(session, user_id)
+        session.commit()
+        try:
+            report = {'benchmark': 'analytics', 'routes': args.routes, 'results': {}}
+            for label, day_of_week in (('all_days', None), ('day_of_week', 3)):
+                report['results'][label] = {
+                    name: measure(lambda: function(session, user_id, day_of_week), args.repeat)
+                    for name, function in (('legacy', legacy_analytics), ('single_pass', single_pass_analytics),
+                                           ('rollup', rollup_analytics))
+                }
+            write_report(report, args.output)
+        finally:
+            if not args.keep:
+                cleanup(session, [user_id])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Замеры массовой выгрузки и загрузки маршрутов (routes.bulk).
+
+Для каждого количества маршрутов из --routes создается пользователь с таким количеством маршрутов, после чего
+в каждом формате выполняется выгрузка его маршрутов в файл и загрузка этого файла обратно отдельным процессом
+python -m routes.bulk. Результат — время, маршрутов в секунду, размер файла и пиковый объем памяти процесса
+(ru_maxrss), который при потоковой обработке не должен расти вместе с количеством маршрутов. Загруженные
+маршруты удаляются после каждого замера. Для первого количества маршрутов загрузка файла NDJSON в том же
+процессе через COPY (routes.bulk.import_routes) сравнивается со вставкой объектов ORM (session.add_all).
+
+Запуск из каталога app (нужна база данных из .env):
+    python -m benchmarks.bulk --routes 10000,100000 --points 200 --formats ndjson,arrow,parquet --output bulk.json
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from decouple import Csv
+from sqlalchemy import delete, func, select
+
+from analytics.rollup import record_routes
+from benchmarks.report import write_report
+from benchmarks.seed import analyze, cleanup, seed_routes, seed_users
+from database import Session, Routes, migrate
+from response_cache import bump_data_version
+from routes.bulk import FORMATS, check_format, import_routes, import_row, read_records
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_bulk(*args):
+    """
+    Выполняет python -m routes.bulk с аргументами args и возвращает время в секундах и пиковую память в мегабайтах.
+    """
+    with tempfile.TemporaryFile() as errors:
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-m', 'routes.bulk', *map(str, args)], cwd=APP_DIR,
+                                   stdout=subprocess.DEVNULL, stderr=errors)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode:
+            errors.seek(0)
+            raise RuntimeError(f'routes.bulk {" ".join(map(str, args))} failed:\n{errors.read()[-2000:].decode()}')
+    return elapsed, round(usage.ru_maxrss / 1024, 1)
+
+
+def orm_import(file, chunk_size):
+    """
+    Загружает файл NDJSON вставкой объектов ORM порциями по chunk_size.
+    """
+    for records in read_records(file, 'ndjson', chunk_size):
+        routes = [Routes(**import_row(record)) for record in records]
+        with Session() as session:
+            session.add_all(routes)
+            record_routes(session, routes)
+            bump_data_version(session, [route.user_id for route in routes])
+            session.commit()
+
+
+def last_route_id():
+    with Session() as session:
+        return session.scalar(select(func.max(Routes.id)))
+
+
+def remove_imported(user_id, last_id):
+    """
+    Удаляет маршруты пользователя user_id с ID больше last_id, добавленные загрузкой.
+    """
+    with Session() as session:
+        session.execute(delete(Routes).where(Routes.user_id == user_id, Routes.id > last_id))
+        session.commit()
+
+
+def timed_import(function, path, user_id, *args):
+    """
+    Загружает файл path вызовом function(file, *args), удаляет загруженные маршруты и возвращает время в секундах.
+    """
+    last_id = last_route_id()
+    started = time.perf_counter()
+    with open(path, 'rb') as file:
+        function(file, *args)
+    elapsed = time.perf_counter() - started
+    remove_imported(user_id, last_id)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=Csv(int), default='10000,100000', help='количества маршрутов')
+    parser.add_argument('--points', type=int, default=200, help='точек в геометрии маршрута')
+    parser.add_argument('--formats', type=Csv(), default=','.join(FORMATS))
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--no-orm', action='store_true', help='не замерять загрузку через ORM')
+    parser.add_argument('--output', help='файл отчета (по умолчанию stdout)')
+    parser.add_argument('--keep', action='store_true', help='не удалять созданные данные')
+    args = parser.parse_args()
+    try:
+        for file_format in args.formats:
+            check_format(file_format)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    migrate()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for count in args.routes:
+                with Session() as session:
+                    user_id, = seed_users(session, 1)
+                    seed_routes(session, user_id, count, args.points)
+                    session.commit()
+                    analyze(session)
+                    session.commit()
+                result = {'routes': count, 'formats': {}}
+                for file_format in args.formats:
+                    path = os.path.join(directory, f'routes-{count}.{file_format}')
+                    export_s, export_mb = run_bulk('export', path, '--format', file_format, '--user-id', user_id,
+                                                   '--chunk-size', args.chunk_size)
+                    last_id = last_route_id()
+                    import_s, import_mb = run_bulk('import', path, '--format', file_format, '--skip-levels',
+                                                   '--chunk-size', args.chunk_size)
+                    remove_imported(user_id, last_id)
+                    result['formats'][file_format] = {
+                        'file_mb': round(os.path.getsize(path) / 2 ** 20, 2),
+                        'export_s': round(export_s, 3),
+                        'export_routes_per_s': round(count / export_s),
+                        'export_max_rss_mb': export_mb,
+                        'import_s': round(import_s, 3),
+                        'import_routes_per_s': round(count / import_s),
+                        'import_max_rss_mb': import_mb,
+                    }
+                if not args.no_orm and not results and 'ndjson' in args.formats:
+                    path = os.path.join(directory, f'routes-{count}.ndjson')
+                    copy_s = timed_import(import_routes, path, user_id, 'ndjson', False, False, args.chunk_size)
+                    orm_s = timed_import(orm_import, path, user_id, args.chunk_size)
+                    result['in_process_import'] = {
+                        'copy_routes_per_s': round(count / copy_s),
+                        'orm_routes_per_s': round(count / orm_s),
+                        'speedup': round(orm_s / copy_s, 2),
+                    }
+                results.append(result)
+        write_report({
+            'benchmark': 'bulk',
+            'config': {name: getattr(args, name) for name in ('routes', 'points', 'formats', 'chunk_size')},
+            'results': results,
+        }, args.output)
+    finally:
+        if not args.keep:
+            with Session() as session:
+                cleanup(session)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Сравнение двух отчетов замеров (benchmarks.load, benchmarks.micro, benchmarks.analytics).
+
+Выводит значения показателей времени (*_ms) и пропускной способности (rps, ops_per_sec) обоих отчетов
+и их изменение в процентах. Показатель считается ухудшившимся, если время выросло или пропускная способность
+снизилась больше чем на threshold процентов; при наличии таких показателей команда завершается с кодом 1.
+
+Запуск:
+    python -m benchmarks.compare before.json after.json [--threshold 10] [--metric p95_ms]
+"""
+import argparse
+import json
+import sys
+
+THROUGHPUT_METRICS = ('rps', 'ops_per_sec')
+
+
+def flatten(value, prefix=''):
+    """
+    Возвращает словарь числовых показателей отчета с путями вида results.routes_get.0.latency.p95_ms.
+    Элементы списков с полем concurrency получают в пути уровень параллельности вместо индекса.
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((f'c{item["concurrency"]}' if isinstance(item, dict) and 'concurrency' in item else index, item)
+                 for index, item in enumerate(value))
+    else:
+        return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+    metrics = {}
+    for key, item in items:
+        metrics.update(flatten(item, f'{prefix}.{key}' if prefix else str(key)))
+    return metrics
+
+
+def is_compared(path):
+    name = path.rsplit('.', 1)[-1]
+    return name.endswith('_ms') or name in THROUGHPUT_METRICS
+
+
+def compare(before, after, threshold, metric=None):
+    """
+    Сравнивает показатели results двух отчетов.
+
+    Returns:
+        list of tuple: (путь, значение до, значение после, изменение в процентах, признак ухудшения).
+    """
+    old, new = flatten(before.get('results', {})), flatten(after.get('results', {}))
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        if not is_compared(path) or (metric and not path.endswith(metric)):
+            continue
+        if not old[path]:
+            continue
+        change = (new[path] - old[path]) / old[path] * 100
+        worse = -change if path.rsplit('.', 1)[-1] in THROUGHPUT_METRICS else change
+        rows.append((path, old[path], new[path], change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help='допустимое ухудшение, %%')
+    parser.add_argument('--metric', help='сравнивать только показатель с этим именем, например p95_ms')
+    args = parser.parse_args()
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    rows = compare(before, after, args.threshold, args.metric)
+    width = max((len(row[0]) for row in rows), default=0)
+    for path, old, new, change, regression in rows:
+        print(f'{path:<{width}}  {old:>12.3f}  {new:>12.3f}  {change:>+8.1f}%{"  REGRESSION" if regression else ""}')
+    sys.exit(1 if any(row[4] for row in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+Нагрузочный тест сервиса маршрутов под gunicorn.
+
+Заполняет базу данных пользователями и маршрутами (см. benchmarks.seed), запускает заглушку
+OpenRouteService с заданной задержкой (см. benchmarks.ors_stub) и сервис под gunicorn, после чего
+для каждой конечной точки и каждого уровня параллельности в течение duration секунд отправляет запросы
+из concurrency потоков (каждый поток ждет ответа перед следующим запросом). Результат — количество запросов
+в секунду, перцентили p50/p95/p99 времени ответа и распределение статусов по каждой конечной точке в формате JSON.
+
+С параметром --ors-quota заглушка отвечает статусом 429 сверх заданного количества запросов в минуту,
+с --hot-routes N запросы POST /routes выбирают координаты из N фиксированных наборов, так что одинаковые
+запросы приходят одновременно (проверка ограничителя частоты и объединения запросов, см. routes.limiter).
+Ограничитель настраивается переменными окружения DIRECTIONS_RATE_LIMIT*, которые передаются gunicorn.
+
+Конечные точки:
+    register      POST /register с новым пользователем
+    routes_get    GET /routes первой страницы маршрутов случайного пользователя
+    routes_post   POST /routes со случайными координатами (запрос к заглушке OpenRouteService)
+    set_end_time  PATCH /set_end_time случайного маршрута
+    analytics     GET /analytics случайного пользователя за все дни или за случайный день недели
+
+Запуск из каталога app (нужна база данных из .env):
+    python -m benchmarks.load --users 20 --routes 1000 --concurrency 1,8,32 --duration 10 --output load.json
+    DIRECTIONS_RATE_LIMIT=40 python -m benchmarks.load --endpoints routes_post --ors-quota 40 --hot-routes 5
+"""
+import argparse
+import itertools
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+from decouple import Csv
+
+from analytics.rollup import rebuild
+from benchmarks.report import summarize, write_report
+from benchmarks.seed import BENCHMARK_PREFIX, analyze, cleanup, random_points, seed_routes, seed_users
+from database import Session, migrate
+
+ENDPOINTS = ('register', 'routes_get', 'routes_post', 'set_end_time', 'analytics')
+
+
+class Workload:
+    """
+    Формирует запросы к конечным точкам по данным, созданным при заполнении базы.
+
+    Args:
+        routes (dict): Списки ID маршрутов по ID пользователей.
+        page_size (int): Размер страницы GET /routes.
+        fields (str | None): Поля маршрутов GET /routes или None для всех полей.
+        hot_routes (int): Количество фиксированных наборов координат POST /routes (0 — случайные координаты).
+    """
+
+    def __init__(self, routes, page_size=100, fields=None, hot_routes=0):
+        self.routes = routes
+        self.user_ids = list(routes)
+        self.page_size = page_size
+        self.fields = fields
+        self.counter = itertools.count()
+        rng = random.Random(0)
+        self.hot_routes = [random_points(rng, rng.randint(2, 5), step=0.005) for _ in range(hot_routes)]
+
+    def register(self, rng):
+        name = f'{BENCHMARK_PREFIX}load-{os.getpid()}-{next(self.counter)}-{rng.getrandbits(32)}'
+        return 'POST', '/register', {'json': {'username': name, 'email': f'{name}@example.com',
+                                              'password': 'benchmark', 'repeat_password': 'benchmark'}}
+
+    def routes_get(self, rng):
+        params = {'userid': rng.choice(self.user_ids), 'limit': self.page_size}
+        if self.fields:
+            params['fields'] = self.fields
+        return 'GET', '/routes', {'params': params}
+
+    def routes_post(self, rng):
+        if self.hot_routes:
+            points = rng.choice(self.hot_routes)
+        else:
+            points = random_points(rng, rng.randint(2, 5), step=0.005)
+        return 'POST', '/routes', {'json': {'userid': rng.choice(self.user_ids), 'name': 'benchmark',
+                                            'coordinates': points}}
+
+    def set_end_time(self, rng):
+        user_id = rng.choice(self.user_ids)
+        return 'PATCH', '/set_end_time', {'json': {'userid': user_id, 'routeid': rng.choice(self.routes[user_id])}}
+
+    def analytics(self, rng):
+        data = {'userid': rng.choice(self.user_ids)}
+        if rng.random() < 0.5:
+            data['day_of_week'] = rng.randint(0, 6)
+        return 'GET', '/analytics', {'json': data}
+
+
+def run_level(base_url, make_request, concurrency, duration, timeout=60):
+    """
+    Отправляет запросы из concurrency потоков в течение duration секунд.
+
+    Returns:
+        dict: Количество запросов в секунду, сводка времени ответа и количество ответов по статусам.
+    """
+    deadline = time.perf_counter() + duration
+    timings = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local_timings, local_statuses = [], Counter()
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                method, path, kwargs = make_request(rng)
+                started = time.perf_counter()
+                try:
+                    response = session.request(method, base_url + path, timeout=timeout, **kwargs)
+                    status = response.status_code
+                except requests.RequestException as exc:
+                    status = type(exc).__name__
+                local_timings.append((time.perf_counter() - started) * 1e3)
+                local_statuses[status] += 1
+        with lock:
+            timings.extend(local_timings)
+            statuses.update(local_statuses)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(random.getrandbits(64),)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 500)
+    return {
+        'concurrency': concurrency,
+        'duration_s': elapsed,
+        'requests': len(timings),
+        'rps': len(timings) / elapsed if elapsed else None,
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'latency': summarize(timings),
+    }
+
+
+def wait_ready(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            requests.get(f'{base_url}/directions_cache', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--routes', type=int, default=1000, help='маршрутов на пользователя')
+    parser.add_argument('--points', type=int, default=200, help='точек в геометрии маршрута')
+    parser.add_argument('--endpoints', type=Csv(), default=','.join(ENDPOINTS))
+    parser.add_argument('--concurrency', type=Csv(int), default='1,8,32')
+    parser.add_argument('--duration', type=float, default=10, help='секунд на каждый уровень параллельности')
+    parser.add_argument('--warmup', type=float, default=2, help='секунд прогрева перед замерами конечной точки')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--fields', help='поля маршрутов GET /routes')
+    parser.add_argument('--gunicorn-workers', type=int, default=4)
+    parser.add_argument('--gunicorn-threads', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--ors-port', type=int, default=8765)
+    parser.add_argument('--ors-latency', type=float, default=100, help='задержка заглушки OpenRouteService, мс')
+    parser.add_argument('--ors-jitter', type=float, default=20, help='отклонение задержки заглушки, мс')
+    parser.add_argument('--ors-quota', type=int, default=0, help='запросов в минуту к заглушке, остальные — 429')
+    parser.add_argument('--hot-routes', type=int, default=0, help='наборов координат POST /routes (0 — случайные)')
+    parser.add_argument('--directions-cache', action='store_true', help='не отключать кэш ответов OpenRouteService')
+    parser.add_argument('--output', help='файл отчета (по умолчанию stdout)')
+    parser.add_argument('--keep', action='store_true', help='не удалять созданные данные')
+    args = parser.parse_args()
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f'unknown endpoints: {", ".join(sorted(unknown))}')
+
+    migrate()
+    with Session() as session:
+        user_ids = seed_users(session, args.users)
+        routes = {user_id: seed_routes(session, user_id, args.routes, args.points) for user_id in user_ids}
+        session.commit()
+        rebuild(session)
+        session.commit()
+        analyze(session)
+        session.commit()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    env = dict(os.environ, ORS_BASE_URL=f'http://127.0.0.1:{args.ors_port}', DIRECTIONS_BACKEND='ors')
+    if not args.directions_cache:
+        env.update(DIRECTIONS_CACHE_SIZE='0', DIRECTIONS_CACHE_SHARED='False')
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    stub = subprocess.Popen([sys.executable, '-m', 'benchmarks.ors_stub', '--port', str(args.ors_port),
+                             '--latency', str(args.ors_latency), '--jitter', str(args.ors_jitter),
+                             '--quota', str(args.ors_quota)], cwd=app_dir)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{args.port}',
+                               '--workers', str(args.gunicorn_workers), '--threads', str(args.gunicorn_threads),
+                               '--log-level', 'warning', 'wsgi:app'], cwd=app_dir, env=env)
+    try:
+        wait_ready(base_url, server)
+        workload = Workload(routes, args.page_size, args.fields, args.hot_routes)
+        results = {}
+        for endpoint in args.endpoints:
+            make_request = getattr(workload, endpoint)
+            if args.warmup:
+                run_level(base_url, make_request, max(args.concurrency), args.warmup)
+            results[endpoint] = [run_level(base_url, make_request, concurrency, args.duration)
+                                 for concurrency in args.concurrency]
+        write_report({
+            'benchmark': 'load',
+            'config': {name: getattr(args, name) for name in (
+                'users', 'routes', 'points', 'concurrency', 'duration', 'page_size', 'fields', 'gunicorn_workers',
+                'gunicorn_threads', 'ors_latency', 'ors_jitter', 'ors_quota', 'hot_routes', 'directions_cache')},
+            'results': results,
+        }, args.output)
+    finally:
+        server.terminate()
+        stub.terminate()
+        server.wait()
+        stub.wait()
+        if not args.keep:
+            with Session() as session:
+                cleanup(session)
+
+
+if __name__ == '__main__':
+    main()
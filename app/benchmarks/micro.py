@@ -0,0 +1,104 @@
+"""
+Микрозамеры отдельных этапов обработки запросов.
+
+    parse         разбор ответа OpenRouteService (json.loads и DirectionsClient.parse)
+    route_columns подготовка колонок маршрута из ответа (кодирование геометрии, ограничивающий прямоугольник)
+    get_route     get_route при попадании в кэш ответов OpenRouteService
+    to_dict       Routes.to_dict (декодирование геометрии) и сериализация ответа в JSON
+    analytics     запросы аналитики (analytics_query и route_stats) на пользователе с routes маршрутами
+
+Каждый замер выполняется для маршрутов из points точек. Замеры analytics требуют базы данных из .env
+и пропускаются с параметром --skip-db.
+
+Запуск из каталога app:
+    python -m benchmarks.micro --points 50,500,5000 --repeat 200 --output micro.json
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from decouple import Csv
+
+import geometry
+from analytics.rollup import read_stats, rebuild
+from analytics.views import analytics_query
+from benchmarks.ors_stub import directions_response
+from benchmarks.report import measure, write_report
+from benchmarks.seed import analyze, cleanup, random_points, seed_routes, seed_users
+from database import Session, Routes, migrate
+from manage import app
+from routes.backends import get_backend
+from routes.cache import directions_cache
+from routes.client import DirectionsClient
+from routes.directions import DIRECTIONS_PROFILE, get_route, route_columns
+
+
+def route_benchmarks(points, repeat, rng):
+    coordinates = random_points(rng, 2, step=0.01)
+    body = json.dumps(directions_response(coordinates, points - 1)).encode()
+    route = DirectionsClient.parse(json.loads(body))
+
+    profile = f'{get_backend().name}:{DIRECTIONS_PROFILE}'
+    directions_cache.set(directions_cache.make_key(coordinates, profile), route, profile=profile)
+    start_time = datetime(2024, 1, 1)
+    instance = Routes(id=1, name='benchmark', duration=route['duration'], distance=route['distance'],
+                      start_time=start_time, end_time=start_time + timedelta(seconds=route['duration']),
+                      status='ready', route_geometry=geometry.encode(route['route_points']))
+
+    return {
+        'response_bytes': len(body),
+        'parse': measure(lambda: DirectionsClient.parse(json.loads(body)), repeat),
+        'route_columns': measure(lambda: route_columns(route), repeat),
+        'get_route': measure(lambda: get_route(coordinates), repeat),
+        'to_dict': measure(lambda: instance.to_dict, repeat),
+        'to_dict_json': measure(lambda: app.json.dumps(instance.to_dict), repeat),
+    }
+
+
+def analytics_benchmarks(routes_count, repeat):
+    migrate()
+    with Session() as session:
+        user_id = seed_users(session, 1)[0]
+        try:
+            seed_routes(session, user_id, routes_count, points=0)
+            session.commit()
+            rebuild(session, user_id)
+            session.commit()
+            analyze(session)
+            session.commit()
+            results = {}
+            for label, day_of_week in (('all_days', None), ('day_of_week', 3)):
+                results[label] = {
+                    'single_pass': measure(lambda: session.execute(analytics_query(user_id, day_of_week)).one(),
+                                           repeat),
+                    'rollup': measure(lambda: read_stats(session, user_id, day_of_week), repeat),
+                }
+            return results
+        finally:
+            session.rollback()
+            cleanup(session, [user_id])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=Csv(int), default='50,500,5000', help='точек в маршруте')
+    parser.add_argument('--routes', type=int, default=10000, help='маршрутов пользователя для замеров analytics')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--skip-db', action='store_true', help='не выполнять замеры, требующие базы данных')
+    parser.add_argument('--output', help='файл отчета (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = {'routes': {str(points): route_benchmarks(points, args.repeat, rng) for points in args.points}}
+    if not args.skip_db:
+        results['analytics'] = analytics_benchmarks(args.routes, min(args.repeat, 50))
+    write_report({
+        'benchmark': 'micro',
+        'config': {'points': args.points, 'routes': args.routes, 'repeat': args.repeat},
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
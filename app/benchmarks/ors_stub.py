@@ -0,0 +1,146 @@
+"""
+Заглушка API OpenRouteService для замеров без обращения к внешнему сервису.
+
+Отвечает на POST /v2/directions/<профиль>/geojson ответом того же формата, что и OpenRouteService:
+между соседними точками запроса строится ломаная из points точек, продолжительность вычисляется по длине
+маршрута. Перед ответом заглушка ждет latency ± jitter миллисекунд, доля error_rate запросов завершается
+статусом 503. Если задан quota, как и OpenRouteService, заглушка отвечает не более чем на quota запросов
+в минуту, остальные получают статус 429 с заголовком Retry-After. Сервис подключается параметром
+ORS_BASE_URL=http://127.0.0.1:<порт>.
+
+Запуск:
+    python -m benchmarks.ors_stub [--port 8765] [--latency 100] [--jitter 20] [--points 50] [--error-rate 0]
+                                  [--quota 0]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from routes.graph import haversine
+
+WALKING_SPEED = 1.2
+
+
+def directions_response(coordinates, points):
+    """
+    Формирует ответ GeoJSON OpenRouteService для списка координат [[долгота, широта], ...].
+    """
+    route_points = []
+    for (lon1, lat1), (lon2, lat2) in zip(coordinates, coordinates[1:]):
+        for index in range(points):
+            fraction = index / points
+            route_points.append([round(lon1 + (lon2 - lon1) * fraction, 6), round(lat1 + (lat2 - lat1) * fraction, 6)])
+    route_points.append(list(coordinates[-1]))
+    distance = sum(haversine(*start, *end) for start, end in zip(route_points, route_points[1:]))
+    return {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'properties': {'summary': {'distance': distance, 'duration': distance / WALKING_SPEED}},
+            'geometry': {'type': 'LineString', 'coordinates': route_points},
+        }],
+        'metadata': {'timestamp': int(time.time() * 1e3)},
+    }
+
+
+class DirectionsStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.1
+    jitter = 0.0
+    points = 50
+    error_rate = 0.0
+    quota = 0
+    quota_state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def over_quota(self):
+        """
+        Учитывает запрос в текущей минуте и возвращает время в секундах до ее окончания, если квота исчерпана.
+        """
+        if not self.quota:
+            return None
+        state = self.quota_state
+        with state['lock']:
+            now = time.monotonic()
+            if now - state['started'] >= 60:
+                state['started'], state['count'] = now, 0
+            state['count'] += 1
+            if state['count'] > self.quota:
+                return 60 - (now - state['started'])
+        return None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        retry_after = self.over_quota()
+        if retry_after is not None:
+            return self.send_json(429, {'error': {'code': 4290, 'message': 'Rate Limit Exceeded'}},
+                                  {'Retry-After': str(int(retry_after) + 1)})
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if not self.path.startswith('/v2/directions/'):
+            return self.send_json(404, {'error': 'Not found'})
+        if random.random() < self.error_rate:
+            return self.send_json(503, {'error': 'Service unavailable'})
+        try:
+            coordinates = json.loads(body)['coordinates']
+            payload = directions_response(coordinates, self.points)
+        except (ValueError, KeyError, TypeError, IndexError) as exc:
+            return self.send_json(400, {'error': str(exc)})
+        self.send_json(200, payload)
+
+
+def start(port=8765, latency=100, jitter=0, points=50, error_rate=0.0, host='127.0.0.1', quota=0):
+    """
+    Запускает заглушку в фоновом потоке и возвращает сервер (остановка — server.shutdown()).
+
+    Args:
+        latency (float): Задержка ответа в миллисекундах.
+        jitter (float): Максимальное случайное отклонение задержки в миллисекундах.
+        points (int): Количество точек ломаной между соседними точками запроса.
+        error_rate (float): Доля запросов, завершающихся статусом 503.
+        quota (int): Максимальное количество ответов в минуту (0 — без ограничения).
+    """
+    handler = type('DirectionsStub', (DirectionsStubHandler,), {
+        'latency': latency / 1e3, 'jitter': jitter / 1e3, 'points': points, 'error_rate': error_rate,
+        'quota': quota, 'quota_state': {'lock': threading.Lock(), 'started': time.monotonic(), 'count': 0},
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='ors-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=100, help='задержка ответа, мс')
+    parser.add_argument('--jitter', type=float, default=0, help='случайное отклонение задержки, мс')
+    parser.add_argument('--points', type=int, default=50, help='точек ломаной между точками запроса')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 503')
+    parser.add_argument('--quota', type=int, default=0, help='запросов в минуту, остальные — ответ 429')
+    args = parser.parse_args()
+    server = start(args.port, args.latency, args.jitter, args.points, args.error_rate, host=args.host,
+                   quota=args.quota)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Общие функции замеров: сводка времени выполнения и запись отчета в формате JSON.
+
+Отчеты всех замеров содержат раздел environment (версия Python, платформа, ревизия git), чтобы результаты
+разных запусков можно было сравнивать командой python -m benchmarks.compare.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def summarize(timings_ms):
+    """
+    Возвращает сводку по списку длительностей в миллисекундах: количество, среднее, перцентили и максимум.
+    """
+    if not len(timings_ms):
+        return {'count': 0}
+    values = np.asarray(timings_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {
+        'count': int(len(values)),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(values.max()),
+    }
+
+
+def measure(function, repeat=100, number=1, warmup=1):
+    """
+    Замеряет время выполнения function(): repeat замеров по number вызовов.
+
+    Returns:
+        dict: Сводка summarize по времени одного вызова и количество вызовов в секунду.
+    """
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) * 1e3 / number)
+    result = summarize(timings)
+    result['ops_per_sec'] = 1e3 / result['mean_ms'] if result['mean_ms'] else None
+    return result
+
+
+def environment():
+    """
+    Возвращает описание окружения, в котором выполнялся замер.
+    """
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'revision': revision,
+    }
+
+
+def write_report(report, output=None):
+    """
+    Выводит отчет в формате JSON в stdout или записывает его в файл output.
+    """
+    data = json.dumps({'environment': environment(), **report}, indent=2, default=str)
+    if output:
+        with open(output, 'w') as file:
+            file.write(data + '\n')
+    else:
+        print(data)
@@ -0,0 +1,125 @@
+"""
+Замер векторного вычисления метрик маршрутов (analytics.route_metrics).
+
+Создает пользователя с заданным количеством маршрутов и замеряет по этапам:
+- distribution: чтение колонок всех маршрутов пользователя одним запросом (metrics_query), преобразование
+  в массивы (route_columns) и вычисление распределений (distribution);
+- geometries: декодирование геометрий всех маршрутов в один массив (RouteGeometries.from_blobs) и вычисление
+  длин маршрутов и самых длинных отрезков; для сравнения — то же вычисление циклом Python по маршрутам
+  (geometry.decode_array и haversine для каждого маршрута) на первых --loop-routes маршрутах;
+- page: страница /analytics/routes размером --page-size (page_query и page_metrics с отрезками).
+
+Запуск из каталога app (нужна база данных из .env):
+    python -m benchmarks.route_metrics --routes 100000 --points 50 --repeat 5
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+import geometry
+from analytics.route_metrics import RouteGeometries, distribution, haversine, metrics_query, page_metrics, \
+    page_query, route_columns
+from benchmarks.report import write_report
+from benchmarks.seed import analyze, cleanup, seed_routes, seed_users
+from database import Session, Routes, migrate
+
+
+def timed(function, repeat):
+    """
+    Выполняет function repeat раз после прогрева и возвращает медиану времени в миллисекундах и последний результат.
+    """
+    result = function()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1e3)
+    return round(statistics.median(timings), 2), result
+
+
+def loop_lengths(blobs):
+    """
+    Длины маршрутов и самые длинные отрезки, вычисленные отдельно для каждого маршрута.
+    """
+    lengths, longest = [], []
+    for blob in blobs:
+        points = geometry.decode_array(blob)
+        segments = haversine(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+        lengths.append(float(segments.sum()))
+        longest.append(float(segments.max()) if len(segments) else 0.0)
+    return lengths, longest
+
+
+def measure_distribution(session, user_id, repeat):
+    stages = {}
+    stages['query_ms'], row = timed(lambda: session.execute(metrics_query(user_id)).one(), repeat)
+    stages['columns_ms'], columns = timed(lambda: route_columns(row), repeat)
+    stages['distribution_ms'], _ = timed(lambda: distribution(columns), repeat)
+    stages['total_ms'], _ = timed(lambda: distribution(route_columns(session.execute(metrics_query(user_id)).one())),
+                                  repeat)
+    return stages
+
+
+def measure_geometries(session, user_id, loop_routes, repeat):
+    blobs = session.scalars(select(Routes.route_geometry).where(Routes.user_id == user_id)
+                            .order_by(Routes.id)).all()
+
+    def vectorized():
+        geometries = RouteGeometries.from_blobs(blobs)
+        return geometries.lengths(), geometries.max_segments()
+
+    stages = {'routes': len(blobs)}
+    stages['vectorized_ms'], (lengths, longest) = timed(vectorized, repeat)
+    head = blobs[:loop_routes]
+    stages['vectorized_loop_routes_ms'], _ = timed(lambda: RouteGeometries.from_blobs(head).lengths(), repeat)
+    stages['loop_routes'] = len(head)
+    stages['loop_ms'], (loop_length, loop_longest) = timed(lambda: loop_lengths(head), repeat)
+    stages['speedup'] = round(stages['loop_ms'] / stages['vectorized_loop_routes_ms'], 1)
+    stages['max_difference_m'] = float(max(np.abs(lengths[:len(head)] - loop_length).max(),
+                                           np.abs(longest[:len(head)] - loop_longest).max()))
+    return stages
+
+
+def measure_page(session, user_id, page_size, repeat):
+    total_ms, _ = timed(lambda: page_metrics(session.execute(page_query(user_id, limit=page_size)).all(), True),
+                        repeat)
+    return {'page_size': page_size, 'total_ms': total_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', type=int, default=100000)
+    parser.add_argument('--points', type=int, default=50, help='точек в геометрии маршрута')
+    parser.add_argument('--loop-routes', type=int, default=10000, help='маршрутов для вычисления циклом Python')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='файл отчета (по умолчанию stdout)')
+    parser.add_argument('--keep', action='store_true', help='не удалять созданные данные')
+    args = parser.parse_args()
+
+    migrate()
+    with Session() as session:
+        user_id, = seed_users(session, 1)
+        seed_routes(session, user_id, args.routes, args.points)
+        session.commit()
+        analyze(session)
+        try:
+            write_report({
+                'benchmark': 'route_metrics',
+                'config': {name: getattr(args, name) for name in ('routes', 'points', 'loop_routes', 'page_size')},
+                'results': {
+                    'distribution': measure_distribution(session, user_id, args.repeat),
+                    'geometries': measure_geometries(session, user_id, args.loop_routes, args.repeat),
+                    'page': measure_page(session, user_id, args.page_size, args.repeat),
+                },
+            }, args.output)
+        finally:
+            if not args.keep:
+                cleanup(session, [user_id])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Заполнение базы данных синтетическими пользователями и маршрутами для замеров.
+
+Создаваемые пользователи получают имена с префиксом BENCHMARK_PREFIX, по которому cleanup удаляет их вместе
+с маршрутами, статистикой и пользователями, зарегистрированными во время нагрузочного теста.
+"""
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, text
+
+import geometry
+import spatial
+from database import Routes, RouteGeometryLevel, RouteJob, RouteStats, User
+
+BENCHMARK_PREFIX = 'benchmark-'
+
+# Центр области, в которой строятся синтетические маршруты (долгота, широта).
+CENTER = (37.6173, 55.7558)
+
+
+def random_points(rng, count, center=CENTER, spread=0.05, step=0.0005):
+    """
+    Возвращает случайную ломаную из count точек, начинающуюся не дальше spread градусов от center.
+    """
+    lon = center[0] + rng.uniform(-spread, spread)
+    lat = center[1] + rng.uniform(-spread, spread)
+    heading = rng.uniform(0, 2 * math.pi)
+    points = []
+    for _ in range(count):
+        points.append([round(lon, 6), round(lat, 6)])
+        heading += rng.gauss(0, 0.3)
+        lon += step * math.cos(heading)
+        lat += step * math.sin(heading)
+    return points
+
+
+def geometry_templates(rng, count, points):
+    """
+    Возвращает count заранее закодированных геометрий маршрутов с ограничивающими прямоугольниками.
+
+    Маршруты получают геометрию из этого набора, чтобы заполнение не тратило время на кодирование каждой ломаной.
+    """
+    templates = []
+    for _ in range(count):
+        route_points = random_points(rng, points)
+        min_lon, min_lat, max_lon, max_lat = spatial.bounds(route_points) or (None, None, None, None)
+        templates.append({
+            'route_geometry': geometry.encode(route_points),
+            'min_lon': min_lon,
+            'min_lat': min_lat,
+            'max_lon': max_lon,
+            'max_lat': max_lat,
+        })
+    return templates
+
+
+def seed_users(session, count):
+    """
+    Создает count пользователей и возвращает список их ID.
+    """
+    suffix = time.time_ns()
+    rows = [{'username': f'{BENCHMARK_PREFIX}{suffix}-{index}',
+             'email': f'{BENCHMARK_PREFIX}{suffix}-{index}@example.com',
+             'password': 'benchmark'} for index in range(count)]
+    return list(session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), rows))
+
+
+def seed_routes(session, user_id, count, points=50, chunk_size=10000, rng=None):
+    """
+    Создает count маршрутов пользователя с геометрией из points точек и возвращает список их ID.
+
+    Около 70% маршрутов получают время окончания. Статистика route_stats не обновляется:
+    после заполнения ее пересчитывает analytics.rollup.rebuild.
+    """
+    rng = rng or random.Random()
+    templates = geometry_templates(rng, 64, points)
+    start = datetime(2020, 1, 1)
+    route_ids = []
+    for offset in range(0, count, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, count - offset)):
+            start_time = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 4))
+            duration = rng.uniform(600, 14400)
+            rows.append({
+                'user_id': user_id,
+                'name': 'benchmark',
+                'start_time': start_time,
+                'duration': duration,
+                'distance': duration * rng.uniform(0.8, 1.6),
+                'end_time': start_time + timedelta(seconds=duration * rng.uniform(0.7, 1.5))
+                if rng.random() < 0.7 else None,
+                **rng.choice(templates),
+            })
+        route_ids.extend(session.scalars(insert(Routes).returning(Routes.id, sort_by_parameter_order=True), rows))
+    return route_ids
+
+
+def analyze(session):
+    """
+    Обновляет статистику планировщика после массовой вставки.
+    """
+    session.execute(text('ANALYZE routes'))
+    session.execute(text('ANALYZE users'))
+
+
+def cleanup(session, user_ids=None):
+    """
+    Удаляет пользователей замеров (переданных или всех с префиксом BENCHMARK_PREFIX) вместе с их данными.
+    """
+    if user_ids is None:
+        user_ids = list(session.scalars(select(User.id).where(User.username.startswith(BENCHMARK_PREFIX))))
+    if not user_ids:
+        return
+    route_ids = select(Routes.id).where(Routes.user_id.in_(user_ids))
+    session.execute(delete(RouteJob).where(RouteJob.route_id.in_(route_ids)))
+    session.execute(delete(RouteGeometryLevel).where(RouteGeometryLevel.route_id.in_(route_ids)))
+    session.execute(delete(RouteStats).where(RouteStats.user_id.in_(user_ids)))
+    session.execute(delete(Routes).where(Routes.user_id.in_(user_ids)))
+    session.execute(delete(User).where(User.id.in_(user_ids)))
+    session.commit()
@@ -0,0 +1,106 @@
+"""
+Замеры сериализации страницы GET /routes в JSON.
+
+    flask    стандартный JSON-провайдер Flask: геометрия декодируется в списки координат (Routes.row_to_dict)
+    stdlib   FastJSONProvider без orjson (JSON_ENCODER=stdlib): точки геометрии вставляются готовым фрагментом
+    orjson   FastJSONProvider с orjson (если установлен)
+
+Каждый замер формирует страницу из routes маршрутов по points точек — от строк результата запроса до тела
+ответа в байтах, как при выдаче страницы. Перед замерами проверяется, что все варианты дают одинаковый JSON.
+
+Запуск из каталога app:
+    python -m benchmarks.serialization --points 50,500,5000 --routes 100 --repeat 50 --output serialization.json
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from decouple import Csv
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import geometry
+import json_provider
+from benchmarks.report import measure, write_report
+from benchmarks.seed import random_points
+from database import Routes, ROUTE_FIELDS
+
+
+def page_rows(rng, routes, points):
+    """
+    Возвращает строки, соответствующие выборке Routes.fields_columns(ROUTE_FIELDS) для routes маршрутов.
+    """
+    start_time = datetime(2024, 1, 1)
+    rows = []
+    for index in range(routes):
+        values = []
+        for field in ROUTE_FIELDS:
+            if field == 'route':
+                values += [geometry.encode(random_points(rng, points, step=0.001)), None]
+            elif field in ('start_time', 'end_time'):
+                values.append(start_time + timedelta(hours=index))
+            elif field in ('name', 'status'):
+                values.append(f'benchmark-{index}')
+            else:
+                values.append(index * 1.5)
+        rows.append(values)
+    return rows
+
+
+def provider(encoder):
+    """
+    Возвращает функцию, сериализующую страницу маршрутов в bytes так же, как ответ API с данным кодировщиком.
+    """
+    app = Flask('benchmark')
+    fields = list(ROUTE_FIELDS)
+    if encoder == 'flask':
+        default = DefaultJSONProvider(app)
+        return lambda rows: default.dumps({'data': [Routes.row_to_dict(row, fields) for row in rows],
+                                           'next_cursor': None}, separators=(',', ':')).encode()
+    previous = json_provider.JSON_ENCODER
+    json_provider.JSON_ENCODER = encoder
+    fast = json_provider.FastJSONProvider(app)
+    json_provider.JSON_ENCODER = previous
+
+    def dumps(rows):
+        json_provider.JSON_ENCODER = encoder
+        try:
+            return fast.dumps_bytes({'data': [Routes.row_to_dict(row, fields, raw=True) for row in rows],
+                                     'next_cursor': None})
+        finally:
+            json_provider.JSON_ENCODER = previous
+    return dumps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=Csv(int), default='50,500,5000', help='точек в маршруте')
+    parser.add_argument('--routes', type=int, default=100, help='маршрутов на странице')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help='файл отчета (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    encoders = ['flask', 'stdlib'] + (['orjson'] if json_provider.orjson is not None else [])
+    rng = random.Random(0)
+    results = {}
+    for points in args.points:
+        rows = page_rows(rng, args.routes, points)
+        dumps = {encoder: provider(encoder) for encoder in encoders}
+        expected = json.loads(dumps['flask'](rows))
+        for encoder in encoders:
+            if json.loads(dumps[encoder](rows)) != expected:
+                raise AssertionError(f'{encoder} output differs from flask')
+        results[str(points)] = {
+            'response_bytes': {encoder: len(dumps[encoder](rows)) for encoder in encoders},
+            **{encoder: measure(lambda: dumps[encoder](rows), args.repeat) for encoder in encoders},
+        }
+    write_report({
+        'benchmark': 'serialization',
+        'config': {'points': args.points, 'routes': args.routes, 'repeat': args.repeat, 'encoders': encoders},
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Замеры времени запуска сервиса.
+
+    imports   время импорта модуля приложения (по умолчанию manage) в новом процессе по данным python -X importtime:
+              общее время, собственное и накопленное время самых медленных модулей и собственное время по пакетам
+    gunicorn  время от запуска gunicorn до первого ответа и объем памяти рабочих процессов, не общей с другими
+              процессами (Private_* из /proc/PID/smaps_rollup, только Linux), с загрузкой приложения в главном
+              процессе (GUNICORN_PRELOAD=True) и без нее; выполняется с параметром --gunicorn
+
+Для импорта нужны переменные окружения DB_* из .env, подключение к базе данных не требуется
+(кроме замеров gunicorn, где выполняется запрос к /directions_cache).
+
+Запуск из каталога app:
+    python -m benchmarks.startup --repeat 5 --top 30 --output startup.json
+    python -m benchmarks.startup --gunicorn --gunicorn-workers 4
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.report import summarize, write_report
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_times(module):
+    """
+    Импортирует module в новом процессе и возвращает время импорта в секундах
+    и словарь {модуль: (собственное время, накопленное время)} в микросекундах.
+    """
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=APP_DIR,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            modules[match[4]] = (int(match[1]), int(match[2]))
+    return elapsed, modules
+
+
+def imports_benchmark(module, repeat, top):
+    """
+    Возвращает медианы времени импорта module по repeat запускам.
+    """
+    walls, runs = [], []
+    for _ in range(repeat):
+        elapsed, modules = import_times(module)
+        walls.append(elapsed * 1e3)
+        runs.append(modules)
+    names = set.intersection(*(set(run) for run in runs))
+    self_ms = {name: float(np.median([run[name][0] for run in runs])) / 1e3 for name in names}
+    cumulative_ms = {name: float(np.median([run[name][1] for run in runs])) / 1e3 for name in names}
+    packages = defaultdict(float)
+    for name, value in self_ms.items():
+        packages[name.split('.')[0]] += value
+    slowest = sorted(names, key=lambda name: cumulative_ms[name], reverse=True)
+    return {
+        'process_ms': summarize(walls),
+        'import_ms': cumulative_ms.get(module),
+        'modules': {name: {'self_ms': round(self_ms[name], 3), 'cumulative_ms': round(cumulative_ms[name], 3)}
+                    for name in slowest[:top]},
+        'packages': {name: round(value, 3) for name, value in
+                     sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]},
+    }
+
+
+def private_memory_mb(pid):
+    """
+    Возвращает объем памяти процесса, не общей с другими процессами, в мегабайтах или None.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as file:
+            private = sum(int(line.split()[1]) for line in file if line.startswith(('Private_Clean', 'Private_Dirty')))
+    except OSError:
+        return None
+    return round(private / 1024, 1)
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as file:
+            return [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+
+
+def gunicorn_benchmark(preload, workers, port, repeat):
+    """
+    Запускает gunicorn repeat раз и возвращает время до первого ответа и память рабочих процессов.
+    """
+    from benchmarks.load import wait_ready
+
+    ready_ms, memory = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                                   '--workers', str(workers), 'wsgi:app'], cwd=APP_DIR,
+                                  env={**os.environ, 'GUNICORN_PRELOAD': str(preload)},
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(f'http://127.0.0.1:{port}', server)
+            ready_ms.append((time.perf_counter() - started) * 1e3)
+            # Рабочие процессы, запущенные позже первого, успевают завершить загрузку.
+            time.sleep(2)
+            memory.extend(value for value in map(private_memory_mb, child_pids(server.pid)) if value is not None)
+        finally:
+            server.terminate()
+            server.wait()
+    return {
+        'ready_ms': summarize(ready_ms),
+        'worker_private_mb': round(float(np.mean(memory)), 1) if memory else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='manage', help='импортируемый модуль')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=30, help='количество модулей и пакетов в отчете')
+    parser.add_argument('--gunicorn', action='store_true', help='замерить запуск gunicorn')
+    parser.add_argument('--gunicorn-workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--output', help='файл отчета (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    results = {'imports': imports_benchmark(args.module, args.repeat, args.top)}
+    if args.gunicorn:
+        results['gunicorn'] = {
+            'preload' if preload else 'no_preload': gunicorn_benchmark(preload, args.gunicorn_workers, args.port,
+                                                                      args.repeat)
+            for preload in (True, False)
+        }
+    write_report({
+        'benchmark': 'startup',
+        'config': {'module': args.module, 'repeat': args.repeat, 'gunicorn_workers': args.gunicorn_workers},
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,90 @@
 import atexit
 from decouple import config
-from sqlalchemy import Column, String, Integer, DateTime, create_engine, JSON, ForeignKey, Float
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, create_engine, JSON, ForeignKey, Float, SmallInteger, \
+    Computed, Index, LargeBinary, text, null, func
+from sqlalchemy.orm import sessionmaker, scoped_session, DeclarativeBase, deferred, undefer_group
+import geometry
+import json_provider
+import metrics
+import spatial
 
 PG_DSN = f"postgresql://{config('DB_USER')}:{config('DB_PASSWORD')}@{config('DB_HOST')}/{config('DB_NAME')}"
-engine = create_engine(PG_DSN)
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=5, cast=int)
+DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=5, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)
+DB_POOL_RECYCLE = config('DB_POOL_RECYCLE', default=1800, cast=int)
+DB_POOL_PRE_PING = config('DB_POOL_PRE_PING', default=True, cast=bool)
+DB_STATEMENT_TIMEOUT = config('DB_STATEMENT_TIMEOUT', default=30000, cast=int)
+DB_APPLICATION_NAME = config('DB_APPLICATION_NAME', default='route_service')
+
+
+def make_engine(dsn):
+    """
+    Создает engine с пулом соединений, настроенным параметрами DB_*.
+
+    Каждый процесс держит не более DB_POOL_SIZE + DB_MAX_OVERFLOW соединений, поэтому для gunicorn с N процессами
+    (и фонового обработчика) max_connections Postgres должен быть не меньше N * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+    Соединения проверяются перед выдачей из пула (DB_POOL_PRE_PING) и пересоздаются через DB_POOL_RECYCLE секунд,
+    поэтому после перезапуска Postgres запросы не падают на разорванных соединениях. Запросы дольше
+    DB_STATEMENT_TIMEOUT миллисекунд (0 — без ограничения) прерываются сервером.
+    """
+    options = f'-c statement_timeout={DB_STATEMENT_TIMEOUT}' if DB_STATEMENT_TIMEOUT else ''
+    new_engine = create_engine(dsn,
+                               pool_size=DB_POOL_SIZE,
+                               max_overflow=DB_MAX_OVERFLOW,
+                               pool_timeout=DB_POOL_TIMEOUT,
+                               pool_recycle=DB_POOL_RECYCLE,
+                               pool_pre_ping=DB_POOL_PRE_PING,
+                               connect_args={'application_name': DB_APPLICATION_NAME, 'options': options})
+    atexit.register(new_engine.dispose)
+    metrics.instrument_engine(new_engine)
+    return new_engine
+
+
+engine = make_engine(PG_DSN)
+# Реплика только для чтения (DB_REPLICA_HOST), на которую направляются GET /routes и /analytics.
+# Без реплики чтение выполняется через основной engine.
+read_engine = make_engine(f"postgresql://{config('DB_USER')}:{config('DB_PASSWORD')}@{DB_REPLICA_HOST}/"
+                          f"{config('DB_NAME')}") if DB_REPLICA_HOST else engine
+
+# Сессии с явным временем жизни (with Session() as session) для фоновых обработчиков, команд и вспомогательного кода.
 Session = sessionmaker(engine)
-atexit.register(engine.dispose)
+ReadSession = sessionmaker(read_engine)
+metrics.instrument_sessions(Session)
+metrics.instrument_sessions(ReadSession)
+
+# Сессии обработки HTTP-запроса: одна сессия на поток, закрывается в конце запроса (remove_sessions).
+request_session = scoped_session(Session)
+read_request_session = scoped_session(ReadSession)
+
+
+def remove_sessions(exc=None):
+    """
+    Закрывает сессии текущего запроса, откатывая незафиксированные изменения и возвращая соединения в пул.
+    """
+    request_session.remove()
+    read_request_session.remove()
+
+
+def reset_pools():
+    """
+    Сбрасывает пулы соединений, унаследованные от родительского процесса (gunicorn с preload_app, см. gunicorn.conf.py).
+
+    Соединения родителя не закрываются и больше не используются в этом процессе: новые соединения открываются
+    при первом обращении, поэтому процессы не делят между собой сокеты Postgres.
+    """
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+
+
+def disable_statement_timeout(session):
+    """
+    Снимает ограничение DB_STATEMENT_TIMEOUT до конца текущей транзакции для длительных операций обслуживания.
+    """
+    session.execute(text('SET LOCAL statement_timeout = 0'))
+
 
 class Base(DeclarativeBase):
     pass
@@ -19,6 +97,8 @@ class User(Base):
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     created_at = Column(DateTime, autoincrement=True)
+    # Номер версии данных пользователя, увеличивается при каждом изменении его маршрутов (см. response_cache).
+    data_version = Column(BigInteger, nullable=False, default=0, server_default='0')
 
     def __str__(self):
         return self.username
@@ -26,15 +106,30 @@ class User(Base):
 
 class Routes(Base):
     __tablename__ = 'routes'
+    __table_args__ = (
+        Index('ix_routes_user_id_start_time', 'user_id', 'start_time'),
+        Index('ix_routes_user_id_day_of_week', 'user_id', 'day_of_week'),
+        Index('ix_routes_user_id_id', 'user_id', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     start_time = Column(DateTime)
+    day_of_week = Column(SmallInteger, Computed('CAST(EXTRACT(dow FROM start_time) AS SMALLINT)', persisted=True))
     duration = Column(Float)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     name = Column(String, nullable=True)
-    route_points = Column(JSON)
+    # Устаревший формат геометрии (JSON), заполнен только у маршрутов, не перенесенных migrate_geometry.
+    route_points = deferred(Column(JSON), group='geometry')
+    route_geometry = deferred(Column(LargeBinary), group='geometry')
     distance = Column(Float)
     end_time = Column(DateTime)
+    # pending — маршрут ожидает построения фоновым обработчиком, ready — построен, failed — построить не удалось.
+    status = Column(String, nullable=False, default='ready', server_default='ready')
+    # Ограничивающий прямоугольник геометрии маршрута.
+    min_lon = Column(Float)
+    min_lat = Column(Float)
+    max_lon = Column(Float)
+    max_lat = Column(Float)
 
     @property
     def to_dict(self):
@@ -43,10 +138,220 @@ class Routes(Base):
             'name': self.name,
             'duration': self.duration,
             'distance': self.distance,
-            'route': self.route_points,
+            'route': route_payload(self.route_geometry, self.route_points),
             'start_time': self.start_time,
-            'end_time': self.end_time
+            'end_time': self.end_time,
+            'status': self.status
         }
 
+    @classmethod
+    def fields_columns(cls, fields, geometry_column=None):
+        """
+        Возвращает колонки, которые нужно выбрать для полей to_dict из fields.
+
+        geometry_column заменяет колонку route_geometry, например геометрией другого уровня детализации.
+        """
+        columns = [getattr(cls, column) for field in fields for column in ROUTE_FIELDS[field]]
+        if geometry_column is not None:
+            columns = [geometry_column if column is cls.route_geometry else column for column in columns]
+        return columns
+
+    @staticmethod
+    def row_to_dict(values, fields, raw=False):
+        """
+        Преобразует значения колонок, выбранных по fields_columns, в словарь полей to_dict.
+
+        При raw=True точки геометрии возвращаются готовым JSON-фрагментом (см. json_provider.RawJSON).
+        """
+        values = iter(values)
+        result = {}
+        for field in fields:
+            if field == 'route':
+                result[field] = route_payload(next(values), next(values), raw)
+            else:
+                result[field] = next(values)
+        return result
+
+
+# Ограничивающий прямоугольник маршрута как значение типа box; по нему построен GiST-индекс ix_routes_bbox.
+route_box = func.box(func.point(Routes.min_lon, Routes.min_lat), func.point(Routes.max_lon, Routes.max_lat))
+Index('ix_routes_bbox', route_box, postgresql_using='gist')
+
+
+def query_box(min_lon, min_lat, max_lon, max_lat):
+    """
+    Возвращает SQL-выражение прямоугольника для сравнения с route_box.
+    """
+    return func.box(func.point(min_lon, min_lat), func.point(max_lon, max_lat))
+
+
+# Соответствие полей Routes.to_dict колонкам таблицы routes.
+ROUTE_FIELDS = {
+    'id': ('id',),
+    'name': ('name',),
+    'duration': ('duration',),
+    'distance': ('distance',),
+    'route': ('route_geometry', 'route_points'),
+    'start_time': ('start_time',),
+    'end_time': ('end_time',),
+    'status': ('status',),
+}
+
+
+def route_payload(route_geometry, route_points=None, raw=False):
+    """
+    Возвращает геометрию маршрута в формате ответа API, декодируя ее только при обращении.
+
+    При raw=True точки возвращаются JSON-фрагментом, который JSON-провайдер приложения вставляет в ответ как есть.
+    """
+    if route_geometry is not None:
+        if raw:
+            return {'route_points': json_provider.geometry_json(route_geometry)}
+        return {'route_points': geometry.decode(route_geometry)}
+    return route_points
+
+
+class RouteJob(Base):
+    __tablename__ = 'route_jobs'
+
+    route_id = Column(Integer, ForeignKey('routes.id', ondelete='CASCADE'), primary_key=True)
+    coordinates = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+    last_error = Column(String)
+
+
+class RouteGeometryLevel(Base):
+    __tablename__ = 'route_geometry_lods'
+
+    route_id = Column(Integer, ForeignKey('routes.id', ondelete='CASCADE'), primary_key=True)
+    lod = Column(SmallInteger, primary_key=True)
+    tolerance = Column(Float, nullable=False)
+    geometry = Column(LargeBinary, nullable=False)
+
+
+class RouteStats(Base):
+    __tablename__ = 'route_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    day_of_week = Column(SmallInteger, primary_key=True)
+    route_count = Column(Integer, nullable=False, default=0)
+    finished_count = Column(Integer, nullable=False, default=0)
+    deviation_count = Column(Integer, nullable=False, default=0)
+    deviation_sum = Column(Float, nullable=False, default=0)
+    distance_sum = Column(Float, nullable=False, default=0)
+    time_sum = Column(Float, nullable=False, default=0)
+
+
+class DirectionsCacheEntry(Base):
+    __tablename__ = 'directions_cache'
+
+    key = Column(String(40), primary_key=True)
+    profile = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# Состояние общих ограничителей частоты запросов (см. routes.limiter.PostgresTokenBucket).
+class RateLimitBucket(Base):
+    __tablename__ = 'rate_limit_buckets'
+
+    name = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+# Ключ рекомендательной блокировки Postgres, под которой выполняется migrate.
+MIGRATION_LOCK_KEY = 0x726f757465730001
+
+# Идемпотентные изменения схемы для баз данных, созданных предыдущими версиями сервиса.
+MIGRATIONS = [
+    'ALTER TABLE routes ADD COLUMN IF NOT EXISTS day_of_week SMALLINT '
+    'GENERATED ALWAYS AS (CAST(EXTRACT(dow FROM start_time) AS SMALLINT)) STORED',
+    'CREATE INDEX IF NOT EXISTS ix_routes_user_id_start_time ON routes (user_id, start_time)',
+    'CREATE INDEX IF NOT EXISTS ix_routes_user_id_day_of_week ON routes (user_id, day_of_week)',
+    'CREATE INDEX IF NOT EXISTS ix_routes_user_id_id ON routes (user_id, id)',
+    'ALTER TABLE routes ADD COLUMN IF NOT EXISTS route_geometry BYTEA',
+    "ALTER TABLE routes ADD COLUMN IF NOT EXISTS status VARCHAR NOT NULL DEFAULT 'ready'",
+    'ALTER TABLE routes ADD COLUMN IF NOT EXISTS min_lon DOUBLE PRECISION',
+    'ALTER TABLE routes ADD COLUMN IF NOT EXISTS min_lat DOUBLE PRECISION',
+    'ALTER TABLE routes ADD COLUMN IF NOT EXISTS max_lon DOUBLE PRECISION',
+    'ALTER TABLE routes ADD COLUMN IF NOT EXISTS max_lat DOUBLE PRECISION',
+    'CREATE INDEX IF NOT EXISTS ix_routes_bbox ON routes '
+    'USING gist (box(point(min_lon, min_lat), point(max_lon, max_lat)))',
+    'ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0',
+]
+
+
+def migrate():
+    """
+    Создает недостающие таблицы и применяет MIGRATIONS. Повторный запуск безопасен.
+
+    Выполняется отдельным шагом развертывания (сервис migrate в docker-compose.yml) до запуска сервиса.
+    Одновременные запуски выполняются по очереди: на время миграции берется рекомендательная блокировка Postgres.
+    """
+    with engine.connect() as lock:
+        disable_statement_timeout(lock)
+        lock.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+        try:
+            Base.metadata.create_all(bind=engine)
+            with engine.begin() as connection:
+                disable_statement_timeout(connection)
+                for statement in MIGRATIONS:
+                    connection.execute(text(statement))
+            migrate_geometry()
+            migrate_bounds()
+        finally:
+            lock.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+
+
+def migrate_geometry(batch_size=1000):
+    """
+    Переносит геометрию маршрутов из JSON-колонки route_points в двоичную колонку route_geometry.
+
+    Маршруты обрабатываются порциями по batch_size, каждая порция фиксируется отдельной транзакцией
+    вместе с увеличением версии данных владельцев маршрутов, поэтому перенос можно прервать и запустить повторно.
+    Маршруты со статусом pending пропускаются: их геометрию записывает фоновый обработчик после построения маршрута.
+    """
+    from response_cache import bump_data_version
+    while True:
+        with Session() as session:
+            routes = session.query(Routes).options(undefer_group('geometry')) \
+                .filter(Routes.route_geometry.is_(None), Routes.status != 'pending') \
+                .limit(batch_size).with_for_update(skip_locked=True).all()
+            if not routes:
+                return
+            for route in routes:
+                route.route_geometry = geometry.encode((route.route_points or {}).get('route_points') or [])
+                route.route_points = null()
+            bump_data_version(session, [route.user_id for route in routes])
+            session.commit()
+
+
+
+def migrate_bounds(batch_size=1000):
+    """
+    Заполняет ограничивающие прямоугольники маршрутов, у которых они не вычислены (кроме маршрутов
+    со статусом pending). Порция фиксируется вместе с увеличением версии данных владельцев маршрутов.
+    """
+    from response_cache import bump_data_version
+    last_id = 0
+    while True:
+        with Session() as session:
+            routes = session.query(Routes).options(undefer_group('geometry')) \
+                .filter(Routes.id > last_id, Routes.min_lon.is_(None), Routes.route_geometry.is_not(None),
+                        Routes.status != 'pending') \
+                .order_by(Routes.id).limit(batch_size).all()
+            if not routes:
+                return
+            for route in routes:
+                box = spatial.bounds(geometry.decode(route.route_geometry))
+                if box is not None:
+                    route.min_lon, route.min_lat, route.max_lon, route.max_lat = box
+            last_id = routes[-1].id
+            bump_data_version(session, [route.user_id for route in routes])
+            session.commit()
+
+
 if __name__ == '__main__':
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    migrate()
@@ -0,0 +1,130 @@
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+import numpy as np
+
+FORMAT_VERSION = 1
+DEFAULT_PRECISION = 6
+HEADER = struct.Struct('<BBB')
+
+
+def encode(points, precision=DEFAULT_PRECISION):
+    """
+    Кодирует список координат маршрута в компактное двоичное представление.
+
+    Координаты округляются до precision знаков после запятой и хранятся как 32-битные целые:
+    первая точка целиком, остальные — разностью с предыдущей точкой. Заголовок содержит версию
+    формата, точность и размерность точек.
+
+    Args:
+        points (list of list of float): Список координат [[долгота, широта], ...].
+        precision (int): Количество сохраняемых знаков после запятой.
+
+    Returns:
+        bytes: Закодированная геометрия.
+    """
+    dimensions = len(points[0]) if points else 2
+    factor = 10 ** precision
+    values = array('i')
+    previous = [0] * dimensions
+    for point in points:
+        for index in range(dimensions):
+            value = round(point[index] * factor)
+            values.append(value - previous[index])
+            previous[index] = value
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return HEADER.pack(FORMAT_VERSION, precision, dimensions) + values.tobytes()
+
+
+def decode_ints(blob):
+    """
+    Декодирует геометрию в целочисленные координаты.
+
+    Returns:
+        tuple: (precision, список последовательностей целых значений по каждой размерности).
+    """
+    version, precision, dimensions = HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported geometry format version: {version}')
+    values = array('i')
+    values.frombytes(bytes(blob[HEADER.size:]))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return precision, [list(accumulate(values[index::dimensions])) for index in range(dimensions)]
+
+
+def decode(blob):
+    """
+    Декодирует геометрию, закодированную encode, в список координат.
+
+    Значения совпадают с исходными координатами, округленными до точности кодирования.
+
+    Args:
+        blob (bytes): Закодированная геометрия.
+
+    Returns:
+        list of list of float: Список координат [[долгота, широта], ...].
+    """
+    precision, columns = decode_ints(blob)
+    factor = 10 ** precision
+    return [[value / factor for value in point] for point in zip(*columns)]
+
+
+def decode_array(blob):
+    """
+    Декодирует геометрию в массив NumPy формы (количество точек, размерность) без построения списков Python.
+
+    Значения совпадают с результатом decode.
+    """
+    version, precision, dimensions = HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported geometry format version: {version}')
+    deltas = np.frombuffer(blob, dtype='<i4', offset=HEADER.size).reshape(-1, dimensions)
+    return np.cumsum(deltas, axis=0, dtype=np.int64) / float(10 ** precision)
+
+
+def point_count(blob):
+    """
+    Возвращает количество точек геометрии без декодирования координат.
+    """
+    _, _, dimensions = HEADER.unpack_from(blob)
+    return (len(blob) - HEADER.size) // (4 * dimensions)
+
+
+def decode_many(blobs):
+    """
+    Декодирует несколько геометрий в один массив координат NumPy.
+
+    Геометрии с одинаковым заголовком декодируются одной операцией над общим массивом разностей,
+    без цикла Python по точкам и маршрутам. Значения совпадают с результатом decode_array.
+
+    Args:
+        blobs (list of bytes): Закодированные геометрии.
+
+    Returns:
+        tuple: (массив координат формы (количество точек, размерность), массив границ offsets длины len(blobs) + 1);
+               точки геометрии i — points[offsets[i]:offsets[i + 1]].
+    """
+    headers = {bytes(blob[:HEADER.size]) for blob in blobs}
+    if len(headers) > 1:
+        arrays = [decode_array(blob) for blob in blobs]
+        counts = np.array([len(points) for points in arrays], dtype=np.int64)
+        return np.concatenate(arrays), np.concatenate(([0], np.cumsum(counts)))
+    version, precision, dimensions = HEADER.unpack(headers.pop()) if headers else (FORMAT_VERSION, 0, 2)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported geometry format version: {version}')
+    counts = np.fromiter(((len(blob) - HEADER.size) // (4 * dimensions) for blob in blobs), dtype=np.int64,
+                         count=len(blobs))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    deltas = np.frombuffer(b''.join(blob[HEADER.size:] for blob in blobs), dtype='<i4').reshape(-1, dimensions) \
+        .astype(np.int64)
+    # Первая точка каждой геометрии записана целиком: из нее вычитается последняя точка предыдущей геометрии
+    # (сумма ее разностей), после чего одна накопленная сумма по общему массиву дает координаты всех геометрий.
+    starts = offsets[:-1][counts > 0]
+    if len(starts) > 1:
+        deltas[starts[1:]] -= np.add.reduceat(deltas, starts, axis=0)[:-1]
+    np.cumsum(deltas, axis=0, out=deltas)
+    return deltas / float(10 ** precision), offsets
@@ -0,0 +1,39 @@
+"""
+Настройки gunicorn (файл загружается автоматически при запуске gunicorn из каталога приложения).
+
+При GUNICORN_PRELOAD=True (по умолчанию) приложение импортируется один раз в главном процессе, а рабочие процессы
+создаются его копированием (fork): им не нужно заново импортировать Flask, SQLAlchemy, pydantic и модули сервиса,
+а страницы памяти с загруженным кодом остаются общими, пока не изменяются (copy-on-write). Объекты, созданные
+при импорте, переносятся в постоянное поколение сборщика мусора (gc.freeze), чтобы сборка мусора в рабочих
+процессах не изменяла их заголовки и не копировала общие страницы. Пулы соединений с базой данных после fork
+сбрасываются (database.reset_pools), поэтому процессы не делят соединения главного процесса.
+"""
+import gc
+import sys
+
+# Имена верхнего уровня этого файла gunicorn считает настройками, поэтому config импортируется вместе с модулем.
+import decouple
+
+preload_app = decouple.config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+
+def on_starting(server):
+    import metrics
+    metrics.clear_snapshots()
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    if decouple.config('DIRECTIONS_BACKEND', default='ors') == 'local':
+        # Граф загружается до fork и становится общим для всех рабочих процессов.
+        from routes.backends import get_backend
+        get_backend()
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    database = sys.modules.get('database')
+    if database is not None:
+        database.reset_pools()
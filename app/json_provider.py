@@ -0,0 +1,139 @@
+"""
+Сериализация ответов API в JSON.
+
+FastJSONProvider заменяет стандартный JSON-провайдер Flask. Если установлен orjson (JSON_ENCODER=auto или orjson),
+ответы кодируются им сразу в байты, иначе (или при JSON_ENCODER=stdlib) — модулем json стандартной библиотеки.
+Формат ответов в обоих случаях совпадает с форматом Flask: ключи отсортированы, даты — в формате HTTP-date.
+
+Геометрия маршрутов может передаваться в ответ как RawJSON — готовый JSON-текст, который вставляется в результат
+без разбора и повторного кодирования. geometry_json формирует его непосредственно из двоичной геометрии
+(см. geometry.decode_array), минуя построение списков Python.
+"""
+import json
+import re
+import secrets
+
+from decouple import config
+from flask.json.provider import DefaultJSONProvider
+
+import geometry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_ENCODER = config('JSON_ENCODER', default='auto')
+
+
+class RawJSON:
+    """
+    Заранее закодированный фрагмент JSON, вставляемый в ответ без изменений.
+
+    Args:
+        data (bytes | str): Корректный JSON-текст.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data if isinstance(data, bytes) else data.encode()
+
+    def __repr__(self):
+        return f'RawJSON({self.data[:40]!r}{"..." if len(self.data) > 40 else ""})'
+
+
+def use_orjson():
+    if JSON_ENCODER == 'stdlib':
+        return False
+    if JSON_ENCODER == 'orjson' and orjson is None:
+        raise ImportError('JSON_ENCODER=orjson requires the orjson package')
+    return orjson is not None
+
+
+def geometry_json(blob):
+    """
+    Кодирует двоичную геометрию маршрута в JSON-массив координат [[долгота, широта], ...].
+    """
+    points = geometry.decode_array(blob)
+    if use_orjson():
+        return RawJSON(orjson.dumps(points, option=orjson.OPT_SERIALIZE_NUMPY))
+    return RawJSON(json.dumps(points.tolist(), separators=(',', ':')))
+
+
+class _Fragments:
+    """
+    Подстановка фрагментов RawJSON для кодировщиков, не умеющих вставлять готовый JSON.
+
+    Вместо фрагмента кодируется строка-метка с управляющими символами и случайным префиксом,
+    которая после кодирования заменяется текстом фрагмента.
+    """
+
+    def __init__(self, default):
+        self.fallback = default
+        self.fragments = []
+        self.prefix = None
+
+    def default(self, value):
+        if isinstance(value, RawJSON):
+            if self.prefix is None:
+                self.prefix = secrets.token_hex(8)
+            self.fragments.append(value.data)
+            return f'\x00{self.prefix}:{len(self.fragments) - 1}\x00'
+        return self.fallback(value)
+
+    def substitute(self, text):
+        if not self.fragments:
+            return text
+        pattern = re.compile(r'"\\u0000' + self.prefix + r':(\d+)\\u0000"')
+        if isinstance(text, bytes):
+            return pattern.sub(lambda match: self.fragments[int(match[1])], text.decode()).encode()
+        return pattern.sub(lambda match: self.fragments[int(match[1])].decode(), text)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON-провайдер Flask с кодированием через orjson (если доступен) и поддержкой RawJSON.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.orjson = use_orjson()
+        self.fragment = getattr(orjson, 'Fragment', None) if self.orjson else None
+
+    def _orjson_default(self, value):
+        if isinstance(value, RawJSON):
+            return self.fragment(value.data)
+        return self.default(value)
+
+    def dumps_bytes(self, obj):
+        """
+        Кодирует obj в JSON с параметрами провайдера по умолчанию и возвращает bytes.
+        """
+        if self.orjson:
+            options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                options |= orjson.OPT_SORT_KEYS
+            if self.fragment is not None:
+                return orjson.dumps(obj, default=self._orjson_default, option=options)
+            fragments = _Fragments(self.default)
+            return fragments.substitute(orjson.dumps(obj, default=fragments.default, option=options))
+        return self.dumps(obj, separators=(',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if self.orjson and not kwargs:
+            return self.dumps_bytes(obj).decode()
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        fragments = _Fragments(kwargs.pop('default', self.default))
+        return fragments.substitute(json.dumps(obj, default=fragments.default, **kwargs))
+
+    def loads(self, s, **kwargs):
+        if self.orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
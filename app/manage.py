@@ -1,18 +1,29 @@
 from flask import Flask
 from urls import urls
-from api import api
+from api import api, SWAGGER_ENABLED
 from users.views import ns
 from routes.views import ns_routes, set_routes
 from analytics.views import analytics_namespace
+from monitoring.views import monitoring_namespace
+from database import remove_sessions
+from json_provider import FastJSONProvider
+import metrics
+import profiling
 
 app = Flask('app')
+app.json = FastJSONProvider(app)
 
 
-api.init_app(app)
+api.init_app(app, add_specs=SWAGGER_ENABLED)
 api.add_namespace(ns)
 api.add_namespace(ns_routes)
 api.add_namespace(analytics_namespace)
 api.add_namespace(set_routes)
+api.add_namespace(monitoring_namespace)
+
+app.teardown_appcontext(remove_sessions)
+metrics.init_app(app)
+profiling.init_app(app)
 
 
 for url in urls:
@@ -0,0 +1,380 @@
+"""
+Метрики сервиса в формате Prometheus.
+
+Гистограммы и счетчики хранятся в памяти процесса и выдаются конечной точкой /metrics (см. monitoring.views).
+Время обработки HTTP-запросов измеряется обработчиками Flask (init_app), время SQL-запросов и транзакций —
+обработчиками событий SQLAlchemy (instrument_engine, instrument_sessions), отдельные этапы обработки
+запроса (обращение к сервису построения маршрутов, проверка данных, сериализация) — контекстным менеджером span.
+
+Под gunicorn каждый процесс ведет свои метрики. Если задан каталог METRICS_DIR, процессы не реже чем раз
+в METRICS_FLUSH_INTERVAL секунд записывают в него снимки своих метрик, и /metrics суммирует снимки всех
+процессов. Снимки предыдущего запуска удаляются при запуске gunicorn (clear_snapshots, см. gunicorn.conf.py).
+"""
+import bisect
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from decouple import config
+from sqlalchemy import event
+
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+# Длительности этапов текущего HTTP-запроса: {этап: [суммарное время в секундах, количество]}.
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+class Registry:
+    """
+    Набор метрик процесса.
+
+    Функции, добавленные add_collector, вызываются перед каждым снимком и обновляют метрики,
+    значения которых ведутся вне реестра (например, счетчики кэша маршрутов).
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, function):
+        self.collectors.append(function)
+        return function
+
+    def snapshot(self):
+        """
+        Возвращает значения всех метрик в виде, пригодном для записи в JSON.
+        """
+        for collector in self.collectors:
+            collector()
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames), 'values': values}
+
+
+class Counter(Metric):
+    """
+    Монотонно растущий счетчик.
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """
+        Устанавливает значение счетчика, который ведется вне реестра.
+        """
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    """
+    Текущее значение величины.
+    """
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Распределение значений по корзинам buckets (верхние границы в порядке возрастания).
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Количество значений в каждой корзине, последний элемент — значения больше всех границ; сумма.
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+        return {'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames),
+                'buckets': list(self.buckets), 'values': values}
+
+
+HTTP_REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                                  ('method', 'endpoint', 'status'))
+HTTP_REQUEST_QUERIES = Histogram('http_request_db_queries', 'Количество SQL-запросов на один HTTP-запрос',
+                                 ('method', 'endpoint'), buckets=COUNT_BUCKETS)
+SPAN_DURATION = Histogram('app_span_duration_seconds', 'Время выполнения этапа обработки запроса', ('span',))
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Время выполнения SQL-запроса', ('operation',))
+DB_QUERY_ERRORS = Counter('db_query_errors_total', 'Количество SQL-запросов, завершившихся ошибкой', ('operation',))
+DB_TRANSACTION_DURATION = Histogram('db_transaction_duration_seconds',
+                                    'Время от начала транзакции сессии до ее завершения')
+
+
+def add_timing(name, elapsed):
+    """
+    Добавляет длительность этапа к данным текущего HTTP-запроса (см. request_timings).
+    """
+    timings = _request_timings.get()
+    if timings is not None:
+        timing = timings.setdefault(name, [0.0, 0])
+        timing[0] += elapsed
+        timing[1] += 1
+
+
+def request_timings():
+    """
+    Возвращает длительности этапов текущего HTTP-запроса {этап: [время в секундах, количество]} или None вне запроса.
+    """
+    return _request_timings.get()
+
+
+@contextmanager
+def span(name):
+    """
+    Измеряет время выполнения блока как этапа name обработки запроса.
+
+    Пример:
+        >>> with span('directions'):
+        ...     route = backend.directions(coordinates, profile)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_DURATION.observe(elapsed, span=name)
+        add_timing(name, elapsed)
+
+
+def sql_operation(statement):
+    operation = statement.lstrip()[:6].upper() if statement else ''
+    return operation if operation in SQL_OPERATIONS else 'OTHER'
+
+
+def instrument_engine(engine):
+    """
+    Подключает измерение времени и количества SQL-запросов к engine.
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - connection.info['query_started'].pop()
+        DB_QUERY_DURATION.observe(elapsed, operation=sql_operation(statement))
+        add_timing('db', elapsed)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        connection = context.connection
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
+        DB_QUERY_ERRORS.inc(operation=sql_operation(context.statement))
+
+
+def instrument_sessions(session_factory):
+    """
+    Подключает измерение длительности транзакций сессий, создаваемых session_factory.
+    """
+
+    @event.listens_for(session_factory, 'after_begin')
+    def after_begin(session, transaction, connection):
+        session.info.setdefault('transaction_started', time.perf_counter())
+
+    @event.listens_for(session_factory, 'after_transaction_end')
+    def after_transaction_end(session, transaction):
+        if transaction.parent is None and 'transaction_started' in session.info:
+            DB_TRANSACTION_DURATION.observe(time.perf_counter() - session.info.pop('transaction_started'))
+
+
+def merge(snapshots):
+    """
+    Суммирует снимки метрик нескольких процессов.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'values': {}})
+            for labels, value in metric['values']:
+                key = tuple(labels)
+                current = target['values'].get(key)
+                if current is None:
+                    target['values'][key] = value
+                elif metric['type'] == 'histogram':
+                    target['values'][key] = [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+                else:
+                    target['values'][key] = current + value
+    for metric in merged.values():
+        metric['values'] = [[list(key), value] for key, value in metric['values'].items()]
+    return merged
+
+
+_last_flush = 0.0
+
+
+def flush(force=False):
+    """
+    Записывает снимок метрик процесса в METRICS_DIR, если с прошлой записи прошло METRICS_FLUSH_INTERVAL секунд.
+    """
+    global _last_flush
+    now = time.monotonic()
+    if not METRICS_DIR or (not force and now - _last_flush < METRICS_FLUSH_INTERVAL):
+        return
+    _last_flush = now
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(REGISTRY.snapshot(), file)
+    os.replace(temporary, path)
+
+
+def clear_snapshots():
+    """
+    Удаляет снимки метрик процессов из METRICS_DIR.
+    """
+    if not METRICS_DIR:
+        return
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def collect():
+    """
+    Возвращает метрики процесса или, если задан METRICS_DIR, сумму метрик всех процессов.
+    """
+    if not METRICS_DIR:
+        return REGISTRY.snapshot()
+    flush(force=True)
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        try:
+            with open(path) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return merge(snapshots)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """
+    Формирует текст метрик в формате Prometheus (text/plain; version=0.0.4).
+    """
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        labelnames = metric['labelnames']
+        for labels, value in metric['values']:
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{format_labels(labelnames, labels)} {format_value(value)}')
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + [float('inf')], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labelnames, labels, [("le", format_value(bound))])} '
+                             f'{cumulative}')
+            lines.append(f'{name}_sum{format_labels(labelnames, labels)} {format_value(total)}')
+            lines.append(f'{name}_count{format_labels(labelnames, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """
+    Подключает к приложению Flask измерение времени обработки запросов и количества SQL-запросов.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = _request_timings.set({})
+
+    @app.after_request
+    def finish_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=request.method,
+                                          endpoint=endpoint, status=response.status_code)
+            timings = _request_timings.get() or {}
+            HTTP_REQUEST_QUERIES.observe(timings.get('db', (0, 0))[1], method=request.method, endpoint=endpoint)
+        flush()
+        return response
+
+    @app.teardown_request
+    def reset_request(exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            try:
+                _request_timings.reset(token)
+            except ValueError:
+                # Обработчик выполняется в другом контексте, например после потоковой выдачи ответа.
+                _request_timings.set(None)
@@ -0,0 +1,68 @@
+from flask.views import MethodView
+from flask import Response
+from flask_restx import Namespace
+import metrics
+from response_cache import response_cache
+from routes.cache import directions_cache
+from routes.limiter import directions_flight, directions_limiter
+
+monitoring_namespace = Namespace('/metrics', description='Метрики сервиса')
+
+DIRECTIONS_CACHE_REQUESTS = metrics.Counter('directions_cache_requests_total',
+                                            'Количество обращений к кэшу ответов сервиса построения маршрутов',
+                                            ('result',))
+DIRECTIONS_CACHE_SIZE = metrics.Gauge('directions_cache_entries', 'Количество записей в кэше ответов процесса')
+DIRECTIONS_RATE_LIMIT_REQUESTS = metrics.Counter('directions_rate_limit_requests_total',
+                                                 'Количество запросов к ограничителю частоты запросов к сервису '
+                                                 'построения маршрутов', ('result',))
+DIRECTIONS_RATE_LIMIT_WAIT = metrics.Counter('directions_rate_limit_wait_seconds_total',
+                                             'Суммарное время ожидания токена ограничителя')
+DIRECTIONS_RATE_LIMIT_WAITING = metrics.Gauge('directions_rate_limit_waiting',
+                                              'Количество запросов процесса, ожидающих токен ограничителя')
+DIRECTIONS_COALESCED = metrics.Counter('directions_coalesced_total',
+                                       'Количество запросов маршрутов, объединенных с одновременным запросом процесса')
+RESPONSE_CACHE_REQUESTS = metrics.Counter('response_cache_requests_total',
+                                          'Количество обращений к кэшу ответов GET /routes и /analytics', ('result',))
+RESPONSE_CACHE_BYTES = metrics.Gauge('response_cache_bytes', 'Размер ответов в кэше процесса в байтах')
+
+
+@metrics.REGISTRY.add_collector
+def collect_directions_cache():
+    stats = directions_cache.stats()
+    DIRECTIONS_CACHE_REQUESTS.set(stats['hits'], result='hit')
+    DIRECTIONS_CACHE_REQUESTS.set(stats['shared_hits'], result='shared_hit')
+    DIRECTIONS_CACHE_REQUESTS.set(stats['misses'], result='miss')
+    DIRECTIONS_CACHE_SIZE.set(stats['size'])
+
+
+@metrics.REGISTRY.add_collector
+def collect_directions_limiter():
+    stats = directions_limiter.stats()
+    DIRECTIONS_RATE_LIMIT_REQUESTS.set(stats['acquired'] - stats['waited'], result='immediate')
+    DIRECTIONS_RATE_LIMIT_REQUESTS.set(stats['waited'], result='waited')
+    DIRECTIONS_RATE_LIMIT_REQUESTS.set(stats['rejected'], result='rejected')
+    DIRECTIONS_RATE_LIMIT_WAIT.set(stats['wait_seconds'])
+    DIRECTIONS_RATE_LIMIT_WAITING.set(stats['waiting'])
+    DIRECTIONS_COALESCED.set(directions_flight.coalesced)
+
+
+@metrics.REGISTRY.add_collector
+def collect_response_cache():
+    stats = response_cache.stats()
+    RESPONSE_CACHE_REQUESTS.set(stats['hits'], result='hit')
+    RESPONSE_CACHE_REQUESTS.set(stats['misses'], result='miss')
+    RESPONSE_CACHE_BYTES.set(stats['bytes'])
+
+
+@monitoring_namespace.route('/metrics')
+class MetricsView(MethodView):
+    @monitoring_namespace.response(200, 'Метрики в формате Prometheus')
+    def get(self):
+        """
+        Возвращает метрики сервиса в текстовом формате Prometheus.
+
+        Гистограммы времени обработки HTTP-запросов, этапов обработки (обращение к сервису построения маршрутов,
+        проверка данных, сериализация), SQL-запросов и транзакций, счетчики кэша маршрутов (см. metrics)
+        и ограничителя частоты запросов к сервису построения маршрутов (см. routes.limiter).
+        """
+        return Response(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,130 @@
+"""
+Профилирование отдельных HTTP-запросов без перезапуска сервиса.
+
+Если PROFILING_ENABLED включен, запрос с заголовком X-Profile выполняется под cProfile:
+    X-Profile: text  — вместо ответа возвращается текстовый отчет pstats (исходный статус — в заголовке X-Profile-Status);
+    X-Profile: store — ответ не меняется, профиль сохраняется в каталог PROFILE_DIR в формате pstats
+                       (python -m pstats, snakeviz), имя файла возвращается в заголовке X-Profile-Id.
+Если задан PROFILING_TOKEN, заголовок X-Profile-Token запроса должен совпадать с ним.
+Доля PROFILING_SAMPLE_RATE запросов без заголовка профилируется и сохраняется автоматически.
+
+Ответы профилируемых запросов получают заголовок Server-Timing с длительностью этапов обработки
+(см. metrics.span) и SQL-запросов. Для потоковых ответов профиль охватывает только формирование ответа
+до начала передачи.
+"""
+import cProfile
+import glob
+import hmac
+import io
+import os
+import pstats
+import random
+import tempfile
+import time
+import uuid
+
+from decouple import config
+
+import metrics
+
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_TOKEN = config('PROFILING_TOKEN', default='')
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILE_DIR = config('PROFILE_DIR', default=os.path.join(tempfile.gettempdir(), 'route_service_profiles'))
+PROFILE_KEEP = config('PROFILE_KEEP', default=100, cast=int)
+PROFILE_REPORT_LINES = 40
+
+
+def requested_mode(headers):
+    """
+    Возвращает режим профилирования запроса ('text' или 'store') или None.
+    """
+    mode = headers.get('X-Profile', '').strip().lower()
+    if mode:
+        if PROFILING_TOKEN and not hmac.compare_digest(headers.get('X-Profile-Token', ''), PROFILING_TOKEN):
+            return None
+        return 'text' if mode == 'text' else 'store'
+    if PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE:
+        return 'store'
+    return None
+
+
+def report(profile, lines=PROFILE_REPORT_LINES):
+    """
+    Возвращает текстовый отчет профиля, отсортированный по накопленному времени.
+    """
+    output = io.StringIO()
+    stats = pstats.Stats(profile, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(lines)
+    return output.getvalue()
+
+
+def store(profile, method, path):
+    """
+    Сохраняет профиль в PROFILE_DIR, оставляя не более PROFILE_KEEP последних профилей, и возвращает имя файла.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f'{time.strftime("%Y%m%dT%H%M%S")}-{method}-{path.strip("/").replace("/", "_") or "root"}-' \
+           f'{uuid.uuid4().hex[:8]}.prof'
+    profile.dump_stats(os.path.join(PROFILE_DIR, name))
+    profiles = sorted(glob.glob(os.path.join(PROFILE_DIR, '*.prof')), key=os.path.getmtime)
+    for path in profiles[:max(0, len(profiles) - PROFILE_KEEP)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return name
+
+
+def server_timing(timings, total):
+    """
+    Формирует значение заголовка Server-Timing по длительностям этапов запроса (см. metrics.request_timings).
+    """
+    entries = [f'{name};dur={elapsed * 1e3:.2f};desc="{count}"' for name, (elapsed, count) in (timings or {}).items()]
+    entries.append(f'total;dur={total * 1e3:.2f}')
+    return ', '.join(entries)
+
+
+def init_app(app):
+    """
+    Подключает к приложению Flask профилирование запросов по заголовку X-Profile.
+    """
+    if not PROFILING_ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def start_profile():
+        mode = requested_mode(request.headers)
+        if mode is None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # В этом потоке уже работает другой профилировщик.
+            return
+        g.profile = (profile, mode, time.perf_counter())
+
+    @app.after_request
+    def finish_profile(response):
+        started = g.pop('profile', None)
+        if started is None:
+            return response
+        profile, mode, started_at = started
+        profile.disable()
+        response.headers['Server-Timing'] = server_timing(metrics.request_timings(), time.perf_counter() - started_at)
+        if mode == 'text':
+            status = response.status_code
+            response = app.response_class(report(profile), mimetype='text/plain',
+                                          headers={'Server-Timing': response.headers['Server-Timing']})
+            response.headers['X-Profile-Status'] = str(status)
+        else:
+            response.headers['X-Profile-Id'] = store(profile, request.method, request.path)
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc):
+        started = g.pop('profile', None)
+        if started is not None:
+            started[0].disable()
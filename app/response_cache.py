@@ -0,0 +1,136 @@
+"""
+Кэширование ответов GET /routes и /analytics с условными запросами (ETag / If-None-Match).
+
+Каждый пользователь имеет номер версии данных users.data_version, который увеличивается в той же транзакции,
+что и любое изменение его маршрутов (bump_data_version). Ответ на запрос чтения однозначно определяется
+пользователем, версией и параметрами запроса, поэтому:
+    - ETag ответа вычисляется из них без обращения к таблице routes, и при совпадении с If-None-Match
+      сервис отвечает 304 после одного чтения строки users по первичному ключу;
+    - сериализованные ответы хранятся в кэше процесса с вытеснением давно не использованных (LRU)
+      и ограничением общего размера RESPONSE_CACHE_BYTES. Записи старых версий не удаляются явно:
+      к ним больше не обращаются, и они вытесняются первыми.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from decouple import config
+from flask import Response, request
+from sqlalchemy import select, update
+
+from database import User
+
+RESPONSE_CACHE_BYTES = config('RESPONSE_CACHE_BYTES', default=64 * 1024 * 1024, cast=int)
+RESPONSE_CACHE_MAX_ITEM_BYTES = config('RESPONSE_CACHE_MAX_ITEM_BYTES', default=4 * 1024 * 1024, cast=int)
+
+
+class ResponseCache:
+    """
+    Потокобезопасный LRU-кэш тел ответов с ограничением общего размера в байтах.
+
+    Args:
+        max_bytes (int): Максимальный суммарный размер тел ответов (0 — кэш отключен).
+        max_item_bytes (int): Ответы большего размера не кэшируются.
+    """
+
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_item_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self.size,
+                    'max_bytes': self.max_bytes}
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES, RESPONSE_CACHE_MAX_ITEM_BYTES)
+
+
+def bump_data_version(session, user_ids):
+    """
+    Увеличивает версию данных пользователей. Вызывается в транзакции, изменяющей их маршруты или статистику;
+    изменения не фиксируются: commit выполняет вызывающий код.
+
+    Строки users блокируются в порядке ID, чтобы параллельные пакетные изменения не приводили к взаимной блокировке.
+    Блокировка FOR NO KEY UPDATE совместима с FOR KEY SHARE, которую берут вставки маршрутов по внешнему ключу
+    на users, поэтому транзакции, уже добавившие маршруты того же пользователя, не блокируют друг друга.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    locked = select(User.id).where(User.id.in_(user_ids)).order_by(User.id).with_for_update(key_share=True)
+    session.execute(update(User).where(User.id.in_(locked)).values(data_version=User.data_version + 1)
+                    .execution_options(synchronize_session=False))
+
+
+def cached_response(session, endpoint, user_id, params, build):
+    """
+    Возвращает ответ на запрос чтения данных пользователя с учетом If-None-Match и кэша ответов.
+
+    Args:
+        session (Session): Сессия, в которой читается версия данных пользователя (до чтения самих данных,
+                           чтобы ответ не оказался старее своей версии).
+        endpoint (str): Имя конечной точки.
+        user_id (int): Идентификатор пользователя.
+        params (dict): Параметры запроса, влияющие на ответ.
+        build (callable): Функция без аргументов, формирующая ответ Flask.
+
+    Returns:
+        Response: 304 без тела, если ETag клиента совпадает с текущим, иначе ответ из кэша или build().
+                  Ответы с кодом, отличным от 200, и ответы несуществующих пользователей не кэшируются.
+    """
+    version = session.scalar(select(User.data_version).where(User.id == user_id))
+    if version is None:
+        return build()
+    key = hashlib.sha1(json.dumps([endpoint, user_id, version, params], sort_keys=True, default=str).encode())\
+        .hexdigest()
+    etag = f'{user_id}-{version}-{key[:16]}'
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        body = response_cache.get(key) if response_cache.max_bytes else None
+        if body is not None:
+            response = Response(body, mimetype='application/json')
+        else:
+            response = build()
+            if response.status_code != 200:
+                return response
+            if response_cache.max_bytes:
+                response_cache.set(key, response.get_data())
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
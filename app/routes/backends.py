@@ -0,0 +1,101 @@
+import threading
+import time
+
+from decouple import config
+
+from routes.client import DirectionsError, get_client
+from routes.graph import WalkingGraph
+from routes.limiter import directions_limiter
+
+
+class DirectionsBackend:
+    """
+    Источник данных для построения маршрутов.
+
+    Реализации возвращают словарь с ключами 'duration', 'route_points', 'start_at' и 'distance'
+    в формате routes.client.DirectionsClient.parse. Перед каждым вызовом directions вызывается acquire.
+    """
+    name = None
+
+    def acquire(self):
+        """
+        Ожидает разрешения на запрос к источнику (см. routes.limiter). По умолчанию ограничения нет.
+        """
+
+    def directions(self, coordinates, profile):
+        raise NotImplementedError
+
+
+class OpenRouteServiceBackend(DirectionsBackend):
+    """
+    Построение маршрутов через API OpenRouteService с ограничением частоты запросов (см. routes.limiter).
+    """
+    name = 'ors'
+
+    def acquire(self):
+        directions_limiter.acquire()
+
+    def directions(self, coordinates, profile):
+        return get_client().directions(coordinates, profile=profile)
+
+
+class LocalGraphBackend(DirectionsBackend):
+    """
+    Построение маршрутов по локальному пешеходному графу (см. routes.graph.WalkingGraph) без обращения к сети.
+
+    Каждая точка маршрута привязывается к ближайшей вершине графа, участки между соседними точками
+    строятся алгоритмом A*. Продолжительность вычисляется по длине маршрута и скорости speed.
+
+    Args:
+        graph (WalkingGraph): Пешеходный граф.
+        speed (float): Скорость пешехода в метрах в секунду.
+    """
+    name = 'local'
+
+    def __init__(self, graph, speed=1.2):
+        self.graph = graph
+        self.speed = speed
+
+    def directions(self, coordinates, profile):
+        graph = self.graph
+        if not len(graph):
+            raise DirectionsError('Local routing graph is empty')
+        nodes = [graph.nearest(float(coordinate[0]), float(coordinate[1])) for coordinate in coordinates]
+        distance = 0.0
+        path = [nodes[0]]
+        for index, (source, target) in enumerate(zip(nodes, nodes[1:])):
+            length, leg = graph.shortest_path(source, target)
+            if leg is None:
+                raise DirectionsError(f'No route found between points {coordinates[index]} and {coordinates[index + 1]}')
+            distance += length
+            path.extend(leg[1:])
+        return {
+            'duration': distance / self.speed,
+            'route_points': [[float(graph.lons[node]), float(graph.lats[node])] for node in path],
+            'start_at': int(time.time() * 1e3),
+            'distance': distance,
+        }
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Возвращает источник построения маршрутов текущего процесса, выбранный параметром DIRECTIONS_BACKEND:
+    ors (по умолчанию) или local (граф из файла LOCAL_GRAPH_PATH).
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = config('DIRECTIONS_BACKEND', default='ors')
+                if name == OpenRouteServiceBackend.name:
+                    _backend = OpenRouteServiceBackend()
+                elif name == LocalGraphBackend.name:
+                    _backend = LocalGraphBackend(WalkingGraph.load(config('LOCAL_GRAPH_PATH')),
+                                                 speed=config('LOCAL_WALKING_SPEED', default=1.2, cast=float))
+                else:
+                    raise ValueError(f'Unknown directions backend: {name}')
+    return _backend
@@ -0,0 +1,384 @@
+"""
+Массовая выгрузка и загрузка маршрутов.
+
+Выгрузка читает таблицу routes серверным курсором порциями по ROUTES_EXPORT_CHUNK строк и записывает каждую
+порцию сразу после чтения, поэтому расход памяти не зависит от количества маршрутов. Форматы:
+    ndjson    одна строка JSON на маршрут
+    arrow     поток Arrow IPC, одна порция — один record batch (нужен pyarrow)
+    parquet   Parquet, одна порция — одна группа строк (нужен pyarrow)
+Геометрия передается в двоичном формате geometry.encode (в NDJSON — строкой base64), ограничивающий
+прямоугольник — колонками min_lon, min_lat, max_lon, max_lat, поэтому ни выгрузка, ни загрузка
+не декодируют координаты.
+
+Загрузка читает файл тех же форматов порциями и добавляет маршруты командой COPY routes FROM STDIN вместо
+вставки объектов ORM. Вместе с каждой порцией в той же транзакции обновляются статистика route_stats
+(analytics.rollup.record_routes) и версии данных пользователей (response_cache.bump_data_version);
+порции фиксируются отдельно. После загрузки для новых маршрутов строятся уровни детализации геометрии
+(simplify.backfill, также увеличивающий версии данных пользователей). Пользователи маршрутов должны существовать. Маршруты получают новые ID,
+с --keep-ids сохраняются ID из файла.
+
+Запуск из каталога app:
+    python -m routes.bulk export routes.ndjson [--format ndjson] [--user-id ID] [--after-id ID]
+    python -m routes.bulk import routes.ndjson [--format ndjson] [--keep-ids] [--skip-levels]
+Формат по умолчанию определяется по расширению файла (.ndjson, .jsonl, .arrow, .parquet), файл «-» — stdout/stdin
+для NDJSON.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+from decouple import config
+from sqlalchemy import select, text
+
+import geometry
+import json_provider
+import spatial
+from analytics.rollup import record_routes
+from database import Session, ReadSession, Routes
+from response_cache import bump_data_version
+from simplify import backfill
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ROUTES_EXPORT_CHUNK = config('ROUTES_EXPORT_CHUNK', default=10000, cast=int)
+
+# Колонки routes в выгрузке. day_of_week вычисляется из start_time, устаревшая колонка route_points
+# не выгружается (геометрию переносит database.migrate_geometry).
+EXPORT_COLUMNS = ('id', 'user_id', 'name', 'start_time', 'end_time', 'duration', 'distance', 'status',
+                  'min_lon', 'min_lat', 'max_lon', 'max_lat', 'route_geometry')
+FORMATS = ('ndjson', 'arrow', 'parquet')
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+EXTENSIONS = {'.ndjson': 'ndjson', '.jsonl': 'ndjson', '.arrow': 'arrow', '.arrows': 'arrow', '.parquet': 'parquet'}
+TIME_COLUMNS = ('start_time', 'end_time')
+BOUNDS_COLUMNS = ('min_lon', 'min_lat', 'max_lon', 'max_lat')
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def check_format(name):
+    """
+    Проверяет, что формат name известен и доступен.
+
+    Raises:
+        ValueError: Если формат неизвестен или для него не установлен pyarrow.
+    """
+    if name not in FORMATS:
+        raise ValueError(f'Unknown format {name!r}, expected one of: {", ".join(FORMATS)}')
+    if name != 'ndjson' and pyarrow is None:
+        raise ValueError(f'Format {name} requires the pyarrow package')
+    return name
+
+
+def format_from_path(path, default='ndjson'):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def arrow_schema():
+    return pyarrow.schema([
+        ('id', pyarrow.int32()),
+        ('user_id', pyarrow.int32()),
+        ('name', pyarrow.string()),
+        ('start_time', pyarrow.timestamp('us')),
+        ('end_time', pyarrow.timestamp('us')),
+        ('duration', pyarrow.float64()),
+        ('distance', pyarrow.float64()),
+        ('status', pyarrow.string()),
+        ('min_lon', pyarrow.float64()),
+        ('min_lat', pyarrow.float64()),
+        ('max_lon', pyarrow.float64()),
+        ('max_lat', pyarrow.float64()),
+        ('route_geometry', pyarrow.binary()),
+    ])
+
+
+def export_query(user_id=None, after_id=None):
+    """
+    Формирует запрос маршрутов для выгрузки в порядке ID: всех или одного пользователя, с ID больше after_id.
+    """
+    query = select(*(getattr(Routes, column) for column in EXPORT_COLUMNS)).order_by(Routes.id)
+    if user_id is not None:
+        query = query.where(Routes.user_id == user_id)
+    if after_id is not None:
+        query = query.where(Routes.id > after_id)
+    return query
+
+
+def read_chunks(session, query, chunk_size=ROUTES_EXPORT_CHUNK):
+    """
+    Читает строки запроса серверным курсором и возвращает их списками не длиннее chunk_size.
+    """
+    yield from session.execute(query.execution_options(yield_per=chunk_size)).partitions()
+
+
+class _Sink(io.RawIOBase):
+    """
+    Буфер, из которого записанные pyarrow данные забираются по частям; tell() возвращает общий объем записи.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def ndjson_record(row):
+    record = dict(zip(EXPORT_COLUMNS, row))
+    for column in TIME_COLUMNS:
+        if record[column] is not None:
+            record[column] = record[column].isoformat()
+    if record['route_geometry'] is not None:
+        record['route_geometry'] = base64.b64encode(record['route_geometry']).decode()
+    return record
+
+
+def encode_ndjson(chunks):
+    if json_provider.use_orjson():
+        dumps = json_provider.orjson.dumps
+    else:
+        def dumps(record):
+            return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode()
+    for rows in chunks:
+        yield b''.join(dumps(ndjson_record(row)) + b'\n' for row in rows)
+
+
+def arrow_batch(rows, schema):
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pyarrow.RecordBatch.from_arrays([pyarrow.array(values, type=field.type)
+                                            for values, field in zip(columns, schema)], schema=schema)
+
+
+def encode_arrow(chunks, file_format):
+    schema = arrow_schema()
+    sink = _Sink()
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+    try:
+        for rows in chunks:
+            writer.write_batch(arrow_batch(rows, schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encode_chunks(chunks, file_format):
+    """
+    Кодирует порции строк export_query в формат file_format и возвращает части файла в байтах по мере кодирования.
+    """
+    if check_format(file_format) == 'ndjson':
+        return encode_ndjson(chunks)
+    return encode_arrow(chunks, file_format)
+
+
+def export_routes(output, file_format='ndjson', user_id=None, after_id=None, chunk_size=ROUTES_EXPORT_CHUNK):
+    """
+    Выгружает маршруты в двоичный файловый объект output.
+
+    Returns:
+        int: Количество выгруженных маршрутов.
+    """
+    count = 0
+
+    def counted(chunks):
+        nonlocal count
+        for rows in chunks:
+            count += len(rows)
+            yield rows
+
+    with ReadSession() as session:
+        chunks = counted(read_chunks(session, export_query(user_id, after_id), chunk_size))
+        for data in encode_chunks(chunks, file_format):
+            output.write(data)
+    return count
+
+
+def read_ndjson(file, chunk_size):
+    rows = []
+    for line in file:
+        if line.strip():
+            rows.append(json.loads(line))
+            if len(rows) >= chunk_size:
+                yield rows
+                rows = []
+    if rows:
+        yield rows
+
+
+def read_records(file, file_format, chunk_size=ROUTES_EXPORT_CHUNK):
+    """
+    Читает маршруты из двоичного файлового объекта file и возвращает их списками словарей не длиннее chunk_size.
+    """
+    if check_format(file_format) == 'ndjson':
+        yield from read_ndjson(file, chunk_size)
+    elif file_format == 'arrow':
+        for batch in pyarrow.ipc.open_stream(file):
+            for offset in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(offset, chunk_size).to_pylist()
+    else:
+        for batch in pyarrow.parquet.ParquetFile(file).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+
+
+def import_row(record, keep_ids=False):
+    """
+    Преобразует запись выгрузки в значения колонок routes.
+
+    Геометрия принимается в формате выгрузки (route_geometry: bytes или base64) или списком координат
+    route_points; ограничивающий прямоугольник вычисляется, только если его нет в записи.
+    Маршрут, выгруженный со статусом pending, загружается со статусом failed: координаты запроса хранятся
+    только в задании route_jobs и не выгружаются, поэтому построить такой маршрут после загрузки нельзя.
+
+    Raises:
+        ValueError: Если геометрия записана в неподдерживаемом формате.
+    """
+    row = {column: record.get(column) for column in EXPORT_COLUMNS if column != 'id' or keep_ids}
+    blob = row['route_geometry']
+    if isinstance(blob, str):
+        blob = base64.b64decode(blob)
+    elif blob is None and record.get('route_points'):
+        blob = geometry.encode(record['route_points'])
+    if blob is not None:
+        version = geometry.HEADER.unpack_from(blob)[0]
+        if version != geometry.FORMAT_VERSION:
+            raise ValueError(f'Unsupported geometry format version: {version}')
+        if row['min_lon'] is None:
+            box = spatial.bounds(geometry.decode_array(blob))
+            if box is not None:
+                row.update(zip(BOUNDS_COLUMNS, box))
+    row['route_geometry'] = blob
+    for column in TIME_COLUMNS:
+        if isinstance(row[column], str):
+            row[column] = datetime.fromisoformat(row[column])
+    row['status'] = 'failed' if row['status'] == 'pending' else row['status'] or 'ready'
+    return row
+
+
+def copy_value(value):
+    """
+    Кодирует значение для текстового формата COPY.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bytes):
+        return '\\\\x' + value.hex()
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    return str(value)
+
+
+def copy_routes(session, rows):
+    """
+    Добавляет строки в routes одной командой COPY. Изменения не фиксируются: commit выполняет вызывающий код.
+    """
+    columns = list(rows[0])
+    data = io.StringIO()
+    for row in rows:
+        data.write('\t'.join(copy_value(row[column]) for column in columns))
+        data.write('\n')
+    data.seek(0)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY routes ({", ".join(columns)}) FROM STDIN', data)
+    finally:
+        cursor.close()
+
+
+def import_routes(file, file_format='ndjson', keep_ids=False, levels=True, chunk_size=ROUTES_EXPORT_CHUNK):
+    """
+    Загружает маршруты из двоичного файлового объекта file. Каждая порция фиксируется отдельно.
+
+    Args:
+        keep_ids (bool): Сохранить ID маршрутов из файла (последовательность routes.id сдвигается за максимальный ID).
+        levels (bool): Построить уровни детализации геометрии новых маршрутов после загрузки.
+
+    Returns:
+        int: Количество загруженных маршрутов.
+    """
+    count = 0
+    for records in read_records(file, file_format, chunk_size):
+        rows = [import_row(record, keep_ids) for record in records]
+        with Session() as session:
+            copy_routes(session, rows)
+            # record_routes читает только атрибуты маршрутов, объекты ORM для этого не нужны.
+            record_routes(session, [SimpleNamespace(**row) for row in rows])
+            bump_data_version(session, [row['user_id'] for row in rows])
+            session.commit()
+        count += len(rows)
+    if keep_ids and count:
+        with Session() as session:
+            session.execute(text("SELECT setval(pg_get_serial_sequence('routes', 'id'), "
+                                 "(SELECT max(id) FROM routes))"))
+            session.commit()
+    if levels and count:
+        backfill()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('path', help='файл выгрузки («-» — stdout/stdin, только NDJSON)')
+    parser.add_argument('--format', choices=FORMATS, help='формат файла (по умолчанию — по расширению)')
+    parser.add_argument('--user-id', type=int, default=None, help='выгрузить маршруты только этого пользователя')
+    parser.add_argument('--after-id', type=int, default=None, help='выгрузить маршруты с ID больше указанного')
+    parser.add_argument('--chunk-size', type=int, default=ROUTES_EXPORT_CHUNK)
+    parser.add_argument('--keep-ids', action='store_true', help='сохранить ID маршрутов из файла')
+    parser.add_argument('--skip-levels', action='store_true',
+                        help='не строить уровни детализации (python simplify.py backfill)')
+    args = parser.parse_args()
+    file_format = args.format or format_from_path(args.path)
+    try:
+        check_format(file_format)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.path == '-' and file_format != 'ndjson':
+        parser.error('stdin/stdout is supported only for ndjson')
+
+    if args.command == 'export':
+        if args.path == '-':
+            count = export_routes(sys.stdout.buffer, file_format, args.user_id, args.after_id, args.chunk_size)
+        else:
+            with open(args.path, 'wb') as output:
+                count = export_routes(output, file_format, args.user_id, args.after_id, args.chunk_size)
+        print(f'Exported {count} routes', file=sys.stderr)
+    else:
+        if args.path == '-':
+            count = import_routes(sys.stdin.buffer, file_format, args.keep_ids, not args.skip_levels, args.chunk_size)
+        else:
+            with open(args.path, 'rb') as file:
+                count = import_routes(file, file_format, args.keep_ids, not args.skip_levels, args.chunk_size)
+        print(f'Imported {count} routes', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from decouple import config
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import OperationalError
+
+from database import Session, DirectionsCacheEntry
+
+
+def quantize_coordinates(coordinates, precision):
+    """
+    Округляет координаты маршрута до заданного количества знаков после запятой.
+
+    Args:
+        coordinates (list of list of float): Список координат [[долгота, широта], ...].
+        precision (int): Количество знаков после запятой.
+
+    Returns:
+        tuple: Кортеж округленных координат, пригодный для использования в качестве ключа.
+    """
+    return tuple(tuple(round(float(value), precision) for value in coordinate) for coordinate in coordinates)
+
+
+# Пространство ключей рекомендательных блокировок Postgres для DirectionsCache.lock.
+DIRECTIONS_LOCK_NAMESPACE = 0x726f7574
+
+
+def lock_key(key):
+    """
+    Возвращает 32-битный ключ рекомендательной блокировки для ключа кэша (шестнадцатеричной строки SHA-1).
+    """
+    return int(key[:8], 16) - 2 ** 31
+
+
+class DirectionsCache:
+    """
+    Кэш ответов сервиса построения маршрутов.
+
+    Ключом служит профиль маршрута и последовательность координат, округленных до precision знаков.
+    Кэш состоит из двух уровней:
+        - локальный (в памяти процесса) с ограничением по времени жизни (TTL) и вытеснением LRU;
+        - общий (таблица directions_cache в Postgres), который позволяет воркерам gunicorn
+          использовать результаты друг друга. Включается параметром shared.
+
+    Атрибуты hits, shared_hits и misses содержат счетчики попаданий и промахов.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, precision=5, shared=False, lock_timeout=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.precision = precision
+        self.shared = shared
+        self.lock_timeout = lock_timeout
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def make_key(self, coordinates, profile):
+        """
+        Формирует ключ кэша по профилю и нормализованной последовательности координат.
+        """
+        raw = json.dumps([profile, quantize_coordinates(coordinates, self.precision)], separators=(',', ':'))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Возвращает закэшированное значение или None, если ключ отсутствует или устарел.
+
+        Сначала проверяется локальный уровень, затем, если он включен, общий уровень в Postgres.
+        Значение, найденное в общем уровне, переносится в локальный.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        if self.shared:
+            value = self._get_shared(key)
+            if value is not None:
+                self._set_local(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value, profile='', session=None):
+        """
+        Сохраняет значение в локальный и, если он включен, в общий уровень кэша.
+
+        Если передана сессия (см. lock), значение записывается в ее транзакции.
+        """
+        self._set_local(key, value)
+        if self.shared:
+            self._set_shared(key, value, profile, session)
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Блокирует ключ во всех процессах на время построения маршрута, если включен общий уровень кэша.
+
+        Возвращает сессию, транзакция которой удерживает рекомендательную блокировку Postgres по ключу
+        (снимается при выходе из блока), или None без общего уровня или если блокировку не удалось получить
+        за lock_timeout секунд. Процесс, получивший блокировку после другого, находит построенный им маршрут
+        повторной проверкой get_shared.
+
+        Сессия удерживает соединение из пула и открытую транзакцию, пока маршрут строится (с таймаутами
+        и повторами запросов к API), поэтому каждое одновременно строящееся в процессе построение занимает
+        одно соединение сверх сессии самого запроса (см. DB_POOL_SIZE и DB_MAX_OVERFLOW).
+
+        Пример:
+            >>> with directions_cache.lock(key) as session:
+            ...     route = directions_cache.get_shared(key, session) if session is not None else None
+        """
+        if not self.shared:
+            yield None
+            return
+        with Session() as session:
+            try:
+                session.execute(select(func.set_config('lock_timeout', f'{int(self.lock_timeout * 1000)}', True)))
+                session.execute(select(func.pg_advisory_xact_lock(DIRECTIONS_LOCK_NAMESPACE, lock_key(key))))
+            except OperationalError:
+                session.rollback()
+                yield None
+                return
+            yield session
+            session.commit()
+
+    def get_shared(self, key, session):
+        """
+        Возвращает значение из общего уровня кэша в транзакции session и переносит его в локальный уровень.
+        """
+        value = self._get_shared(key, session)
+        if value is not None:
+            self._set_local(key, value)
+            with self._lock:
+                self.shared_hits += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Возвращает счетчики попаданий и промахов кэша.
+        """
+        with self._lock:
+            requests_total = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.shared_hits) / requests_total if requests_total else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def _set_local(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, key, session=None):
+        query = select(DirectionsCacheEntry.payload).where(DirectionsCacheEntry.key == key,
+                                                           DirectionsCacheEntry.expires_at > datetime.now())
+        if session is not None:
+            return session.execute(query).scalar()
+        with Session() as session:
+            return session.execute(query).scalar()
+
+    def _set_shared(self, key, value, profile, session=None):
+        expires_at = datetime.now() + timedelta(seconds=self.ttl)
+        statement = insert(DirectionsCacheEntry).values(key=key, profile=profile, payload=value, expires_at=expires_at)
+        statement = statement.on_conflict_do_update(index_elements=[DirectionsCacheEntry.key],
+                                                    set_={'payload': statement.excluded.payload,
+                                                          'expires_at': statement.excluded.expires_at})
+        if session is not None:
+            self._write_shared(session, statement)
+            return
+        with Session() as session:
+            self._write_shared(session, statement)
+            session.commit()
+
+    def _write_shared(self, session, statement):
+        session.execute(statement)
+        self._writes += 1
+        if self._writes % 100 == 0:
+            session.execute(delete(DirectionsCacheEntry).where(DirectionsCacheEntry.expires_at <= datetime.now()))
+
+
+directions_cache = DirectionsCache(maxsize=config('DIRECTIONS_CACHE_SIZE', default=1024, cast=int),
+                                   ttl=config('DIRECTIONS_CACHE_TTL', default=3600, cast=int),
+                                   precision=config('DIRECTIONS_CACHE_PRECISION', default=5, cast=int),
+                                   shared=config('DIRECTIONS_CACHE_SHARED', default=False, cast=bool),
+                                   lock_timeout=config('DIRECTIONS_LOCK_TIMEOUT', default=30, cast=float))
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+
+import requests
+from decouple import config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 429 не повторяется внутри urllib3: лимит запросов обрабатывают routes.limiter и ответ 503
+# с Retry-After (DirectionsRateLimited), а не ожидание в потоке запроса.
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class DirectionsError(Exception):
+    """
+    Ошибка получения маршрута от сервиса построения маршрутов.
+
+    Атрибуты:
+        status (int | None): HTTP-статус ответа, если он был получен.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class DirectionsRateLimited(DirectionsError):
+    """
+    Запрос к сервису построения маршрутов не выполнен из-за ограничения частоты запросов:
+    исчерпан лимит OpenRouteService (ответ 429) или очередь ожидания routes.limiter.
+
+    Атрибуты:
+        retry_after (float | None): Через сколько секунд запрос можно повторить, если это известно.
+    """
+
+    def __init__(self, message, retry_after=None, status=None):
+        super().__init__(message, status)
+        self.retry_after = retry_after
+
+
+class DirectionsClient:
+    """
+    Клиент API OpenRouteService для построения маршрутов.
+
+    Использует одну сессию requests на процесс: соединения переиспользуются (keep-alive) из пула
+    HTTPAdapter, поэтому TLS-рукопожатие выполняется один раз на соединение, а не на каждый запрос.
+    Запросы, завершившиеся статусом 5xx или ошибками соединения, повторяются не более retries раз
+    с экспоненциальной задержкой. Заголовок Retry-After при повторах не учитывается: urllib3 ждет его
+    без ограничения, а время ожидания ответа должно оставаться ограниченным. Ответ 429 не повторяется
+    и сразу приводит к DirectionsRateLimited.
+
+    Args:
+        token (str): API-токен OpenRouteService.
+        base_url (str): Адрес API.
+        connect_timeout (float): Таймаут установки соединения в секундах.
+        read_timeout (float): Таймаут ожидания ответа в секундах.
+        retries (int): Максимальное количество повторов запроса.
+        backoff_factor (float): Коэффициент экспоненциальной задержки между повторами.
+        pool_size (int): Максимальное количество соединений в пуле.
+    """
+
+    def __init__(self, token, base_url='https://api.openrouteservice.org', connect_timeout=3.05, read_timeout=30,
+                 retries=3, backoff_factor=0.5, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept': 'application/json, application/geo+json, application/gpx+xml, img/png; charset=utf-8',
+            'Authorization': token,
+            'Content-Type': 'application/json; charset=utf-8'
+        })
+        retry = Retry(total=retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset({'POST'}),
+                      respect_retry_after_header=False,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def directions(self, coordinates, profile='foot-hiking'):
+        """
+        Запрашивает маршрут по списку координат.
+
+        Ответ разбирается из JSON один раз.
+
+        Args:
+            coordinates (list of list of float): Список координат [[долгота, широта], ...].
+            profile (str): Профиль передвижения OpenRouteService.
+
+        Returns:
+            dict: Словарь с ключами 'duration', 'route_points', 'start_at' и 'distance'.
+
+        Raises:
+            DirectionsError: Если сервис недоступен или вернул ошибку.
+        """
+        try:
+            response = self.session.post(url=f'{self.base_url}/v2/directions/{profile}/geojson',
+                                         json={'coordinates': list(coordinates)},
+                                         timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise DirectionsError(f'Directions service is unavailable: {exc}') from exc
+        if response.status_code == 429:
+            raise DirectionsRateLimited(f'Directions service rate limit exceeded: {response.text[:200]}',
+                                        retry_after=parse_retry_after(response.headers.get('Retry-After')),
+                                        status=429)
+        if not response.ok:
+            raise DirectionsError(f'Directions service error: {response.status_code} {response.text[:200]}',
+                                  status=response.status_code)
+        return self.parse(response.json())
+
+    async def directions_async(self, coordinates, profile='foot-hiking'):
+        """
+        Асинхронный вариант directions для использования из asyncio.
+
+        Запрос выполняется в пуле потоков и использует тот же пул соединений, что и синхронный вызов.
+        """
+        return await asyncio.to_thread(self.directions, coordinates, profile)
+
+    @staticmethod
+    def parse(data):
+        """
+        Извлекает данные маршрута из разобранного ответа GeoJSON.
+        """
+        feature = data['features'][0]
+        summary = feature['properties']['summary']
+        return {
+            'duration': summary['duration'],
+            'route_points': feature['geometry']['coordinates'],
+            'start_at': data['metadata']['timestamp'],
+            'distance': summary['distance'],
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def parse_retry_after(value):
+    """
+    Возвращает значение заголовка Retry-After в секундах или None, если оно не задано числом секунд.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Возвращает клиент OpenRouteService текущего процесса, создавая его при первом обращении.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DirectionsClient(token=config('API_TOKEN'),
+                                           base_url=config('ORS_BASE_URL', default='https://api.openrouteservice.org'),
+                                           connect_timeout=config('ORS_CONNECT_TIMEOUT', default=3.05, cast=float),
+                                           read_timeout=config('ORS_READ_TIMEOUT', default=30, cast=float),
+                                           retries=config('ORS_RETRIES', default=3, cast=int),
+                                           backoff_factor=config('ORS_BACKOFF_FACTOR', default=0.5, cast=float),
+                                           pool_size=config('ORS_POOL_SIZE', default=10, cast=int))
+    return _client
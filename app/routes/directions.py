@@ -0,0 +1,111 @@
+import time
+from datetime import datetime
+
+import geometry
+import metrics
+import spatial
+from routes.cache import directions_cache
+from routes.backends import get_backend
+from routes.limiter import directions_flight
+
+DIRECTIONS_PROFILE = 'foot-hiking'
+
+
+def get_route(coordinates):
+    """
+        Отправляет запрос к сервису OpenRouteService для получения данных маршрута пешеходного похода.
+
+        Данная функция выполняет POST-запрос к API OpenRouteService через общий клиент (см. routes.client.DirectionsClient),
+        передавая координаты начальной и конечной точек маршрута. Вместо OpenRouteService можно использовать
+        локальный граф (DIRECTIONS_BACKEND=local, см. routes.backends).
+        В ответ функция получает данные о маршруте, включая продолжительность пути, точки маршрута и время начала маршрута.
+
+        Ответы кэшируются (см. routes.cache.DirectionsCache) по нормализованной последовательности координат и профилю,
+        поэтому повторные запросы с теми же точками не обращаются к OpenRouteService. Для ответа из кэша
+        'start_at' заменяется текущим временем. Одновременные запросы с одинаковым ключом кэша объединяются
+        в один запрос к сервису (см. routes.limiter.directions_flight и fetch_route).
+
+        Args:
+            coordinates (list of list of float): Список координат, где каждая координата представлена списком из двух элементов [широта, долгота].
+
+        Returns:
+            dict: Словарь с информацией о маршруте, содержащий следующие ключи:
+                'duration' (float): Продолжительность пути в секундах.
+                'route_points' (list of list of float): Список координат точек маршрута.
+                'start_at' (int): Временная метка начала маршрута.
+
+        Пример:
+            >>> get_route([[8.681495,49.41461], [8.687872,49.420318]])
+            {
+                'duration': 600.9,
+                'route_points': [[8.681495, 49.41461], [8.68149, 49.41514], ...],
+                'start_at': 1615464552
+            }
+        """
+    backend = get_backend()
+    profile = f'{backend.name}:{DIRECTIONS_PROFILE}'
+    key = directions_cache.make_key(coordinates, profile)
+    route_data = directions_cache.get(key)
+    if route_data is not None:
+        return dict(route_data, start_at=int(time.time() * 1e3))
+    return dict(directions_flight.do(key, lambda: fetch_route(backend, coordinates, key, profile)))
+
+
+def fetch_route(backend, coordinates, key, profile):
+    """
+    Строит маршрут, которого нет в кэше, и сохраняет его в кэш.
+
+    С общим уровнем кэша маршрут строится под блокировкой ключа во всех процессах: процесс, ожидавший
+    блокировку, берет из кэша маршрут, построенный другим процессом, вместо повторного запроса к сервису.
+    Разрешение ограничителя запросов (backend.acquire) получается до блокировки: ожидание лимита
+    не удерживает соединение с базой данных. Токен процесса, нашедшего маршрут в кэше после ожидания
+    блокировки, остается неиспользованным.
+    """
+    backend.acquire()
+    with directions_cache.lock(key) as session:
+        if session is not None:
+            route_data = directions_cache.get_shared(key, session)
+            if route_data is not None:
+                return dict(route_data, start_at=int(time.time() * 1e3))
+        with metrics.span('directions'):
+            route_data = backend.directions(coordinates, DIRECTIONS_PROFILE)
+        directions_cache.set(key, route_data, profile=profile, session=session)
+        return route_data
+
+
+def route_columns(route):
+    """
+    Формирует значения колонок Routes, получаемые от сервиса построения маршрутов.
+
+    Args:
+        route (dict): Данные маршрута, полученные от get_route.
+
+    Returns:
+        dict: Словарь значений колонок duration, start_time, route_geometry, distance
+              и ограничивающего прямоугольника маршрута.
+    """
+    min_lon, min_lat, max_lon, max_lat = spatial.bounds(route['route_points']) or (None, None, None, None)
+    return {
+        'duration': route['duration'],
+        'start_time': datetime.fromtimestamp(route['start_at'] / 1e3),
+        'route_geometry': geometry.encode(route['route_points']),
+        'distance': route['distance'],
+        'min_lon': min_lon,
+        'min_lat': min_lat,
+        'max_lon': max_lon,
+        'max_lat': max_lat,
+    }
+
+
+def make_route_row(route_data, route):
+    """
+    Формирует значения колонок новой записи Routes построенного маршрута (статус ready).
+
+    Args:
+        route_data (RouteValidator): Проверенные данные маршрута из запроса.
+        route (dict): Данные маршрута, полученные от get_route.
+
+    Returns:
+        dict: Словарь значений колонок таблицы routes.
+    """
+    return {'user_id': route_data.userid, 'name': route_data.name, 'status': 'ready', **route_columns(route)}
@@ -0,0 +1,197 @@
+"""
+Пешеходный граф для локального построения маршрутов без обращения к внешним сервисам.
+
+Граф загружается из файла списка ребер (строки "долгота1,широта1,долгота2,широта2[,длина]") или
+из выгрузки OpenStreetMap в формате XML (.osm) и хранится в компактном виде: координаты вершин —
+в массивах NumPy, смежность — в массивах array в формате CSR (смещения, соседи, длины ребер в метрах).
+"""
+import heapq
+import math
+import xml.etree.ElementTree as ElementTree
+from array import array
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+
+# Значения тега highway, по которым можно пройти пешком.
+WALKABLE_HIGHWAYS = {
+    'footway', 'path', 'pedestrian', 'steps', 'track', 'living_street', 'residential', 'service',
+    'unclassified', 'tertiary', 'tertiary_link', 'secondary', 'secondary_link', 'primary', 'primary_link',
+    'road', 'bridleway', 'cycleway',
+}
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    Возвращает расстояние между двумя точками в метрах по формуле гаверсинусов.
+    """
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class WalkingGraph:
+    """
+    Неориентированный граф пешеходных дорог.
+
+    Args:
+        lons (numpy.ndarray): Долготы вершин.
+        lats (numpy.ndarray): Широты вершин.
+        sources (numpy.ndarray): Начальные вершины ребер.
+        targets (numpy.ndarray): Конечные вершины ребер.
+        lengths (numpy.ndarray | None): Длины ребер в метрах; если не указаны, вычисляются по координатам,
+                                        как и длины отдельных ребер, заданные значением NaN.
+                                        Длина ребра не должна быть меньше расстояния между его концами,
+                                        иначе A* может найти не кратчайший путь.
+    """
+
+    def __init__(self, lons, lats, sources, targets, lengths=None):
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if lengths is None:
+            lengths = self._lengths(sources, targets)
+        lengths = np.array(lengths, dtype=np.float64)
+        missing = np.isnan(lengths)
+        if missing.any():
+            lengths[missing] = self._lengths(sources[missing], targets[missing])
+        # Каждое ребро хранится в обоих направлениях.
+        sources, targets = np.concatenate((sources, targets)), np.concatenate((targets, sources))
+        lengths = np.concatenate((lengths, lengths))
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(self.lons))
+        self.offsets = array('q', np.concatenate(([0], np.cumsum(counts))).tolist())
+        self.neighbors = array('q', targets[order].tolist())
+        self.weights = array('d', lengths[order].tolist())
+        self._lon_values = array('d', self.lons.tolist())
+        self._lat_values = array('d', self.lats.tolist())
+        self._scale = math.cos(math.radians(self.lats.mean())) if len(self.lats) else 1.0
+        self._scaled_lons = np.radians(self.lons) * self._scale
+        self._radian_lats = np.radians(self.lats)
+
+    def __len__(self):
+        return len(self.lons)
+
+    def _lengths(self, sources, targets):
+        lon1, lat1 = np.radians(self.lons[sources]), np.radians(self.lats[sources])
+        lon2, lat2 = np.radians(self.lons[targets]), np.radians(self.lats[targets])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    def nearest(self, lon, lat):
+        """
+        Возвращает индекс вершины, ближайшей к точке (долгота, широта).
+        """
+        dx = self._scaled_lons - math.radians(lon) * self._scale
+        dy = self._radian_lats - math.radians(lat)
+        return int(np.argmin(dx * dx + dy * dy))
+
+    def shortest_path(self, source, target):
+        """
+        Находит кратчайший путь между вершинами алгоритмом A* с эвристикой по расстоянию до цели.
+
+        Returns:
+            tuple: (длина пути в метрах, список индексов вершин) или (None, None), если путь не найден.
+        """
+        lons, lats = self._lon_values, self._lat_values
+        offsets, neighbors, weights = self.offsets, self.neighbors, self.weights
+        target_lon, target_lat = lons[target], lats[target]
+        distances = {source: 0.0}
+        previous = {}
+        queue = [(haversine(lons[source], lats[source], target_lon, target_lat), 0.0, source)]
+        closed = set()
+        while queue:
+            _, distance, node = heapq.heappop(queue)
+            if node == target:
+                path = [node]
+                while node in previous:
+                    node = previous[node]
+                    path.append(node)
+                return distance, path[::-1]
+            if node in closed:
+                continue
+            closed.add(node)
+            for index in range(offsets[node], offsets[node + 1]):
+                neighbor = neighbors[index]
+                candidate = distance + weights[index]
+                if candidate < distances.get(neighbor, math.inf):
+                    distances[neighbor] = candidate
+                    previous[neighbor] = node
+                    estimate = candidate + haversine(lons[neighbor], lats[neighbor], target_lon, target_lat)
+                    heapq.heappush(queue, (estimate, candidate, neighbor))
+        return None, None
+
+    @classmethod
+    def from_edge_list(cls, path, precision=7):
+        """
+        Загружает граф из текстового файла, каждая строка которого описывает ребро:
+        "долгота1,широта1,долгота2,широта2[,длина в метрах]". Пустые строки и строки,
+        начинающиеся с #, пропускаются. Вершины с совпадающими (до precision знаков) координатами объединяются.
+        Длины ребер без длины в файле вычисляются по координатам, заданные длины остальных ребер сохраняются.
+        """
+        index = {}
+        lons, lats, sources, targets, lengths = [], [], [], [], []
+
+        def node(lon, lat):
+            key = (round(lon, precision), round(lat, precision))
+            if key not in index:
+                index[key] = len(lons)
+                lons.append(lon)
+                lats.append(lat)
+            return index[key]
+
+        with open(path) as file:
+            for line in file:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                values = [float(value) for value in line.replace(';', ',').split(',')]
+                sources.append(node(values[0], values[1]))
+                targets.append(node(values[2], values[3]))
+                lengths.append(values[4] if len(values) > 4 else math.nan)
+        return cls(lons, lats, sources, targets, lengths)
+
+    @classmethod
+    def from_osm(cls, path):
+        """
+        Загружает граф из выгрузки OpenStreetMap в формате XML, используя линии с пешеходными значениями тега highway.
+        """
+        coordinates = {}
+        ways = []
+        for _, element in ElementTree.iterparse(path, events=('end',)):
+            if element.tag == 'node':
+                coordinates[element.get('id')] = (float(element.get('lon')), float(element.get('lat')))
+                element.clear()
+            elif element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                if tags.get('highway') in WALKABLE_HIGHWAYS and tags.get('foot') != 'no' and tags.get('access') != 'private':
+                    ways.append([reference.get('ref') for reference in element.iter('nd')])
+                element.clear()
+        index = {}
+        lons, lats, sources, targets = [], [], [], []
+
+        def node(osm_id):
+            if osm_id not in index:
+                index[osm_id] = len(lons)
+                lon, lat = coordinates[osm_id]
+                lons.append(lon)
+                lats.append(lat)
+            return index[osm_id]
+
+        for references in ways:
+            references = [reference for reference in references if reference in coordinates]
+            for start, end in zip(references, references[1:]):
+                sources.append(node(start))
+                targets.append(node(end))
+        return cls(lons, lats, sources, targets)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Загружает граф из файла, выбирая формат по расширению (.osm — OpenStreetMap XML, иначе список ребер).
+        """
+        if path.endswith('.osm'):
+            return cls.from_osm(path)
+        return cls.from_edge_list(path)
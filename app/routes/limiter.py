@@ -0,0 +1,269 @@
+"""
+Ограничение частоты и объединение одинаковых запросов к сервису построения маршрутов.
+
+OpenRouteService ограничивает количество запросов в минуту. Запросы к нему проходят через ограничитель
+directions_limiter — «ведро токенов» (token bucket): ведро вмещает не более DIRECTIONS_RATE_LIMIT_BURST токенов
+и равномерно пополняется со скоростью DIRECTIONS_RATE_LIMIT токенов в минуту, каждый запрос забирает один токен.
+При DIRECTIONS_RATE_LIMIT_SHARED=True состояние ведра хранится в таблице rate_limit_buckets и лимит общий
+для всех процессов gunicorn и фоновых обработчиков; если база данных недоступна, используется ведро процесса.
+Без общего ведра каждый процесс расходует собственный лимит DIRECTIONS_RATE_LIMIT.
+
+Запрос, для которого нет токена, ждет его не дольше DIRECTIONS_RATE_LIMIT_WAIT секунд; одновременно ждать
+могут не более DIRECTIONS_RATE_LIMIT_QUEUE запросов процесса. Остальные запросы сразу завершаются ошибкой
+DirectionsRateLimited (ответ 503 с заголовком Retry-After), а не ждут в очереди без ограничения.
+
+directions_flight объединяет одинаковые одновременные запросы процесса: пока маршрут по ключу кэша строится,
+остальные запросы с тем же ключом ждут его результата и не расходуют токены. Между процессами такие запросы
+объединяются блокировкой ключа в общем кэше маршрутов (см. routes.cache.DirectionsCache.lock).
+"""
+import logging
+import math
+import random
+import threading
+import time
+
+from decouple import config
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import Session, RateLimitBucket
+from routes.client import DirectionsRateLimited
+
+logger = logging.getLogger(__name__)
+
+TAKE_TOKEN = text('''
+    UPDATE rate_limit_buckets AS bucket
+    SET tokens = refilled.tokens - CASE WHEN refilled.tokens >= 1 THEN 1 ELSE 0 END, updated_at = refilled.now
+    FROM (SELECT name, now,
+                 LEAST(:capacity, tokens + :rate * EXTRACT(EPOCH FROM now - updated_at)) AS tokens
+          FROM (SELECT name, tokens, updated_at, CAST(clock_timestamp() AS TIMESTAMP) AS now
+                FROM rate_limit_buckets WHERE name = :name FOR UPDATE) AS locked) AS refilled
+    WHERE bucket.name = refilled.name
+    RETURNING refilled.tokens
+''')
+
+
+class LocalTokenBucket:
+    """
+    Ведро токенов в памяти процесса.
+
+    Args:
+        rate (float): Скорость пополнения, токенов в секунду.
+        capacity (float): Максимальное количество токенов.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Забирает токен, если он есть.
+
+        Returns:
+            float: 0, если токен получен, иначе время в секундах до появления токена.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class PostgresTokenBucket:
+    """
+    Ведро токенов, общее для всех процессов: строка name таблицы rate_limit_buckets.
+
+    Пополнение и расход токена выполняются одним запросом UPDATE под блокировкой строки, время берется
+    с сервера базы данных, поэтому расхождение часов процессов не влияет на лимит.
+
+    Args:
+        name (str): Имя ведра.
+        rate (float): Скорость пополнения, токенов в секунду.
+        capacity (float): Максимальное количество токенов.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def take(self):
+        """
+        Забирает токен, если он есть.
+
+        Returns:
+            float: 0, если токен получен, иначе время в секундах до появления токена.
+        """
+        params = {'name': self.name, 'rate': self.rate, 'capacity': self.capacity}
+        with Session() as session:
+            tokens = session.execute(TAKE_TOKEN, params).scalar()
+            if tokens is None:
+                session.execute(insert(RateLimitBucket)
+                                .values(name=self.name, tokens=self.capacity,
+                                        updated_at=text('CAST(clock_timestamp() AS TIMESTAMP)'))
+                                .on_conflict_do_nothing())
+                tokens = session.execute(TAKE_TOKEN, params).scalar()
+            session.commit()
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов с ограниченным ожиданием токена.
+
+    Args:
+        bucket (LocalTokenBucket | PostgresTokenBucket | None): Ведро токенов (None — без ограничения).
+        max_wait (float): Максимальное время ожидания токена в секундах.
+        max_waiting (int): Максимальное количество запросов процесса, одновременно ожидающих токен.
+        fallback (LocalTokenBucket | None): Ведро, используемое при ошибке базы данных общего ведра.
+
+    Атрибуты acquired, waited, rejected и wait_seconds содержат счетчики полученных токенов, ожиданий,
+    отказов и суммарное время ожидания.
+    """
+
+    def __init__(self, bucket, max_wait=10.0, max_waiting=32, fallback=None):
+        self.bucket = bucket
+        self.max_wait = max_wait
+        self.max_waiting = max_waiting
+        self.fallback = fallback
+        self.acquired = 0
+        self.waited = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def _take(self):
+        try:
+            return self.bucket.take()
+        except SQLAlchemyError:
+            if self.fallback is None:
+                raise
+            logger.warning('Shared rate limit bucket is unavailable, using the local one', exc_info=True)
+            return self.fallback.take()
+
+    def _reject(self, message, delay):
+        with self._lock:
+            self.rejected += 1
+        raise DirectionsRateLimited(message, retry_after=math.ceil(delay))
+
+    def acquire(self):
+        """
+        Получает токен, ожидая его не дольше max_wait секунд.
+
+        Raises:
+            DirectionsRateLimited: Если токен не появится за max_wait секунд или токен уже ждут
+                                   max_waiting запросов процесса.
+        """
+        if self.bucket is None:
+            return
+        delay = self._take()
+        if delay:
+            with self._lock:
+                queue_full = self.waiting >= self.max_waiting
+                if not queue_full:
+                    self.waiting += 1
+            if queue_full:
+                self._reject('Directions rate limit exceeded: too many requests are waiting', self.max_wait)
+            started = time.monotonic()
+            try:
+                while delay:
+                    if time.monotonic() - started + delay > self.max_wait:
+                        self._reject(f'Directions rate limit exceeded: no capacity within {self.max_wait:g}s', delay)
+                    # Случайная добавка разводит во времени процессы, ожидающие один и тот же токен.
+                    time.sleep(delay * random.uniform(1.0, 1.2))
+                    delay = self._take()
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+                    self.wait_seconds += time.monotonic() - started
+            with self._lock:
+                self.waited += 1
+        with self._lock:
+            self.acquired += 1
+
+    def stats(self):
+        with self._lock:
+            return {'acquired': self.acquired, 'waited': self.waited, 'rejected': self.rejected,
+                    'wait_seconds': self.wait_seconds, 'waiting': self.waiting}
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вызовов в процессе.
+
+    Пока выполняется вызов с ключом key, остальные вызовы do с тем же ключом ждут его завершения
+    и получают тот же результат или то же исключение. Атрибут coalesced содержит количество объединенных вызовов.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def make_limiter(rate_per_minute, burst, shared, max_wait, max_waiting):
+    """
+    Создает ограничитель с лимитом rate_per_minute запросов в минуту (0 — без ограничения).
+    """
+    if rate_per_minute <= 0:
+        return RateLimiter(None)
+    rate = rate_per_minute / 60
+    capacity = max(1, burst)
+    local = LocalTokenBucket(rate, capacity)
+    if shared:
+        return RateLimiter(PostgresTokenBucket('directions', rate, capacity), max_wait, max_waiting, fallback=local)
+    return RateLimiter(local, max_wait, max_waiting)
+
+
+directions_limiter = make_limiter(config('DIRECTIONS_RATE_LIMIT', default=0, cast=float),
+                                  burst=config('DIRECTIONS_RATE_LIMIT_BURST', default=5, cast=int),
+                                  shared=config('DIRECTIONS_RATE_LIMIT_SHARED', default=False, cast=bool),
+                                  max_wait=config('DIRECTIONS_RATE_LIMIT_WAIT', default=10, cast=float),
+                                  max_waiting=config('DIRECTIONS_RATE_LIMIT_QUEUE', default=32, cast=int))
+directions_flight = SingleFlight()
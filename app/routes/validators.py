@@ -1,4 +1,13 @@
+from typing import Optional
 from pydantic import BaseModel, validator
+from decouple import config
+from database import ROUTE_FIELDS
+from simplify import LOD_TOLERANCES
+from routes.bulk import check_format
+
+ROUTES_BATCH_LIMIT = config('ROUTES_BATCH_LIMIT', default=1000, cast=int)
+ROUTES_PAGE_SIZE = config('ROUTES_PAGE_SIZE', default=100, cast=int)
+ROUTES_PAGE_LIMIT = config('ROUTES_PAGE_LIMIT', default=1000, cast=int)
 
 
 class RouteValidator(BaseModel):
@@ -26,4 +35,152 @@ class RouteValidator(BaseModel):
 
 class EndTimeValidator(BaseModel):
     userid: int
-    routeid: int
\ No newline at end of file
+    routeid: int
+
+
+class RouteBatchValidator(BaseModel):
+    """
+    Валидатор пакета маршрутов для массового создания.
+
+    Поля:
+        routes (list): Список данных маршрутов. Каждый элемент проверяется RouteValidator отдельно,
+                       чтобы ошибка в одном маршруте не отменяла весь пакет.
+
+    Методы:
+        routes_not_empty(cls, v): Проверяет, что пакет не пуст и не превышает допустимый размер.
+    """
+    routes: list
+    @validator('routes')
+    def routes_not_empty(cls, v):
+        if len(v) == 0:
+            raise ValueError('Routes not entered')
+        if len(v) > ROUTES_BATCH_LIMIT:
+            raise ValueError(f'Batch must contain at most {ROUTES_BATCH_LIMIT} routes')
+        return v
+
+
+
+class RouteListValidator(BaseModel):
+    """
+    Валидатор параметров получения списка маршрутов.
+
+    Поля:
+        userid (int): Идентификатор пользователя.
+        cursor (int | None): ID последнего маршрута предыдущей страницы.
+        limit (int | None): Размер страницы, не более ROUTES_PAGE_LIMIT.
+        fields (list | None): Поля маршрута для ответа, строка через запятую или список.
+        stream (bool): Потоковая выдача всех маршрутов после cursor без разбиения на страницы.
+        lod (int | None): Уровень детализации геометрии, 0 — полная геометрия.
+        tolerance (float | None): Допуск упрощения геометрии в метрах, не совместим с lod.
+        bbox (tuple | None): Прямоугольник (мин. долгота, мин. широта, макс. долгота, макс. широта).
+        near (tuple | None): Точка (долгота, широта) для поиска маршрутов поблизости.
+        radius (float | None): Расстояние до точки near в метрах.
+
+    Методы:
+        limit_in_range(cls, v): Проверяет размер страницы.
+        fields_known(cls, v): Проверяет, что запрошены только существующие поля.
+        lod_in_range(cls, v): Проверяет, что уровень детализации существует.
+        tolerance_positive(cls, v, values): Проверяет допуск и что он не указан вместе с lod.
+        bbox_valid(cls, v): Разбирает прямоугольник и проверяет порядок его координат.
+        near_valid(cls, v): Разбирает координаты точки.
+        radius_with_near(cls, v, values): Проверяет, что near и radius указаны вместе.
+    """
+    userid: int
+    cursor: Optional[int] = None
+    limit: Optional[int] = None
+    fields: Optional[list] = None
+    stream: bool = False
+    lod: Optional[int] = None
+    tolerance: Optional[float] = None
+    bbox: Optional[tuple] = None
+    near: Optional[tuple] = None
+    radius: Optional[float] = None
+    @validator('limit')
+    def limit_in_range(cls, v):
+        if v is not None and not 1 <= v <= ROUTES_PAGE_LIMIT:
+            raise ValueError(f'Limit must be between 1 and {ROUTES_PAGE_LIMIT}')
+        return v
+
+    @validator('fields', pre=True)
+    def fields_known(cls, v):
+        if v is None:
+            return v
+        if isinstance(v, str):
+            v = [field.strip() for field in v.split(',') if field.strip()]
+        unknown = [field for field in v if field not in ROUTE_FIELDS]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(map(str, unknown))}')
+        return v
+
+
+    @validator('lod')
+    def lod_in_range(cls, v):
+        if v is not None and not 0 <= v <= len(LOD_TOLERANCES):
+            raise ValueError(f'Level of detail must be between 0 and {len(LOD_TOLERANCES)}')
+        return v
+
+    @validator('tolerance')
+    def tolerance_positive(cls, v, values):
+        if v is not None and v <= 0:
+            raise ValueError('Tolerance must be positive')
+        if v is not None and values.get('lod') is not None:
+            raise ValueError('Specify either lod or tolerance')
+        return v
+
+    @validator('bbox', pre=True)
+    def bbox_valid(cls, v):
+        if v is None:
+            return v
+        v = parse_numbers(v, 4, 'Bounding box')
+        if v[0] > v[2] or v[1] > v[3]:
+            raise ValueError('Bounding box must be min_lon,min_lat,max_lon,max_lat')
+        return v
+
+    @validator('near', pre=True)
+    def near_valid(cls, v):
+        if v is None:
+            return v
+        return parse_numbers(v, 2, 'Point')
+
+    @validator('radius', always=True)
+    def radius_with_near(cls, v, values):
+        if (v is None) != (values.get('near') is None):
+            raise ValueError('Specify both near and radius')
+        if v is not None and v <= 0:
+            raise ValueError('Radius must be positive')
+        return v
+
+
+def parse_numbers(value, count, name):
+    """
+    Разбирает строку чисел через запятую (или список чисел) ровно из count значений.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    try:
+        numbers = tuple(float(number) for number in value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must contain {count} numbers')
+    if len(numbers) != count:
+        raise ValueError(f'{name} must contain {count} numbers')
+    return numbers
+
+
+class RouteExportValidator(BaseModel):
+    """
+    Валидатор параметров выгрузки маршрутов.
+
+    Поля:
+        format (str): Формат выгрузки: ndjson, arrow или parquet (см. routes.bulk).
+        userid (int | None): Идентификатор пользователя или None для маршрутов всех пользователей.
+        after (int | None): Выгрузить маршруты с ID больше указанного.
+
+    Методы:
+        format_available(cls, v): Проверяет, что формат известен и доступен.
+    """
+    format: str = 'ndjson'
+    userid: Optional[int] = None
+    after: Optional[int] = None
+    @validator('format')
+    def format_available(cls, v):
+        return check_format(v)
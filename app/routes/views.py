@@ -1,84 +1,217 @@
 from flask.views import MethodView
-from flask import jsonify, request
+from flask import jsonify, request, current_app, Response, stream_with_context
 from pydantic_core._pydantic_core import ValidationError
+from sqlalchemy import insert, select, and_, func
 from sqlalchemy.exc import IntegrityError
-from database import Session, Routes
-from decouple import config
-from routes.validators import RouteValidator, EndTimeValidator
+from database import ReadSession, request_session, read_request_session, Routes, RouteGeometryLevel, RouteJob, User, ROUTE_FIELDS, route_box, query_box
+from simplify import simplify
+import geometry
+import metrics
+import spatial
+from routes.validators import RouteValidator, EndTimeValidator, RouteBatchValidator, RouteListValidator, \
+    RouteExportValidator, ROUTES_PAGE_SIZE
+from routes.bulk import MIMETYPES, encode_chunks, export_query, read_chunks
 from datetime import datetime
 from api import api, routes_model
 from flask_restx import Namespace
-import requests
+from routes.cache import directions_cache
+from routes.directions import get_route, make_route_row
+from simplify import save_levels
+from analytics.rollup import record_routes, record_end_time
+from response_cache import bump_data_version, cached_response
+from routes.client import DirectionsError, DirectionsRateLimited
+from concurrent.futures import ThreadPoolExecutor
+import math
+from decouple import config
 
 ns_routes = Namespace('/routes', description='Создание, изменение, получение маршрутов')
 set_routes = Namespace('/set_end_time', description='Установка времени окончания маршрута')
 
+DIRECTIONS_BATCH_WORKERS = config('DIRECTIONS_BATCH_WORKERS', default=8, cast=int)
+ROUTES_STREAM_CHUNK = config('ROUTES_STREAM_CHUNK', default=500, cast=int)
+ROUTES_ASYNC_INGEST = config('ROUTES_ASYNC_INGEST', default=False, cast=bool)
+# Retry-After по умолчанию, если сервис построения маршрутов не сообщил время до снятия ограничения (секунды).
+DIRECTIONS_RETRY_AFTER = 60
+
 
-def get_route(coordinates):
+def parse_bool(value):
     """
-        Отправляет запрос к сервису OpenRouteService для получения данных маршрута пешеходного похода.
-
-        Данная функция выполняет POST-запрос к API OpenRouteService, передавая координаты начальной и конечной точек маршрута.
-        В ответ функция получает данные о маршруте, включая продолжительность пути, точки маршрута и время начала маршрута.
-
-        Args:
-            coordinates (list of list of float): Список координат, где каждая координата представлена списком из двух элементов [широта, долгота].
-
-        Returns:
-            dict: Словарь с информацией о маршруте, содержащий следующие ключи:
-                'duration' (float): Продолжительность пути в секундах.
-                'route_points' (list of list of float): Список координат точек маршрута.
-                'start_at' (int): Временная метка начала маршрута.
-
-        Пример:
-            >>> get_route([[8.681495,49.41461], [8.687872,49.420318]])
-            {
-                'duration': 600.9,
-                'route_points': [[8.681495, 49.41461], [8.68149, 49.41514], ...],
-                'start_at': 1615464552
-            }
-        """
-    headers = {
-        'Accept': 'application/json, application/geo+json, application/gpx+xml, img/png; charset=utf-8',
-        'Authorization': config('API_TOKEN'),
-        'Content-Type': 'application/json; charset=utf-8'
-    }
-    body = {"coordinates":[coordinate for coordinate in coordinates]}
-    response = requests.post(url=f'https://api.openrouteservice.org/v2/directions/foot-hiking/geojson',
-                             headers=headers,
-                             json=body)
-    route_data = {
-        'duration': response.json()['features'][0]['properties']['summary']['duration'],
-        'route_points': response.json()['features'][0]['geometry']['coordinates'],
-        'start_at': response.json()['metadata']['timestamp'],
-        'distance': response.json()['features'][0]['properties']['summary']['distance'],
-    }
-    return route_data
+    Преобразует значение параметра строки запроса в bool.
+    """
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def route_list_query(user_id, fields, cursor=None, limit=None, lod=None, bbox=None, near=None, radius=None):
+    """
+    Формирует запрос страницы маршрутов пользователя по ключу id (keyset-пагинация).
+
+    Первой колонкой всегда выбирается id, далее колонки полей fields. Если указан уровень детализации lod,
+    геометрия берется из route_geometry_lods, а при его отсутствии — полная.
+
+    bbox (мин. долгота, мин. широта, макс. долгота, макс. широта) оставляет маршруты, целиком лежащие
+    в прямоугольнике. near (долгота, широта) и radius (метры) оставляют маршруты, ограничивающий прямоугольник
+    которых пересекает окрестность точки; в этом случае последней колонкой выбирается полная геометрия
+    для точной проверки (см. near_filter). Оба условия используют GiST-индекс ix_routes_bbox.
+    """
+    geometry_column = None
+    if lod and 'route' in fields:
+        geometry_column = func.coalesce(RouteGeometryLevel.geometry, Routes.route_geometry)
+    query = select(Routes.id, *Routes.fields_columns(fields, geometry_column))
+    if geometry_column is not None:
+        query = query.outerjoin(RouteGeometryLevel, and_(RouteGeometryLevel.route_id == Routes.id,
+                                                         RouteGeometryLevel.lod == lod))
+    if near is not None:
+        query = query.add_columns(Routes.route_geometry)
+        query = query.where(route_box.op('&&')(query_box(*spatial.radius_bounds(*near, radius))))
+    if bbox is not None:
+        query = query.where(route_box.op('<@')(query_box(*bbox)))
+    query = query.where(Routes.user_id == user_id).order_by(Routes.id)
+    if cursor is not None:
+        query = query.where(Routes.id > cursor)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def route_serializer(fields, tolerance=None):
+    """
+    Возвращает функцию, преобразующую строку результата route_list_query в словарь полей маршрута.
+
+    Если указан tolerance, геометрия маршрута упрощается с этим допуском (в метрах), иначе точки геометрии
+    передаются в ответ готовым JSON-фрагментом без построения списков координат.
+    """
+    def serialize(row):
+        route = Routes.row_to_dict(row[1:], fields, raw=tolerance is None)
+        if tolerance is not None and route.get('route'):
+            route['route'] = {'route_points': simplify(route['route']['route_points'], tolerance)}
+        return route
+    return serialize
+
+
+def retry_after_header(error):
+    """
+    Возвращает заголовок Retry-After для ответа на запрос, отклоненный ограничителем частоты запросов.
+    """
+    return {'Retry-After': str(math.ceil(error.retry_after or DIRECTIONS_RETRY_AFTER))}
+
+
+def near_filter(near, radius):
+    """
+    Возвращает функцию, проверяющую, что маршрут из строки route_list_query проходит не дальше radius метров
+    от точки near. Геометрия декодируется только для маршрутов, отобранных по индексу.
+    """
+    lon, lat = near
+
+    def matches(row):
+        blob = row[-1]
+        return blob is not None and spatial.distance_to_polyline(geometry.decode(blob), lon, lat) <= radius
+    return matches
+
+
+def fetch_routes(session, query, matches=None, limit=None):
+    """
+    Читает строки запроса порциями по ROUTES_STREAM_CHUNK, оставляя подходящие под matches, не более limit строк.
+    """
+    rows = session.execute(query.execution_options(yield_per=ROUTES_STREAM_CHUNK))
+    count = 0
+    for row in rows:
+        if matches is not None and not matches(row):
+            continue
+        yield row
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
+def stream_routes(query, serialize, matches=None, limit=None):
+    """
+    Генерирует JSON-ответ со списком маршрутов по частям, читая строки из серверного курсора
+    порциями по ROUTES_STREAM_CHUNK.
+    """
+    dumps = current_app.json.dumps
+    yield '{"data": ['
+    with ReadSession() as session:
+        for index, row in enumerate(fetch_routes(session, query, matches, limit)):
+            yield (',' if index else '') + dumps(serialize(row))
+    yield '], "next_cursor": null}'
+
+
 @ns_routes.route('/routes')
 class RouteView(MethodView):
     @ns_routes.expect(routes_model)
-    @ns_routes.doc(params={'userid': {'description': 'ID пользователя', 'in': 'query', 'type': 'integer'}})
+    @ns_routes.doc(params={'userid': {'description': 'ID пользователя', 'in': 'query', 'type': 'integer'},
+                           'cursor': {'description': 'ID последнего маршрута предыдущей страницы (next_cursor)', 'in': 'query', 'type': 'integer'},
+                           'limit': {'description': 'Размер страницы', 'in': 'query', 'type': 'integer'},
+                           'fields': {'description': 'Поля маршрута через запятую, например id,name,distance', 'in': 'query', 'type': 'string'},
+                           'stream': {'description': 'Потоковая выдача всех маршрутов', 'in': 'query', 'type': 'boolean'},
+                           'lod': {'description': 'Уровень детализации геометрии (0 — полная)', 'in': 'query', 'type': 'integer'},
+                           'tolerance': {'description': 'Допуск упрощения геометрии в метрах', 'in': 'query', 'type': 'number'},
+                           'bbox': {'description': 'Маршруты внутри прямоугольника: мин. долгота,мин. широта,макс. долгота,макс. широта', 'in': 'query', 'type': 'string'},
+                           'near': {'description': 'Маршруты рядом с точкой: долгота,широта (вместе с radius)', 'in': 'query', 'type': 'string'},
+                           'radius': {'description': 'Расстояние до точки near в метрах', 'in': 'query', 'type': 'number'}})
     @ns_routes.response(200, 'Возвращен список маршрутов')
+    @ns_routes.response(400, 'Ошибка валидации данных')
     @ns_routes.response(500, 'Другие ошибки')
     def get(self):
         """
             Получает список маршрутов для заданного пользователя.
 
-            Этот метод обрабатывает GET-запрос, извлекает из запроса идентификатор пользователя и возвращает список
-            всех маршрутов, соответствующих этому пользователю, в формате JSON.
+            Этот метод обрабатывает GET-запрос, извлекает из запроса идентификатор пользователя и возвращает
+            маршруты этого пользователя в порядке возрастания ID в формате JSON. Маршруты выдаются страницами:
+            следующая страница запрашивается с cursor, равным next_cursor из ответа. Из базы данных выбираются
+            только колонки запрошенных полей, поэтому без поля route геометрия маршрутов не читается.
+            В режиме stream все маршруты после cursor передаются потоком по мере чтения из серверного курсора,
+            и потребление памяти не зависит от количества маршрутов.
+            Параметр lod выбирает заранее сохраненный упрощенный вариант геометрии, параметр tolerance
+            упрощает геометрию с произвольным допуском при формировании ответа.
+            Постраничные ответы содержат ETag, вычисляемый по версии данных пользователя (см. response_cache):
+            при совпадении с заголовком If-None-Match возвращается 304 без обращения к таблице routes,
+            а повторные запросы с теми же параметрами отдаются из кэша ответов.
 
-            Входные данные:
+            Входные данные (в строке запроса или в теле запроса в формате JSON):
                 - userid (int): Идентификатор пользователя, для которого нужно получить список маршрутов.
-                                  Должен быть передан в теле запроса в формате JSON.
+                - cursor (int, необязательно): ID последнего маршрута предыдущей страницы.
+                - limit (int, необязательно): Размер страницы, по умолчанию ROUTES_PAGE_SIZE.
+                - fields (str, необязательно): Поля маршрута через запятую.
+                - stream (bool, необязательно): Потоковая выдача.
+                - lod (int, необязательно): Уровень детализации геометрии.
+                - tolerance (float, необязательно): Допуск упрощения геометрии в метрах.
+                - bbox (str, необязательно): Прямоугольник "мин. долгота,мин. широта,макс. долгота,макс. широта",
+                                             в котором целиком лежат маршруты.
+                - near (str, необязательно): Точка "долгота,широта", не дальше radius метров от которой проходят маршруты.
+                - radius (float, необязательно): Расстояние до точки near в метрах.
 
             Возвращает:
-                - Response: Объект ответа Flask, содержащий JSON со списком маршрутов в случае успеха
-                              или сообщение об ошибке в случае сбоя.
+                - Response: Объект ответа Flask, содержащий JSON со списком маршрутов data и next_cursor
+                              (None на последней странице) в случае успеха или сообщение об ошибке в случае сбоя.
         """
         try:
-            with Session() as sesion:
-                routes = [route.to_dict for route in sesion.query(Routes).filter_by(user_id=request.json['userid'])]
-                return jsonify({'data': routes})
+            with metrics.span('validate'):
+                params = RouteListValidator(**{**request.args.to_dict(), **(request.get_json(silent=True) or {})})
+            fields = params.fields or list(ROUTE_FIELDS)
+            serialize = route_serializer(fields, params.tolerance)
+            matches = near_filter(params.near, params.radius) if params.near is not None else None
+            # При точной проверке расстояния количество строк ограничивается после нее, а не в SQL.
+            filtered = matches is not None
+            if params.stream:
+                query = route_list_query(params.userid, fields, params.cursor, None if filtered else params.limit,
+                                         params.lod, params.bbox, params.near, params.radius)
+                return Response(stream_with_context(stream_routes(query, serialize, matches, params.limit)),
+                                mimetype='application/json')
+            limit = params.limit or ROUTES_PAGE_SIZE
+
+            def page():
+                query = route_list_query(params.userid, fields, params.cursor, None if filtered else limit + 1,
+                                         params.lod, params.bbox, params.near, params.radius)
+                rows = list(fetch_routes(read_request_session(), query, matches, limit + 1))
+                next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+                with metrics.span('serialize'):
+                    routes = [serialize(row) for row in rows[:limit]]
+                    return jsonify({'data': routes, 'next_cursor': next_cursor})
+
+            return cached_response(read_request_session(), 'routes', params.userid, params.model_dump(), page)
+        except ValidationError as e:
+            return jsonify({'error': 'Validation error', 'details': str(e.errors()[0]['msg'])}), 400
         except Exception as exc:
             return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
 
@@ -86,10 +219,14 @@ class RouteView(MethodView):
              params={
                  'coordinates': {'description': 'Список координат (не менее 2)', 'in': 'query', 'type': 'list'},
                  'userid': {'description': 'ID пользователя', 'in': 'query', 'type': 'integer'},
-                 'name': {'description': 'Название маршрута', 'in': 'query', 'type': 'string'}
+                 'name': {'description': 'Название маршрута', 'in': 'query', 'type': 'string'},
+                 'async': {'description': 'Принять маршрут без ожидания построения', 'in': 'query', 'type': 'boolean'}
              })
     @ns_routes.expect(routes_model)
     @ns_routes.response(201, 'Маршрут  создан')
+    @ns_routes.response(202, 'Маршрут принят и будет построен в фоне')
+    @ns_routes.response(502, 'Ошибка сервиса построения маршрутов')
+    @ns_routes.response(503, 'Превышен лимит запросов к сервису построения маршрутов, повторите после Retry-After')
     @ns_routes.response(500, 'Другие ошибки')
     def post(self):
         """
@@ -97,7 +234,12 @@ class RouteView(MethodView):
 
         Принимает JSON-запрос с данными маршрута, валидирует их, после чего выполняет запрос к
         внешнему сервису для получения дополнительной информации о маршруте. С полученными данными
-        создает новую запись в базе данных и возвращает информацию о созданном маршруте.
+        создает новую запись в базе данных, в той же транзакции обновляет статистику пользователя
+        в route_stats и возвращает информацию о созданном маршруте.
+
+        В асинхронном режиме (параметр async=true в строке запроса или ROUTES_ASYNC_INGEST) маршрут
+        сохраняется со статусом pending без обращения к внешнему сервису, а построение маршрута ставится
+        в очередь route_jobs, которую обрабатывают фоновые обработчики (см. routes.worker).
 
         Входные данные JSON должны содержать:
             - userid (int): Идентификатор пользователя, создающего маршрут.
@@ -105,30 +247,168 @@ class RouteView(MethodView):
             - coordinates (list[list[float]]): Список координат маршрута в формате [[широта, долгота], ...].
 
         В случае успеха возвращает:
-            - Response: Объект ответа Flask с JSON представлением созданного маршрута и статусом 201.
+            - Response: Объект ответа Flask с JSON представлением созданного маршрута и статусом 201
+              или, в асинхронном режиме, статусом 202.
+        Если лимит запросов к сервису построения маршрутов исчерпан и не восстановился за время ожидания
+        (см. routes.limiter), возвращается статус 503 с заголовком Retry-After.
         """
         try:
-            route_data = RouteValidator(**request.json)
-            route = get_route(route_data.coordinates)
-            print(route)
-            new_route = Routes(user_id=route_data.userid,
-                               name=route_data.name,
-                               duration = route['duration'],
-                               start_time=datetime.fromtimestamp(route['start_at'] / 1e3),
-                               route_points={'route_points': route['route_points']},
-                               distance = route['distance'])
-            with Session() as session:
+            with metrics.span('validate'):
+                route_data = RouteValidator(**request.json)
+            if request.args.get('async', ROUTES_ASYNC_INGEST, type=parse_bool):
+                new_route = Routes(user_id=route_data.userid, name=route_data.name, status='pending')
+                session = request_session()
                 session.add(new_route)
+                session.flush()
+                session.add(RouteJob(route_id=new_route.id, coordinates=route_data.coordinates))
+                bump_data_version(session, [new_route.user_id])
                 session.commit()
+                return jsonify(new_route.to_dict), 202
+            route = get_route(route_data.coordinates)
+            new_route = Routes(**make_route_row(route_data, route))
+            session = request_session()
+            session.add(new_route)
+            session.flush()
+            save_levels(session, [(new_route.id, route['route_points'])])
+            record_routes(session, [new_route])
+            bump_data_version(session, [new_route.user_id])
+            session.commit()
+            with metrics.span('serialize'):
                 return jsonify(new_route.to_dict), 201
         except ValidationError as e:
             return jsonify({'error': 'Validation error', 'details': str(e.errors()[0]['msg'])}), 400
+        except DirectionsRateLimited as e:
+            return jsonify({'error': 'Directions service busy', 'details': str(e)}), 503, retry_after_header(e)
+        except DirectionsError as e:
+            return jsonify({'error': 'Directions service error', 'details': str(e)}), 502
         except IntegrityError as e:
-            session.rollback()
+            request_session.rollback()
             return jsonify({'error': 'Integrity error', 'details': str(e.orig)}), 409
         except Exception as exc:
             return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
 
+@ns_routes.route('/routes/batch')
+class RouteBatchView(MethodView):
+    @ns_routes.doc(params={'routes': {'description': 'Список маршрутов в формате POST /routes', 'in': 'query', 'type': 'list'}})
+    @ns_routes.response(201, 'Все маршруты созданы')
+    @ns_routes.response(207, 'Часть маршрутов не создана, подробности в элементах ответа')
+    @ns_routes.response(400, 'Ошибка валидации данных')
+    @ns_routes.response(500, 'Другие ошибки')
+    def post(self):
+        """
+        Создает пакет маршрутов.
+
+        Каждый элемент списка routes проверяется отдельно. Для корректных элементов маршруты запрашиваются
+        у внешнего сервиса параллельно (не более DIRECTIONS_BATCH_WORKERS запросов одновременно), после чего
+        все полученные маршруты добавляются в базу данных одним INSERT в одной транзакции.
+
+        Входные данные JSON должны содержать:
+            - routes (list[dict]): Список маршрутов, каждый в формате тела запроса POST /routes.
+
+        Возвращает:
+            - Response: Объект ответа Flask с JSON-списком data, в котором для каждого элемента пакета
+              (в исходном порядке) указан созданный маршрут или описание ошибки. Статус 201, если созданы
+              все маршруты, иначе 207.
+        """
+        try:
+            batch = RouteBatchValidator(**request.json)
+            results = [None] * len(batch.routes)
+            valid = []
+            for index, item in enumerate(batch.routes):
+                try:
+                    valid.append((index, RouteValidator(**item)))
+                except ValidationError as e:
+                    results[index] = {'index': index, 'error': 'Validation error', 'details': str(e.errors()[0]['msg'])}
+                except TypeError:
+                    results[index] = {'index': index, 'error': 'Validation error', 'details': 'Route must be an object'}
+
+            session = request_session()
+            user_ids = {route_data.userid for _, route_data in valid}
+            existing = set(session.scalars(select(User.id).where(User.id.in_(user_ids))))
+            # Транзакция не удерживается на время запросов к сервису построения маршрутов.
+            session.commit()
+            pending = []
+            for index, route_data in valid:
+                if route_data.userid in existing:
+                    pending.append((index, route_data))
+                else:
+                    results[index] = {'index': index, 'error': 'Integrity error', 'details': 'User does not exist'}
+
+            rows = []
+            points = {}
+            with ThreadPoolExecutor(max_workers=DIRECTIONS_BATCH_WORKERS) as executor:
+                futures = [(index, route_data, executor.submit(get_route, route_data.coordinates))
+                           for index, route_data in pending]
+                for index, route_data, future in futures:
+                    try:
+                        route = future.result()
+                        rows.append((index, make_route_row(route_data, route)))
+                        points[index] = route['route_points']
+                    except DirectionsRateLimited as e:
+                        results[index] = {'index': index, 'error': 'Directions service busy', 'details': str(e)}
+                    except DirectionsError as e:
+                        results[index] = {'index': index, 'error': 'Directions service error', 'details': str(e)}
+                    except Exception as exc:
+                        results[index] = {'index': index, 'error': 'Unexpected error', 'details': str(exc)}
+
+            if rows:
+                ids = session.scalars(insert(Routes).returning(Routes.id, sort_by_parameter_order=True),
+                                      [row for _, row in rows]).all()
+                save_levels(session, [(route_id, points[index]) for (index, _), route_id in zip(rows, ids)])
+                record_routes(session, [Routes(**row) for _, row in rows])
+                bump_data_version(session, [row['user_id'] for _, row in rows])
+                session.commit()
+                for (index, row), route_id in zip(rows, ids):
+                    results[index] = {'index': index, 'data': Routes(id=route_id, **row).to_dict}
+
+            status = 201 if len(rows) == len(results) else 207
+            with metrics.span('serialize'):
+                return jsonify({'data': results}), status
+        except ValidationError as e:
+            return jsonify({'error': 'Validation error', 'details': str(e.errors()[0]['msg'])}), 400
+        except Exception as exc:
+            return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
+
+
+@ns_routes.route('/routes/export')
+class RouteExportView(MethodView):
+    @ns_routes.doc(params={'format': {'description': 'Формат: ndjson, arrow или parquet', 'in': 'query', 'type': 'string'},
+                           'userid': {'description': 'ID пользователя (по умолчанию все маршруты)', 'in': 'query', 'type': 'integer'},
+                           'after': {'description': 'Выгрузить маршруты с ID больше указанного', 'in': 'query', 'type': 'integer'}})
+    @ns_routes.response(200, 'Файл выгрузки маршрутов')
+    @ns_routes.response(400, 'Ошибка валидации данных')
+    @ns_routes.response(500, 'Другие ошибки')
+    def get(self):
+        """
+        Выгружает маршруты в формате NDJSON, Arrow IPC или Parquet (см. routes.bulk).
+
+        Маршруты читаются из серверного курсора порциями по ROUTES_EXPORT_CHUNK в порядке ID и передаются потоком
+        по мере чтения, геометрия — в двоичном формате хранения (в NDJSON — строкой base64).
+
+        Параметры строки запроса:
+            - format (str, необязательно): ndjson (по умолчанию), arrow или parquet; arrow и parquet требуют pyarrow.
+            - userid (int, необязательно): Выгрузить только маршруты пользователя.
+            - after (int, необязательно): Выгрузить маршруты с ID больше указанного (продолжение прерванной выгрузки).
+
+        Возвращает:
+            - Response: Поток файла выгрузки в случае успеха или сообщение об ошибке в случае сбоя.
+        """
+        try:
+            params = RouteExportValidator(**request.args.to_dict())
+
+            def generate():
+                with ReadSession() as session:
+                    chunks = read_chunks(session, export_query(params.userid, params.after))
+                    yield from encode_chunks(chunks, params.format)
+
+            return Response(stream_with_context(generate()), mimetype=MIMETYPES[params.format],
+                            headers={'Content-Disposition': f'attachment; filename=routes.{params.format}'})
+        except ValidationError as e:
+            return jsonify({'error': 'Validation error', 'details': str(e.errors()[0]['msg'])}), 400
+        except Exception as exc:
+            return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
+
+
 @set_routes.route('/set_end_time')
 class SetEndTime(MethodView):
 
@@ -156,17 +436,30 @@ class SetEndTime(MethodView):
         """
         try:
             data = EndTimeValidator(**request.json)
-            with Session() as session:
-                route = session.query(Routes).filter_by(id=data.routeid).first()
-                if not route:
-                    return jsonify({'error': 'route does not exist'}), 404
-                if route.user_id != data.userid:
-                    return jsonify({'error': 'Access error'}), 403
-                route.end_time = datetime.now().isoformat()
-                session.add(route)
-                session.commit()
-                return jsonify({'end_time': route.end_time}), 200
+            session = request_session()
+            route = session.query(Routes).filter_by(id=data.routeid).with_for_update().first()
+            if not route:
+                return jsonify({'error': 'route does not exist'}), 404
+            if route.user_id != data.userid:
+                return jsonify({'error': 'Access error'}), 403
+            previous_end_time = route.end_time
+            route.end_time = datetime.now()
+            session.add(route)
+            record_end_time(session, route, previous_end_time)
+            bump_data_version(session, [route.user_id])
+            session.commit()
+            return jsonify({'end_time': route.end_time}), 200
         except ValidationError as val_err:
             return jsonify({'error': 'Validation error', 'details': str(val_err.errors()[0]['msg'])}), 400
         except Exception as exc:
             return jsonify({'error': 'Unexpected error', 'details': str(exc)}), 500
+
+
+@ns_routes.route('/directions_cache')
+class DirectionsCacheView(MethodView):
+    @ns_routes.response(200, 'Статистика кэша маршрутов')
+    def get(self):
+        """
+        Возвращает счетчики попаданий и промахов кэша ответов OpenRouteService в текущем процессе.
+        """
+        return jsonify(directions_cache.stats())
@@ -0,0 +1,125 @@
+"""
+Фоновые обработчики очереди построения маршрутов (таблица route_jobs).
+
+POST /routes в асинхронном режиме сохраняет маршрут со статусом pending и задание в route_jobs.
+Обработчики забирают задания запросом SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько процессов
+и потоков обрабатывают очередь без блокировок друг друга. Задание, завершившееся ошибкой сервиса
+построения маршрутов, разбора ответа или записи результата, повторяется с увеличивающейся задержкой
+не более ROUTE_JOB_MAX_ATTEMPTS раз, после чего маршрут получает статус failed. Задание, отклоненное
+из-за лимита запросов к сервису (см. routes.limiter), откладывается на время Retry-After без расходования
+попытки.
+
+Запуск:
+    python -m routes.worker [--concurrency N]
+"""
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from decouple import config
+from sqlalchemy import select
+
+from analytics.rollup import record_routes
+from database import Session, Routes, RouteJob
+from response_cache import bump_data_version
+from routes.client import DirectionsRateLimited
+from routes.directions import get_route, route_columns
+from simplify import save_levels
+
+ROUTE_WORKER_CONCURRENCY = config('ROUTE_WORKER_CONCURRENCY', default=4, cast=int)
+ROUTE_WORKER_POLL_INTERVAL = config('ROUTE_WORKER_POLL_INTERVAL', default=1.0, cast=float)
+ROUTE_JOB_MAX_ATTEMPTS = config('ROUTE_JOB_MAX_ATTEMPTS', default=5, cast=int)
+ROUTE_JOB_RETRY_DELAY = config('ROUTE_JOB_RETRY_DELAY', default=10, cast=int)
+
+logger = logging.getLogger(__name__)
+
+
+def process_next_job():
+    """
+    Забирает из очереди одно задание, строит маршрут и сохраняет результат в той же транзакции.
+
+    Returns:
+        bool: True, если задание было найдено, иначе False.
+    """
+    with Session() as session:
+        job = session.scalars(select(RouteJob)
+                              .where(RouteJob.available_at <= datetime.now())
+                              .order_by(RouteJob.available_at)
+                              .limit(1)
+                              .with_for_update(skip_locked=True)).first()
+        if job is None:
+            return False
+        route = session.get(Routes, job.route_id)
+        try:
+            result = get_route(job.coordinates)
+            # Ошибка записи результата (например, нарушение ограничения) откатывает только точку сохранения:
+            # блокировка задания сохраняется, и попытка учитывается так же, как ошибка построения маршрута.
+            with session.begin_nested():
+                for name, value in route_columns(result).items():
+                    setattr(route, name, value)
+                route.status = 'ready'
+                save_levels(session, [(route.id, result['route_points'])])
+                record_routes(session, [route])
+                bump_data_version(session, [route.user_id])
+                session.delete(job)
+        except DirectionsRateLimited as exc:
+            # Ограничение частоты запросов не связано с маршрутом: задание откладывается без расходования попытки.
+            job.available_at = datetime.now() + timedelta(seconds=exc.retry_after or ROUTE_JOB_RETRY_DELAY)
+            session.commit()
+            logger.info('Route %s: directions rate limited, retrying in %ss', job.route_id,
+                        exc.retry_after or ROUTE_JOB_RETRY_DELAY)
+            return True
+        except Exception as exc:
+            job.attempts += 1
+            job.last_error = str(exc)
+            if job.attempts >= ROUTE_JOB_MAX_ATTEMPTS:
+                route.status = 'failed'
+                bump_data_version(session, [route.user_id])
+                session.delete(job)
+            else:
+                job.available_at = datetime.now() + timedelta(seconds=ROUTE_JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+            session.commit()
+            logger.warning('Route %s: route job error (attempt %s): %s', job.route_id, job.attempts, exc)
+            return True
+        session.commit()
+        return True
+
+
+def run_worker(stop):
+    """
+    Обрабатывает задания до установки события stop, ожидая ROUTE_WORKER_POLL_INTERVAL секунд,
+    когда очередь пуста.
+    """
+    while not stop.is_set():
+        try:
+            found = process_next_job()
+        except Exception:
+            logger.exception('Route job failed')
+            found = False
+        if not found:
+            stop.wait(ROUTE_WORKER_POLL_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=ROUTE_WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+    stop = threading.Event()
+    workers = [threading.Thread(target=run_worker, args=(stop,), name=f'route-worker-{index}')
+               for index in range(args.concurrency)]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == '__main__':
+    main()
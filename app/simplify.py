@@ -0,0 +1,157 @@
+"""
+Упрощение геометрии маршрутов (алгоритм Дугласа — Пекера) и уровни детализации.
+
+Для каждого маршрута при записи сохраняются упрощенные варианты геометрии с допусками
+GEOMETRY_LOD_TOLERANCES (в метрах): уровень 1 соответствует первому допуску, уровень 2 — второму и т.д.
+Уровень 0 — полная геометрия.
+
+Заполнение уровней детализации для маршрутов, созданных до их появления:
+    python simplify.py backfill
+"""
+import argparse
+
+import numpy as np
+from decouple import config, Csv
+from sqlalchemy import select, exists
+from sqlalchemy.dialects.postgresql import insert
+
+import geometry
+from database import Session, Routes, RouteGeometryLevel
+from response_cache import bump_data_version
+
+EARTH_RADIUS = 6371008.8
+LOD_TOLERANCES = config('GEOMETRY_LOD_TOLERANCES', default='5,25,100', cast=Csv(float))
+
+
+def project(points):
+    """
+    Переводит координаты [[долгота, широта], ...] в метры равнопромежуточной проекцией
+    с центром в средней широте маршрута.
+
+    Returns:
+        numpy.ndarray: Массив формы (n, 2).
+    """
+    coordinates = np.radians(np.asarray(points, dtype=np.float64)[:, :2])
+    scale = np.cos(coordinates[:, 1].mean())
+    return np.column_stack((coordinates[:, 0] * scale, coordinates[:, 1])) * EARTH_RADIUS
+
+
+def douglas_peucker(points, tolerance):
+    """
+    Определяет точки ломаной, которые остаются после упрощения алгоритмом Дугласа — Пекера.
+
+    Расстояния от точек участка до отрезка между его концами вычисляются векторно для всего участка.
+
+    Args:
+        points (numpy.ndarray): Массив координат формы (n, 2) в метрах.
+        tolerance (float): Допустимое отклонение упрощенной линии от исходной в метрах.
+
+    Returns:
+        numpy.ndarray: Булев массив длины n, True для сохраняемых точек.
+    """
+    count = len(points)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        origin = points[start]
+        direction = points[end] - origin
+        offsets = points[start + 1:end] - origin
+        length = direction @ direction
+        if length > 0:
+            t = np.clip(offsets @ direction / length, 0.0, 1.0)
+            offsets = offsets - t[:, None] * direction
+        distances = np.einsum('ij,ij->i', offsets, offsets)
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance * tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify(points, tolerance):
+    """
+    Упрощает ломаную с допуском tolerance метров, сохраняя исходные значения оставшихся точек.
+
+    Args:
+        points (list of list of float): Список координат [[долгота, широта], ...].
+        tolerance (float): Допуск в метрах.
+
+    Returns:
+        list of list of float: Упрощенный список координат.
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return points
+    keep = douglas_peucker(project(points), tolerance)
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def lod_rows(route_id, points):
+    """
+    Формирует строки таблицы route_geometry_lods с уровнями детализации маршрута.
+
+    Каждый следующий уровень упрощается из предыдущего, допуски в LOD_TOLERANCES возрастают.
+    """
+    rows = []
+    for lod, tolerance in enumerate(LOD_TOLERANCES, start=1):
+        points = simplify(points, tolerance)
+        rows.append({'route_id': route_id, 'lod': lod, 'tolerance': tolerance, 'geometry': geometry.encode(points)})
+    return rows
+
+
+def save_levels(session, routes_points):
+    """
+    Сохраняет уровни детализации геометрии маршрутов, заменяя уже сохраненные уровни с теми же номерами.
+    Изменения не фиксируются: commit выполняет вызывающий код.
+
+    Args:
+        session (Session): Сессия базы данных.
+        routes_points (list of tuple): Пары (ID маршрута, список координат маршрута).
+    """
+    levels = [level for route_id, points in routes_points for level in lod_rows(route_id, points)]
+    if levels:
+        statement = insert(RouteGeometryLevel)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[RouteGeometryLevel.route_id, RouteGeometryLevel.lod],
+            set_={'tolerance': statement.excluded.tolerance, 'geometry': statement.excluded.geometry}), levels)
+
+
+def backfill(batch_size=500):
+    """
+    Создает уровни детализации для маршрутов, у которых их нет (кроме маршрутов со статусом pending,
+    уровни которых сохраняет фоновый обработчик). Каждая порция фиксируется отдельно вместе с увеличением
+    версии данных владельцев маршрутов: ответы с уровнями детализации, закэшированные до заполнения, устаревают.
+    """
+    if not LOD_TOLERANCES:
+        return
+    missing = ~exists().where(RouteGeometryLevel.route_id == Routes.id)
+    while True:
+        with Session() as session:
+            routes = session.execute(select(Routes.id, Routes.route_geometry, Routes.user_id)
+                                     .where(Routes.route_geometry.is_not(None), Routes.status != 'pending', missing)
+                                     .limit(batch_size)).all()
+            if not routes:
+                return
+            # Уровни сохраняются так же, как при создании маршрута: если их уже записал обработчик или запрос,
+            # повторная вставка заменяет их и не прерывает порцию ошибкой уникальности.
+            save_levels(session, [(route_id, geometry.decode(blob)) for route_id, blob, _ in routes])
+            bump_data_version(session, [user_id for _, _, user_id in routes])
+            session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['backfill'])
+    parser.parse_args()
+    backfill()
+
+
+if __name__ == '__main__':
+    main()
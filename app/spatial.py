@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def bounds(points):
+    """
+    Возвращает ограничивающий прямоугольник маршрута.
+
+    Args:
+        points (list of list of float): Список координат [[долгота, широта], ...].
+
+    Returns:
+        tuple | None: (мин. долгота, мин. широта, макс. долгота, макс. широта) или None для пустого маршрута.
+    """
+    if not len(points):
+        return None
+    coordinates = np.asarray(points, dtype=np.float64)[:, :2]
+    min_lon, min_lat = coordinates.min(axis=0)
+    max_lon, max_lat = coordinates.max(axis=0)
+    return float(min_lon), float(min_lat), float(max_lon), float(max_lat)
+
+
+def radius_bounds(lon, lat, radius):
+    """
+    Возвращает прямоугольник, содержащий круг радиуса radius метров с центром в точке (долгота, широта).
+    """
+    delta_lat = radius / METERS_PER_DEGREE
+    delta_lon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lon - delta_lon, lat - delta_lat, lon + delta_lon, lat + delta_lat
+
+
+def distance_to_polyline(points, lon, lat):
+    """
+    Вычисляет минимальное расстояние в метрах от точки (долгота, широта) до ломаной маршрута.
+
+    Расстояния до всех отрезков вычисляются векторно в равнопромежуточной проекции с центром в точке.
+
+    Returns:
+        float: Расстояние в метрах или math.inf для пустого маршрута.
+    """
+    if not len(points):
+        return math.inf
+    coordinates = np.asarray(points, dtype=np.float64)[:, :2]
+    scale = math.cos(math.radians(lat))
+    xy = np.column_stack(((coordinates[:, 0] - lon) * scale, coordinates[:, 1] - lat)) * METERS_PER_DEGREE
+    if len(xy) == 1:
+        return float(np.hypot(*xy[0]))
+    starts, ends = xy[:-1], xy[1:]
+    directions = ends - starts
+    lengths = np.einsum('ij,ij->i', directions, directions)
+    t = np.clip(-np.einsum('ij,ij->i', starts, directions) / np.where(lengths > 0, lengths, 1.0), 0.0, 1.0)
+    closest = starts + t[:, None] * directions
+    return float(np.sqrt(np.einsum('ij,ij->i', closest, closest).min()))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Модули приложения импортируются из каталога app, как при запуске сервиса.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database читает параметры подключения при импорте, но соединяется только при первом запросе:
+# тестам без базы данных достаточно любых значений. Заданные в окружении или .env значения не заменяются.
+for name, value in (('DB_USER', 'test'), ('DB_PASSWORD', ''), ('DB_HOST', 'localhost'), ('DB_NAME', 'test')):
+    os.environ.setdefault(name, value)
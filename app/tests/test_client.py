@@ -0,0 +1,223 @@
+"""
+Тесты клиента OpenRouteService (routes.client.DirectionsClient) с локальной заглушкой API.
+
+Для ответов в формате OpenRouteService используется заглушка замеров (benchmarks.ors_stub), для ошибок,
+задержек и повторов — ScriptedServer, отвечающий заранее заданной последовательностью ответов.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from benchmarks import ors_stub
+from benchmarks.ors_stub import directions_response
+from routes.client import DirectionsClient, DirectionsError, DirectionsRateLimited
+
+COORDINATES = [[8.681495, 49.41461], [8.687872, 49.420318]]
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.calls.append({'path': self.path, 'body': body, 'client': self.client_address,
+                                 'authorization': self.headers.get('Authorization')})
+            status, headers, delay = server.responses.pop(0) if len(server.responses) > 1 else server.responses[0]
+        time.sleep(delay)
+        payload = directions_response(body['coordinates'], 2) if status == 200 else {'error': 'scripted'}
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class ScriptedServer(ThreadingHTTPServer):
+    """
+    Заглушка API, отвечающая по очереди ответами responses: кортежами (статус, заголовки, задержка в секундах).
+    Последний ответ повторяется для всех следующих запросов. Запросы сохраняются в calls.
+    """
+    daemon_threads = True
+
+    def __init__(self, responses):
+        super().__init__(('127.0.0.1', 0), ScriptedHandler)
+        self.responses = list(responses)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+@pytest.fixture
+def scripted():
+    servers = []
+
+    def start(*responses):
+        server = ScriptedServer(responses)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_client(url, **kwargs):
+    kwargs.setdefault('backoff_factor', 0.01)
+    return DirectionsClient(token='test-token', base_url=url, **kwargs)
+
+
+def test_directions_against_ors_stub():
+    server = ors_stub.start(port=0, latency=0, points=10)
+    client = make_client(f'http://127.0.0.1:{server.server_port}')
+    try:
+        route = client.directions(COORDINATES)
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+    assert set(route) == {'duration', 'route_points', 'start_at', 'distance'}
+    assert route['route_points'][0] == COORDINATES[0]
+    assert route['route_points'][-1] == COORDINATES[-1]
+    assert len(route['route_points']) == 11
+    assert route['distance'] > 0
+
+
+def test_request_format_and_keep_alive(scripted):
+    server = scripted((200, {}, 0))
+    client = make_client(server.url)
+    for _ in range(3):
+        client.directions(COORDINATES, profile='cycling-regular')
+    assert len(server.calls) == 3
+    assert {call['path'] for call in server.calls} == {'/v2/directions/cycling-regular/geojson'}
+    assert server.calls[0]['body'] == {'coordinates': COORDINATES}
+    assert server.calls[0]['authorization'] == 'test-token'
+    # Соединение переиспользуется из пула: все запросы приходят с одного клиентского порта.
+    assert len({call['client'] for call in server.calls}) == 1
+
+
+def test_retries_server_errors_with_backoff(scripted):
+    server = scripted((503, {}, 0), (502, {}, 0), (200, {}, 0))
+    client = make_client(server.url, retries=3, backoff_factor=0.05)
+    started = time.monotonic()
+    route = client.directions(COORDINATES)
+    assert route['route_points'][-1] == COORDINATES[-1]
+    assert len(server.calls) == 3
+    # Первый повтор выполняется сразу, второй — через backoff_factor * 2 = 0.1 с.
+    assert time.monotonic() - started >= 0.1
+
+
+def test_gives_up_after_retries(scripted):
+    server = scripted((500, {}, 0))
+    client = make_client(server.url, retries=2)
+    with pytest.raises(DirectionsError) as error:
+        client.directions(COORDINATES)
+    assert error.value.status == 500
+    assert len(server.calls) == 3
+
+
+def test_client_errors_are_not_retried(scripted):
+    server = scripted((400, {}, 0))
+    client = make_client(server.url, retries=3)
+    with pytest.raises(DirectionsError) as error:
+        client.directions(COORDINATES)
+    assert error.value.status == 400
+    assert len(server.calls) == 1
+
+
+def test_rate_limit_is_not_retried(scripted):
+    server = scripted((429, {'Retry-After': '60'}, 0))
+    client = make_client(server.url, retries=3)
+    started = time.monotonic()
+    with pytest.raises(DirectionsRateLimited) as error:
+        client.directions(COORDINATES)
+    assert time.monotonic() - started < 5
+    assert error.value.retry_after == 60.0
+    assert error.value.status == 429
+    assert len(server.calls) == 1
+
+
+def test_retry_after_does_not_extend_server_error_retries(scripted):
+    server = scripted((503, {'Retry-After': '60'}, 0))
+    client = make_client(server.url, retries=2)
+    started = time.monotonic()
+    with pytest.raises(DirectionsError):
+        client.directions(COORDINATES)
+    assert time.monotonic() - started < 5
+    assert len(server.calls) == 3
+
+
+def test_read_timeout(scripted):
+    server = scripted((200, {}, 1.0))
+    client = make_client(server.url, read_timeout=0.1, retries=1)
+    started = time.monotonic()
+    with pytest.raises(DirectionsError, match='unavailable'):
+        client.directions(COORDINATES)
+    assert time.monotonic() - started < 1.0
+    assert len(server.calls) == 2
+
+
+def test_connect_error():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+    url = f'http://127.0.0.1:{server.server_port}'
+    server.server_close()
+    client = make_client(url, retries=1)
+    with pytest.raises(DirectionsError) as error:
+        client.directions(COORDINATES)
+    assert error.value.status is None
+
+
+def test_response_is_parsed_once(scripted, monkeypatch):
+    server = scripted((200, {}, 0))
+    parsed = []
+    original = requests.Response.json
+
+    def counting_json(response, **kwargs):
+        parsed.append(response.url)
+        return original(response, **kwargs)
+
+    monkeypatch.setattr(requests.Response, 'json', counting_json)
+    make_client(server.url).directions(COORDINATES)
+    assert len(parsed) == 1
+
+
+def test_directions_async(scripted):
+    server = scripted((200, {}, 0.2))
+    client = make_client(server.url, pool_size=4)
+
+    async def run():
+        return await asyncio.gather(*(client.directions_async(COORDINATES) for _ in range(4)))
+
+    started = time.monotonic()
+    routes = asyncio.run(run())
+    assert [route['route_points'][-1] for route in routes] == [COORDINATES[-1]] * 4
+    assert len(server.calls) == 4
+    # Запросы выполняются параллельно, а не друг за другом.
+    assert time.monotonic() - started < 0.6
+
+
+def test_directions_async_raises(scripted):
+    server = scripted((429, {'Retry-After': '5'}, 0))
+    client = make_client(server.url)
+    with pytest.raises(DirectionsRateLimited):
+        asyncio.run(client.directions_async(COORDINATES))
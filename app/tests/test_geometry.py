@@ -0,0 +1,111 @@
+"""
+Тесты двоичного формата геометрии маршрутов (geometry): кодирование, декодирование в списки и массивы NumPy
+и пакетное декодирование decode_many.
+"""
+import numpy as np
+import pytest
+
+import geometry
+
+ROUTE = [[8.681495, 49.41461], [8.687872, 49.420318], [8.690001, 49.418002], [8.681495, 49.41461]]
+
+
+def assert_decoders_agree(blob, points):
+    assert geometry.decode(blob) == points
+    array = geometry.decode_array(blob)
+    assert array.shape == (len(points), len(points[0]) if points else 2)
+    np.testing.assert_array_equal(array, np.array(points, dtype=np.float64).reshape(array.shape))
+    assert geometry.point_count(blob) == len(points)
+
+
+def test_roundtrip():
+    blob = geometry.encode(ROUTE)
+    assert geometry.HEADER.unpack_from(blob) == (geometry.FORMAT_VERSION, geometry.DEFAULT_PRECISION, 2)
+    assert len(blob) == geometry.HEADER.size + 4 * 2 * len(ROUTE)
+    assert_decoders_agree(blob, ROUTE)
+
+
+@pytest.mark.parametrize('precision', [0, 1, 5, 6, 7])
+def test_precision_step_is_exact(precision):
+    # Значения, кратные шагу 10 ** -precision, восстанавливаются без потерь.
+    step = 10 ** -precision
+    points = [[0.0, 0.0], [step, -step], [round(12 * step, precision), round(-7 * step, precision)]]
+    blob = geometry.encode(points, precision=precision)
+    assert geometry.HEADER.unpack_from(blob)[1] == precision
+    assert_decoders_agree(blob, points)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0.0000004, 0.0),
+    (0.0000006, 0.000001),
+    (-0.0000006, -0.000001),
+    (49.4146149, 49.414615),
+    (-179.9999996, -180.0),
+])
+def test_rounding_to_precision(value, expected):
+    blob = geometry.encode([[value, value]])
+    assert geometry.decode(blob) == [[expected, expected]]
+
+
+def test_empty_geometry():
+    blob = geometry.encode([])
+    assert blob == geometry.HEADER.pack(geometry.FORMAT_VERSION, geometry.DEFAULT_PRECISION, 2)
+    assert_decoders_agree(blob, [])
+
+
+def test_single_point():
+    blob = geometry.encode([[-0.5, 51.5]])
+    assert_decoders_agree(blob, [[-0.5, 51.5]])
+
+
+def test_three_dimensions():
+    points = [[8.68, 49.41, 112.5], [8.69, 49.42, 98.25]]
+    blob = geometry.encode(points)
+    assert geometry.HEADER.unpack_from(blob)[2] == 3
+    assert_decoders_agree(blob, points)
+
+
+def test_antimeridian_and_large_negative_deltas():
+    # Переходы через 180-й меридиан дают разности ±360 градусов — максимальные для координат.
+    points = [[179.999999, 89.999999], [-180.0, -90.0], [180.0, 90.0], [-179.999999, 0.0], [0.0, -89.5]]
+    blob = geometry.encode(points)
+    assert_decoders_agree(blob, points)
+
+
+def test_delta_overflow_is_rejected():
+    # При точности 7 разность 360 градусов не помещается в 32-битное целое.
+    with pytest.raises(OverflowError):
+        geometry.encode([[-180.0, 0.0], [180.0, 0.0]], precision=7)
+
+
+def test_unsupported_version():
+    blob = geometry.HEADER.pack(geometry.FORMAT_VERSION + 1, 6, 2) + geometry.encode(ROUTE)[geometry.HEADER.size:]
+    for decode in (geometry.decode, geometry.decode_array):
+        with pytest.raises(ValueError, match='Unsupported geometry format version'):
+            decode(blob)
+    with pytest.raises(ValueError, match='Unsupported geometry format version'):
+        geometry.decode_many([blob])
+
+
+def test_decode_many():
+    routes = [ROUTE, [[-180.0, -90.0]], [], [[179.5, 10.0], [-179.5, -10.0], [0.000001, -0.000001]], ROUTE[:2]]
+    blobs = [geometry.encode(points) for points in routes]
+    points, offsets = geometry.decode_many(blobs)
+    assert offsets.tolist() == [0, 4, 5, 5, 8, 10]
+    assert points.shape == (10, 2)
+    for index, blob in enumerate(blobs):
+        np.testing.assert_array_equal(points[offsets[index]:offsets[index + 1]], geometry.decode_array(blob))
+
+
+def test_decode_many_mixed_headers():
+    blobs = [geometry.encode(ROUTE), geometry.encode([[1.5, -2.5], [3.25, 4.0]], precision=2), geometry.encode(ROUTE)]
+    points, offsets = geometry.decode_many(blobs)
+    assert offsets.tolist() == [0, 4, 6, 10]
+    np.testing.assert_array_equal(points[4:6], [[1.5, -2.5], [3.25, 4.0]])
+    np.testing.assert_array_equal(points[6:], np.array(ROUTE))
+
+
+def test_decode_many_empty():
+    points, offsets = geometry.decode_many([])
+    assert points.shape == (0, 2)
+    assert offsets.tolist() == [0]
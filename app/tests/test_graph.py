@@ -0,0 +1,113 @@
+"""
+Тесты локального построения маршрутов (routes.graph.WalkingGraph и routes.backends.LocalGraphBackend)
+на небольшом графе из списка ребер.
+
+Граф — квадрат со стороной около 111 м на экваторе и отдельное ребро в стороне:
+
+    C(0,0.001) ---- D(0.001,0.001)
+    |               |
+    A(0,0) ------- B(0.001,0)          E(0.01,0) ---- F(0.011,0)
+
+Ребро A–C задано длиной 1000 м, поэтому кратчайший путь из A в C идет через B и D.
+"""
+import math
+
+import pytest
+
+from routes.backends import LocalGraphBackend
+from routes.client import DirectionsError
+from routes.graph import WalkingGraph, haversine
+
+A, B, C, D, E, F = [0.0, 0.0], [0.001, 0.0], [0.0, 0.001], [0.001, 0.001], [0.01, 0.0], [0.011, 0.0]
+SIDE = haversine(*A, *B)
+
+EDGES = """# долгота1,широта1,долгота2,широта2[,длина]
+0,0,0.001,0
+0.001,0,0.001,0.001
+0.001,0.001,0,0.001
+0,0,0,0.001,1000
+
+0.01,0,0.011,0
+"""
+
+
+@pytest.fixture
+def graph(tmp_path):
+    path = tmp_path / 'graph.txt'
+    path.write_text(EDGES)
+    return WalkingGraph.load(str(path))
+
+
+@pytest.fixture
+def backend(graph):
+    return LocalGraphBackend(graph, speed=1.25)
+
+
+def node(graph, point):
+    return graph.nearest(*point)
+
+
+def test_load_edge_list(graph):
+    assert len(graph) == 6
+    # Заданная в файле длина сохраняется, длины остальных ребер вычисляются по координатам.
+    assert sorted(set(round(weight, 6) for weight in graph.weights)) == sorted({round(SIDE, 6), 1000.0})
+
+
+def test_shortest_path(graph):
+    distance, path = graph.shortest_path(node(graph, A), node(graph, C))
+    assert path == [node(graph, point) for point in (A, B, D, C)]
+    assert distance == pytest.approx(3 * SIDE)
+
+
+def test_unreachable_pair(graph):
+    assert graph.shortest_path(node(graph, A), node(graph, F)) == (None, None)
+
+
+def test_nearest_snaps_to_closest_node(graph):
+    assert graph.nearest(0.0002, 0.0001) == node(graph, A)
+    assert graph.nearest(0.0009, 0.0011) == node(graph, D)
+    assert graph.nearest(0.0104, -0.0003) == node(graph, E)
+
+
+def test_backend_route(backend):
+    route = backend.directions([A, C], 'foot-hiking')
+    assert route['route_points'] == [A, B, D, C]
+    assert route['distance'] == pytest.approx(3 * SIDE)
+    assert route['duration'] == pytest.approx(3 * SIDE / 1.25)
+    assert isinstance(route['start_at'], int)
+
+
+def test_backend_route_through_waypoints(backend):
+    # Точки запроса привязываются к ближайшим вершинам, участки между ними соединяются без повтора вершин.
+    route = backend.directions([[0.0001, 0.0001], [0.0011, 0.0], [0.0, 0.0012]], 'foot-hiking')
+    assert set(route) == {'duration', 'route_points', 'start_at', 'distance'}
+    assert route['route_points'] == [A, B, D, C]
+    assert all(len(point) == 2 and all(isinstance(value, float) for value in point)
+               for point in route['route_points'])
+    assert route['distance'] == pytest.approx(3 * SIDE)
+
+
+def test_backend_route_to_same_node(backend):
+    route = backend.directions([A, [0.0001, 0.0]], 'foot-hiking')
+    assert route['route_points'] == [A]
+    assert route['distance'] == 0
+    assert route['duration'] == 0
+
+
+def test_backend_unreachable(backend):
+    with pytest.raises(DirectionsError, match='No route found'):
+        backend.directions([A, E], 'foot-hiking')
+
+
+def test_backend_empty_graph():
+    backend = LocalGraphBackend(WalkingGraph([], [], [], []))
+    with pytest.raises(DirectionsError, match='empty'):
+        backend.directions([A, B], 'foot-hiking')
+
+
+def test_route_is_deterministic(backend):
+    first = backend.directions([A, C], 'foot-hiking')
+    second = backend.directions([A, C], 'foot-hiking')
+    assert {key: first[key] for key in ('route_points', 'distance', 'duration')} == \
+        {key: second[key] for key in ('route_points', 'distance', 'duration')}
+    assert math.isfinite(first['distance'])
@@ -0,0 +1,199 @@
+"""
+Тесты ограничения частоты запросов и объединения одинаковых вызовов (routes.limiter).
+
+Время ведра токенов и ожидания ограничителя подменяется управляемыми часами FakeClock: sleep сдвигает часы
+мгновенно, поэтому тесты ожидания не зависят от скорости машины.
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from routes import limiter
+from routes.client import DirectionsRateLimited
+from routes.limiter import LocalTokenBucket, RateLimiter, SingleFlight, make_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+        # Если задано, sleep ждет этого события: так тест удерживает запрос в очереди ожидания.
+        self.gate = None
+        self.sleeping = threading.Event()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.sleeping.set()
+        if self.gate is not None:
+            assert self.gate.wait(5)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(limiter, 'time', clock)
+    monkeypatch.setattr(limiter.random, 'uniform', lambda low, high: low)
+    return clock
+
+
+class BrokenBucket:
+    def take(self):
+        raise OperationalError('SELECT 1', {}, Exception('connection refused'))
+
+
+def test_bucket_refill(clock):
+    bucket = LocalTokenBucket(rate=2.0, capacity=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.25
+    assert bucket.take() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.take() == 0
+    # Ведро не наполняется больше capacity, сколько бы времени ни прошло.
+    clock.now += 3600
+    assert [bucket.take() for _ in range(3)] == [0, 0, pytest.approx(0.5)]
+
+
+def test_acquire_waits_for_token(clock):
+    rate_limiter = RateLimiter(LocalTokenBucket(rate=0.5, capacity=1), max_wait=5)
+    rate_limiter.acquire()
+    assert clock.sleeps == []
+    rate_limiter.acquire()
+    assert clock.sleeps == [pytest.approx(2.0)]
+    assert rate_limiter.stats() == {'acquired': 2, 'waited': 1, 'rejected': 0,
+                                    'wait_seconds': pytest.approx(2.0), 'waiting': 0}
+
+
+def test_acquire_wait_is_bounded(clock):
+    rate_limiter = RateLimiter(LocalTokenBucket(rate=0.25, capacity=1), max_wait=3)
+    rate_limiter.acquire()
+    with pytest.raises(DirectionsRateLimited, match='no capacity within 3s') as error:
+        rate_limiter.acquire()
+    # Токен появится через 4 секунды — больше max_wait, поэтому запрос отклоняется без ожидания.
+    assert error.value.retry_after == 4
+    assert clock.sleeps == []
+    assert rate_limiter.stats() == {'acquired': 1, 'waited': 0, 'rejected': 1, 'wait_seconds': 0, 'waiting': 0}
+
+
+def test_full_queue_is_rejected(clock):
+    rate_limiter = RateLimiter(LocalTokenBucket(rate=1.0, capacity=1), max_wait=10, max_waiting=1)
+    rate_limiter.acquire()
+    clock.gate = threading.Event()
+    errors = []
+
+    def waiter():
+        try:
+            rate_limiter.acquire()
+        except Exception as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    try:
+        assert clock.sleeping.wait(5)
+        assert rate_limiter.stats()['waiting'] == 1
+        with pytest.raises(DirectionsRateLimited, match='too many requests are waiting') as error:
+            rate_limiter.acquire()
+        assert error.value.retry_after == 10
+    finally:
+        clock.gate.set()
+        thread.join(5)
+    assert errors == []
+    assert rate_limiter.stats() == {'acquired': 2, 'waited': 1, 'rejected': 1,
+                                    'wait_seconds': pytest.approx(1.0), 'waiting': 0}
+
+
+def test_shared_bucket_falls_back_to_local(clock):
+    rate_limiter = RateLimiter(BrokenBucket(), max_wait=1, fallback=LocalTokenBucket(rate=0.1, capacity=1))
+    rate_limiter.acquire()
+    with pytest.raises(DirectionsRateLimited):
+        rate_limiter.acquire()
+    with pytest.raises(OperationalError):
+        RateLimiter(BrokenBucket()).acquire()
+
+
+def test_unlimited():
+    rate_limiter = make_limiter(0, burst=5, shared=False, max_wait=1, max_waiting=1)
+    assert rate_limiter.bucket is None
+    for _ in range(100):
+        rate_limiter.acquire()
+
+
+def run_concurrently(flight, key, function, count):
+    """
+    Запускает count вызовов flight.do(key, function) в потоках и возвращает список результатов или исключений.
+    """
+    results = [None] * count
+
+    def call(index):
+        try:
+            results[index] = flight.do(key, function)
+        except Exception as exc:
+            results[index] = exc
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_single_flight_shares_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def build():
+        calls.append(1)
+        assert release.wait(5)
+        return {'route': 'shared'}
+
+    threads, results = run_concurrently(flight, 'key', build, 5)
+    wait_for(lambda: flight.coalesced == 4)
+    assert flight.in_flight() == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert results[0] == {'route': 'shared'}
+    assert flight.in_flight() == 0
+    # Завершенный вызов не запоминается: следующий вызов выполняет функцию заново.
+    assert flight.do('key', lambda: 'next') == 'next'
+
+
+def test_single_flight_shares_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = DirectionsRateLimited('limited', retry_after=3)
+
+    def build():
+        assert release.wait(5)
+        raise error
+
+    threads, results = run_concurrently(flight, 'key', build, 3)
+    wait_for(lambda: flight.coalesced == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [error, error, error]
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_keys_are_independent():
+    flight = SingleFlight()
+    assert [flight.do(key, lambda key=key: key * 2) for key in (1, 2, 1)] == [2, 4, 2]
+    assert flight.coalesced == 0
@@ -0,0 +1,216 @@
+"""
+Тесты кэша ответов и условных запросов (response_cache).
+
+cached_response проверяется в контексте запроса Flask с сессией-заглушкой, возвращающей версию данных
+пользователя. Увеличение версии bump_data_version проверяется на базе данных из окружения (DB_*)
+в транзакции, которая откатывается после теста; без доступной базы данных этот тест пропускается.
+"""
+import json
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+import response_cache
+from response_cache import ResponseCache, bump_data_version, cached_response
+
+app = Flask(__name__)
+
+
+class VersionSession:
+    """
+    Заглушка сессии: scalar возвращает версию данных пользователя (None — пользователя нет).
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.queries = 0
+
+    def scalar(self, statement):
+        self.queries += 1
+        return self.version
+
+
+class Builder:
+    def __init__(self, status=200):
+        self.status = status
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        response = jsonify({'call': self.calls})
+        response.status_code = self.status
+        return response
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(max_bytes=1024, max_item_bytes=1024)
+    monkeypatch.setattr(response_cache, 'response_cache', cache)
+    return cache
+
+
+def get(session, build, etag=None, params=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    with app.test_request_context(headers=headers):
+        return cached_response(session, 'routes', 7, params or {'page': 1}, build)
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResponseCache(max_bytes=10, max_item_bytes=10)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    assert cache.get('a') == b'1234'
+    # Запись c не помещается вместе с a и b: вытесняется b, к которой обращались давнее.
+    cache.set('c', b'1234')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234'
+    assert cache.get('c') == b'1234'
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'entries': 2, 'bytes': 8, 'max_bytes': 10}
+
+
+def test_replacing_entry_updates_size():
+    cache = ResponseCache(max_bytes=10, max_item_bytes=10)
+    cache.set('a', b'12345678')
+    cache.set('a', b'12')
+    cache.set('b', b'12345678')
+    assert cache.get('a') == b'12'
+    assert cache.stats()['bytes'] == 10
+
+
+def test_large_items_are_not_cached():
+    cache = ResponseCache(max_bytes=100, max_item_bytes=4)
+    cache.set('a', b'12345')
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+    # Ограничение записи не больше общего размера кэша.
+    assert ResponseCache(max_bytes=2, max_item_bytes=4).max_item_bytes == 2
+
+
+def test_clear():
+    cache = ResponseCache(max_bytes=10, max_item_bytes=10)
+    cache.set('a', b'1')
+    cache.clear()
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_response_is_cached(cache):
+    build = Builder()
+    first = get(VersionSession(3), build)
+    second = get(VersionSession(3), build)
+    assert build.calls == 1
+    assert first.status_code == second.status_code == 200
+    assert json.loads(second.get_data()) == {'call': 1}
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.headers['ETag'].startswith('W/"7-3-')
+    assert second.headers['Cache-Control'] == 'private, no-cache'
+    assert cache.stats()['entries'] == 1
+
+
+def test_if_none_match_returns_304(cache):
+    build = Builder()
+    etag = get(VersionSession(3), build).headers['ETag']
+    session = VersionSession(3)
+    response = get(session, build, etag)
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+    assert build.calls == 1
+    assert session.queries == 1
+    # Сильная форма того же тега и список тегов тоже совпадают.
+    assert get(VersionSession(3), build, etag[2:]).status_code == 304
+    assert get(VersionSession(3), build, f'"other", {etag}').status_code == 304
+
+
+def test_other_params_have_other_etag(cache):
+    build = Builder()
+    etag = get(VersionSession(3), build).headers['ETag']
+    response = get(VersionSession(3), build, etag, params={'page': 2})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert build.calls == 2
+
+
+def test_new_version_invalidates(cache):
+    build = Builder()
+    etag = get(VersionSession(3), build).headers['ETag']
+    response = get(VersionSession(4), build, etag)
+    assert response.status_code == 200
+    assert json.loads(response.get_data()) == {'call': 2}
+    assert response.headers['ETag'].startswith('W/"7-4-')
+    assert build.calls == 2
+
+
+def test_errors_and_unknown_users_are_not_cached(cache):
+    build = Builder(status=404)
+    response = get(VersionSession(3), build)
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+    get(VersionSession(3), build)
+    assert build.calls == 2
+
+    build = Builder()
+    response = get(VersionSession(None), build)
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert cache.stats()['entries'] == 0
+
+
+def test_disabled_cache_still_answers_304(monkeypatch):
+    monkeypatch.setattr(response_cache, 'response_cache', ResponseCache(max_bytes=0, max_item_bytes=1024))
+    build = Builder()
+    etag = get(VersionSession(3), build).headers['ETag']
+    get(VersionSession(3), build)
+    assert build.calls == 2
+    assert get(VersionSession(3), build, etag).status_code == 304
+
+
+@pytest.fixture
+def db_session():
+    from database import engine
+
+    try:
+        connection = engine.connect()
+    except OperationalError:
+        pytest.skip('database is not available')
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def test_bump_data_version(db_session, cache):
+    from database import User
+
+    users = [User(username='cache', email=f'cache-{index}@example.com', password='x') for index in range(2)]
+    db_session.add_all(users)
+    try:
+        db_session.flush()
+    except ProgrammingError:
+        pytest.skip('database schema is not migrated')
+    first, second = (user.id for user in users)
+
+    def versions():
+        return dict(db_session.execute(select(User.id, User.data_version).where(User.id.in_([first, second]))).all())
+
+    build = Builder()
+    with app.test_request_context():
+        etag = cached_response(db_session, 'routes', first, {}, build).headers['ETag']
+    bump_data_version(db_session, [first, first])
+    assert versions() == {first: 1, second: 0}
+    bump_data_version(db_session, [])
+    bump_data_version(db_session, [second, first])
+    assert versions() == {first: 2, second: 1}
+
+    with app.test_request_context(headers={'If-None-Match': etag}):
+        response = cached_response(db_session, 'routes', first, {}, build)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert build.calls == 2
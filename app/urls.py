@@ -1,6 +1,7 @@
 from users.views import Register
-from routes.views import RouteView, SetEndTime
-from analytics.views import AnalyticsView
+from routes.views import RouteView, RouteBatchView, RouteExportView, SetEndTime, DirectionsCacheView
+from analytics.views import AnalyticsView, DistributionView, RouteMetricsView
+from monitoring.views import MetricsView
 
 urls = [
         {
@@ -13,6 +14,16 @@ urls = [
             'view_func': RouteView.as_view('routes'),
             'methods': ['GET', 'POST']
         },
+        {
+            'rule': '/routes/batch',
+            'view_func': RouteBatchView.as_view('routes_batch'),
+            'methods': ['POST', ]
+        },
+        {
+            'rule': '/routes/export',
+            'view_func': RouteExportView.as_view('routes_export'),
+            'methods': ['GET', ]
+        },
         {
             'rule': '/set_end_time',
             'view_func': SetEndTime.as_view('end_time'),
@@ -22,5 +33,25 @@ urls = [
             'rule': '/analytics',
             'view_func': AnalyticsView.as_view('analytics'),
             'methods': ['GET', ]
+        },
+        {
+            'rule': '/analytics/distribution',
+            'view_func': DistributionView.as_view('analytics_distribution'),
+            'methods': ['GET', ]
+        },
+        {
+            'rule': '/analytics/routes',
+            'view_func': RouteMetricsView.as_view('analytics_routes'),
+            'methods': ['GET', ]
+        },
+        {
+            'rule': '/directions_cache',
+            'view_func': DirectionsCacheView.as_view('directions_cache'),
+            'methods': ['GET', ]
+        },
+        {
+            'rule': '/metrics',
+            'view_func': MetricsView.as_view('metrics'),
+            'methods': ['GET', ]
         }
 ]
\ No newline at end of file
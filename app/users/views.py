@@ -2,7 +2,7 @@ from flask.views import MethodView
 from flask import jsonify, request
 from users.validators import UserValidator
 from pydantic_core._pydantic_core import ValidationError
-from database import Session, User
+from database import request_session, User
 from api import user_model
 from flask_restx import Namespace
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
@@ -36,26 +36,26 @@ class Register(MethodView):
         try:
             user_data = UserValidator(**request.get_json())
 
-            with Session() as session:
-                new_user = User(
-                    username=user_data.username,
-                    password=user_data.password,
-                    email=user_data.email
-                )
-                session.add(new_user)
-                session.commit()
+            session = request_session()
+            new_user = User(
+                username=user_data.username,
+                password=user_data.password,
+                email=user_data.email
+            )
+            session.add(new_user)
+            session.commit()
 
-                return jsonify({'data': new_user.username, 'id': new_user.id}), 201
+            return jsonify({'data': new_user.username, 'id': new_user.id}), 201
 
         except ValidationError as val_err:
             return jsonify({'error': 'Validation error', 'details': str(val_err.errors()[0]['msg'])}), 400
 
         except IntegrityError as int_err:
-            session.rollback()
+            request_session.rollback()
             return jsonify({'error': 'Integrity error', 'details': str(int_err.orig)}), 409
 
         except SQLAlchemyError as sql_err:
-            session.rollback()
+            request_session.rollback()
             return jsonify({'error': 'Database error', 'details': str(sql_err)}), 500
 
         except Exception as exc: